@@ -1,3 +1,12 @@
 from . import models
 from . import wizard
 from . import controllers
+
+
+def post_init_hook(env):
+    """
+    Initialise les statistiques de location stockées des clients existants
+    et les écritures d'ouverture du journal des points de fidélité.
+    """
+    env['res.partner']._rebuild_rental_stats()
+    env['mybike.loyalty.ledger']._post_opening_balances()
@@ -36,7 +36,7 @@
     'author': "Harith Lemti & Younes Loukili",
     'website': "https://www.mybikestore.example",
     'category': 'Sales',
-    'version': '1.0.0',
+    'version': '1.0.1',
     
     # Compatible Odoo 19.0 Community
     'depends': [
@@ -54,21 +54,25 @@
         # Sécurité - Définit les droits d'accès aux modèles
         'security/ir.model.access.csv',
 
-        # Données de base - Catégories, tarifs et séquences
+        # Données de base - Catégories, tarifs, séquences et tâches planifiées
         'data/product_categories.xml',
         'data/rental_pricing.xml',
         'data/sequence.xml',
+        'data/ir_cron.xml',
 
         # Rapports - Chargés avant les vues pour éviter les erreurs de référence
         'report/rental_contract_report.xml',
 
         # Wizards - Assistants pour les actions utilisateur
         'wizard/rental_return_wizard_views.xml',
+        'wizard/rental_scan_wizard_views.xml',
 
         # Vues - Interfaces utilisateur
         'views/product_template_views.xml',
         'views/rental_contract_views.xml',
         'views/res_partner_views.xml',
+        'views/loyalty_ledger_views.xml',
+        'views/rental_pricing_rule_views.xml',
         'views/menu_views.xml',
 
         # Website - Templates du site web public
@@ -76,12 +80,12 @@
         'views/website_rental_templates.xml',
     ],
 
-    # 'assets': {
-    #     'web.assets_frontend': [
-    #         'mybike_store/static/src/css/mybike_store.css',
-    #         'mybike_store/static/src/js/rental_booking.js',
-    #     ],
-    # },
+    'assets': {
+        'web.assets_frontend': [
+            'mybike_store/static/src/css/mybike_store.css',
+            'mybike_store/static/src/js/rental_booking.js',
+        ],
+    },
 
     'demo': [
     'demo/demo_products.xml',
@@ -89,6 +93,9 @@
     'demo/demo_customers.xml',
 ],
     
+    # Initialisation des statistiques stockées (voir __init__.py)
+    'post_init_hook': 'post_init_hook',
+
     'installable': True,
     'application': True,
     'auto_install': False,
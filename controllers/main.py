@@ -9,6 +9,10 @@ from odoo import http
 from odoo.http import request
 
 
+# Durée de vie (secondes) des fragments de vélos de la page d'accueil
+HOMEPAGE_FRAGMENT_TTL = 300
+
+
 class MyBikeWebsite(http.Controller):
     """
     Contrôleur principal du site web MyBike Store.
@@ -28,24 +32,43 @@ class MyBikeWebsite(http.Controller):
         - 6 vélos en vedette (vente)
         - 4 vélos disponibles à la location
 
+        Les deux blocs de vélos sont des fragments pré-rendus mis en cache
+        (mybike.website.cache) pendant HOMEPAGE_FRAGMENT_TTL secondes et
+        invalidés dès qu'un vélo change: la page ne fait plus de recherche
+        produit, quelle que soit la taille du catalogue.
+
         Returns:
             Rendu du template mybike_store.homepage
         """
-        # Récupérer les vélos en vedette pour la vente
-        featured_bikes = request.env['product.template'].sudo().search([
-            ('bike_category', 'in', ['electric', 'mountain', 'city']),
-            ('sale_ok', '=', True),
-        ], limit=6)
-
-        # Récupérer les vélos de location disponibles
-        rental_bikes = request.env['product.template'].sudo().search([
-            ('is_rental', '=', True),
-            ('rental_state', '=', 'available')
-        ], limit=4)
+        WebsiteCache = request.env['mybike.website.cache']
+        key = (request.lang.code, request.website.id)
+
+        def render_featured_bikes():
+            # Récupérer les vélos en vedette pour la vente
+            featured_bikes = request.env['product.template'].sudo().search([
+                ('bike_category', 'in', ['electric', 'mountain', 'city']),
+                ('sale_ok', '=', True),
+            ], limit=6)
+            return request.render('mybike_store.homepage_featured_bikes', {
+                'featured_bikes': featured_bikes,
+            }).render()
+
+        def render_rental_bikes():
+            # Récupérer les vélos de location disponibles
+            rental_bikes = request.env['product.template'].sudo().search([
+                ('is_rental', '=', True),
+                ('rental_state', '=', 'available')
+            ], limit=4)
+            return request.render('mybike_store.homepage_rental_bikes', {
+                'rental_bikes': rental_bikes,
+                'tariffs': request.env['mybike.rental.pricing'].sudo().get_display_tariffs(rental_bikes),
+            }).render()
 
         values = {
-            'featured_bikes': featured_bikes,
-            'rental_bikes': rental_bikes,
+            'featured_bikes_html': WebsiteCache._get_cached_fragment(
+                'homepage_featured_bikes', key, render_featured_bikes, HOMEPAGE_FRAGMENT_TTL),
+            'rental_bikes_html': WebsiteCache._get_cached_fragment(
+                'homepage_rental_bikes', key, render_rental_bikes, HOMEPAGE_FRAGMENT_TTL),
         }
         return request.render('mybike_store.homepage', values)
 
@@ -6,8 +6,44 @@ Auteur: Harith Lemti & Younes Loukili
 """
 
 from odoo import http, fields
+from odoo.fields import Domain
 from odoo.http import request
-from datetime import datetime
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from ..models.rental_availability import UNBOOKABLE_RENTAL_STATES
+from ..models.rental_pricing import RENTAL_PRICE_FIELDS, format_rental_breakdown
+
+
+# Format des champs <input type="datetime-local"> du site
+BOOKING_DATETIME_FORMAT = '%Y-%m-%dT%H:%M'
+
+# Nombre maximum de vélos par appel groupé (protège la route publique)
+MAX_BATCH_SIZE = 200
+
+# Nombre de vélos par page du catalogue
+CATALOG_PAGE_SIZE = 24
+
+# Nombre de lignes par page de l'espace "Mes locations"
+MY_RENTALS_PAGE_SIZE = 20
+
+# Paramètres de filtre du catalogue (en plus du type de vélo et de la période)
+CATALOG_FILTER_PARAMS = ('frame_size', 'wheel_size', 'is_electric', 'brand', 'price_min', 'price_max')
+
+
+def _parse_booking_datetime(value):
+    """
+    Convertit une date saisie sur le site (datetime-local) en datetime.
+
+    Returns:
+        datetime ou None si la valeur est vide ou invalide
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, BOOKING_DATETIME_FORMAT)
+    except ValueError:
+        return None
 
 
 class MyBikeRental(http.Controller):
@@ -24,36 +60,278 @@ class MyBikeRental(http.Controller):
     """
 
     @http.route('/rental', type='http', auth='public', website=True)
-    def rental_catalog(self, bike_type=None, **kwargs):
+    def rental_catalog(self, bike_type=None, start_date=None, end_date=None, after=None, **kwargs):
         """
         Catalogue de vélos à louer.
 
-        Affiche tous les vélos disponibles à la location, avec possibilité
-        de filtrer par type (ville, VTT, électrique).
+        Affiche les vélos disponibles à la location, par pages de
+        CATALOG_PAGE_SIZE, avec possibilité de filtrer par type (ville, VTT,
+        électrique), taille de cadre, taille de roues, motorisation, marque
+        et prix journalier.
+
+        Si une période est fournie, seuls les vélos libres sur toute la période
+        sont affichés (moteur mybike.rental.availability). Sinon, on affiche
+        tous les vélos louables (hors maintenance et vendus); la disponibilité
+        immédiate des vélos de la page est vérifiée en un appel groupé.
+
+        La pagination se fait par curseur (keyset): `after` est l'identifiant
+        du dernier vélo de la page précédente. Une page coûte donc toujours
+        une requête indexée de CATALOG_PAGE_SIZE + 1 lignes, sans OFFSET ni
+        comptage total, quelle que soit la taille du parc.
 
         Args:
             bike_type: Type de vélo pour filtrer (optionnel)
+            start_date: Début de la période souhaitée (optionnel)
+            end_date: Fin de la période souhaitée (optionnel)
+            after: Identifiant du dernier vélo de la page précédente (optionnel)
+            **kwargs: Filtres du catalogue (voir CATALOG_FILTER_PARAMS)
         """
-        domain = [
-            ('is_rental', '=', True),
-            ('rental_state', '=', 'available')
-        ]
+        start_dt = _parse_booking_datetime(start_date)
+        end_dt = _parse_booking_datetime(end_date)
+        has_period = bool(start_dt and end_dt and start_dt < end_dt)
+        filters = {
+            param: kwargs[param] for param in CATALOG_FILTER_PARAMS if kwargs.get(param)
+        }
+        after_id = int(after) if after and after.isdigit() else None
+
+        # Visiteurs anonymes sur la première page sans filtre: page servie depuis
+        # le cache (types de vélos connus uniquement, pour borner le nombre de variantes)
+        bike_categories = dict(request.env['product.template']._fields['bike_category'].selection)
+        if (not has_period and not filters and not after_id and not request.session.uid
+                and (not bike_type or bike_type in bike_categories)):
+            return self._cached_rental_catalog(bike_type)
+
+        values = self._prepare_catalog_values(
+            bike_type, filters, after_id,
+            start_date if has_period else None,
+            end_date if has_period else None)
+        return request.render('mybike_store.rental_catalog_template', values)
 
-        if bike_type:
-            domain.append(('bike_category', '=', bike_type))
+    def _get_catalog_facet_filters(self, filters):
+        """
+        Extrait les filtres du catalogue portant sur un champ à compteurs
+        (voir CATALOG_FACET_FIELDS). Les valeurs invalides sont ignorées.
 
-        rental_bikes = request.env['product.template'].sudo().search(domain)
+        Args:
+            filters: dict {paramètre: valeur brute} (voir CATALOG_FILTER_PARAMS)
 
-        values = {
-            'bikes': rental_bikes,
+        Returns:
+            dict: {champ de product.template: valeur}
+        """
+        selected = {}
+        frame_sizes = dict(request.env['product.template']._fields['frame_size'].selection)
+        if filters.get('frame_size') in frame_sizes:
+            selected['frame_size'] = filters['frame_size']
+        if filters.get('wheel_size', '').isdigit():
+            selected['wheel_size'] = int(filters['wheel_size'])
+        if filters.get('is_electric') in ('0', '1'):
+            selected['is_electric'] = filters['is_electric'] == '1'
+        if filters.get('brand'):
+            selected['bike_brand'] = filters['brand']
+        return selected
+
+    def _get_catalog_price_domain(self, filters, start_dt=None, end_dt=None):
+        """
+        Traduit le filtre de prix du catalogue en domaine sur product.template.
+
+        Le filtre porte sur le prix journalier facturé (règles de tarification
+        et multiplicateur de demande compris, pour la période si elle est
+        fournie), c'est-à-dire le prix affiché sur le catalogue. Les valeurs
+        invalides sont ignorées.
+
+        Args:
+            filters: dict {paramètre: valeur brute} (voir CATALOG_FILTER_PARAMS)
+            start_dt: Début de la période (datetime, optionnel)
+            end_dt: Fin de la période (datetime, optionnel)
+
+        Returns:
+            Domain: Domaine
+        """
+        prices = {}
+        for param in ('price_min', 'price_max'):
+            try:
+                prices[param] = float(filters[param])
+            except (KeyError, ValueError):
+                pass
+        if not prices:
+            return Domain.TRUE
+        return request.env['mybike.rental.pricing'].sudo().get_price_domain(
+            'day', start=start_dt, end=end_dt, **prices)
+
+    def _prepare_catalog_values(self, bike_type=None, filters=None, after=None,
+                                start_date=None, end_date=None):
+        """
+        Prépare les valeurs du template rental_catalog_template.
+
+        Charge une page de vélos (pagination par curseur sur l'identifiant)
+        et les compteurs de tous les filtres en une requête groupée
+        (voir ProductTemplate._get_rental_catalog_facets).
+
+        Args:
+            bike_type: Type de vélo sélectionné (optionnel)
+            filters: dict {paramètre: valeur brute} des filtres actifs (optionnel)
+            after: Identifiant du dernier vélo de la page précédente (optionnel)
+            start_date: Début de la période, format datetime-local (optionnel)
+            end_date: Fin de la période, format datetime-local (optionnel)
+        """
+        filters = filters or {}
+        Template = request.env['product.template'].sudo()
+        Pricing = request.env['mybike.rental.pricing'].sudo()
+        start_dt = _parse_booking_datetime(start_date) if start_date and end_date else None
+        end_dt = _parse_booking_datetime(end_date) if start_dt else None
+
+        domain = Domain('is_rental', '=', True)
+        if start_dt:
+            booked_ids = request.env['mybike.rental.availability'].sudo().get_booked_template_ids(
+                start_dt, end_dt)
+            domain &= Domain('rental_state', 'not in', UNBOOKABLE_RENTAL_STATES)
+            domain &= Domain('id', 'not in', booked_ids)
+        else:
+            # Sans période: tous les vélos louables, la disponibilité immédiate de
+            # chacun est vérifiée par la route /rental/availability (la page peut
+            # ainsi rester en cache quand un vélo part ou revient de location)
+            domain &= Domain('rental_state', 'not in', UNBOOKABLE_RENTAL_STATES)
+        if bike_type:
+            domain &= Domain('bike_category', '=', bike_type)
+        domain &= self._get_catalog_price_domain(filters, start_dt, end_dt)
+
+        # Les compteurs des filtres ignorent le filtre du champ compté: ils
+        # partent du domaine sans ces filtres (voir _get_rental_catalog_facets)
+        facet_domain = domain
+        selected = self._get_catalog_facet_filters(filters)
+        for fname, value in selected.items():
+            domain &= Domain(fname, '=', value)
+
+        # Une ligne de plus que la page pour savoir s'il existe une page suivante
+        page_domain = domain & Domain('id', '>', after) if after else domain
+        bikes = Template.search(page_domain, order='id', limit=CATALOG_PAGE_SIZE + 1)
+        has_next = len(bikes) > CATALOG_PAGE_SIZE
+        bikes = bikes[:CATALOG_PAGE_SIZE]
+
+        # Tarifs facturés (règles et demande comprises) et prix de la période
+        # au meilleur tarif, calculés pour toute la page en un appel
+        tariffs = Pricing.get_display_tariffs(bikes, start_dt, end_dt)
+        period_prices = {}
+        if start_dt:
+            best_prices = Pricing.get_best_prices(bikes, start_dt, end_dt)
+            period_prices = {
+                bike_id: (amount, format_rental_breakdown(breakdown))
+                for bike_id, (amount, breakdown) in best_prices.items()
+            }
+
+        query = dict(filters)
+        if bike_type:
+            query['bike_type'] = bike_type
+        if start_date and end_date:
+            query.update(start_date=start_date, end_date=end_date)
+
+        return {
+            'bikes': bikes,
             'selected_type': bike_type,
+            'start_date': start_date,
+            'end_date': end_date,
+            'filters': filters,
+            'catalog_query': query,
+            'tariffs': tariffs,
+            'period_prices': period_prices,
+            'facets': Template._get_rental_catalog_facets(facet_domain, selected),
+            'frame_size_labels': dict(Template._fields['frame_size'].selection),
+            'first_page_url': '/rental?%s' % urlencode(query) if after else None,
+            'next_page_url': '/rental?%s' % urlencode(dict(query, after=bikes[-1].id)) if has_next else None,
             'bike_types': [
                 {'id': 'city', 'name': 'Vélos de Ville'},
                 {'id': 'mountain', 'name': 'VTT'},
                 {'id': 'electric', 'name': 'Vélos Électriques'},
             ]
         }
-        return request.render('mybike_store.rental_catalog_template', values)
+
+    def _cached_rental_catalog(self, bike_type):
+        """
+        Sert le catalogue avec son corps pris dans le cache des pages
+        (mybike.website.cache).
+
+        Seule la première page sans filtre ni période est mise en cache.
+        Le corps du catalogue (rental_catalog_body) est rendu une seule fois
+        par (type de vélo, langue, site, jour), puis servi sans requête ORM
+        jusqu'à l'invalidation du cache (changement de prix, de publication ou
+        passage en maintenance d'un vélo de location). La mise en page du site
+        (en-tête, données de session, jeton CSRF) est rendue à chaque requête,
+        comme pour les fragments de la page d'accueil: rien de propre à un
+        visiteur n'est mis en cache.
+        """
+        def render():
+            return request.render(
+                'mybike_store.rental_catalog_body', self._prepare_catalog_values(bike_type)).render()
+
+        # Les tarifs affichés dépendent des règles de tarification (saison, type
+        # de jour): le cache change de jour à minuit heure locale du site, et à
+        # minuit UTC où le moteur de tarification change de jour
+        website_tz = request.website.company_id.partner_id.tz or 'UTC'
+        local_today = fields.Date.context_today(request.website.with_context(tz=website_tz))
+        key = (bike_type or '', request.lang.code, request.website.id, local_today, fields.Date.today())
+        catalog_html = request.env['mybike.website.cache']._get_cached_page('rental_catalog', key, render)
+        return request.render('mybike_store.rental_catalog_template', {'catalog_html': catalog_html})
+
+    @http.route('/rental/availability', type='jsonrpc', auth='public', website=True)
+    def rental_availability(self, bike_ids=None, start_date=None, end_date=None, **kwargs):
+        """
+        Disponibilité groupée de plusieurs vélos (appelé par BikeAvailabilityChecker).
+
+        Tous les vélos demandés sont vérifiés en une seule requête d'intervalle,
+        un catalogue de 60 vélos coûte donc un seul aller-retour.
+        Sans période, on vérifie la prochaine heure.
+
+        Args:
+            bike_ids: Liste d'identifiants product.template
+            start_date: Début de la période (format datetime-local, optionnel)
+            end_date: Fin de la période (format datetime-local, optionnel)
+
+        Returns:
+            dict: {'availability': {bike_id: bool}} ou {'error': message}
+        """
+        try:
+            template_ids = [int(bike_id) for bike_id in (bike_ids or [])][:MAX_BATCH_SIZE]
+        except (TypeError, ValueError):
+            return {'error': "Identifiants de vélos invalides"}
+
+        start_dt = _parse_booking_datetime(start_date)
+        end_dt = _parse_booking_datetime(end_date)
+        if not start_dt or not end_dt:
+            start_dt = fields.Datetime.now()
+            end_dt = start_dt + timedelta(hours=1)
+        if end_dt <= start_dt:
+            return {'error': "La date de fin doit être après la date de début."}
+
+        availability = request.env['mybike.rental.availability'].sudo().get_templates_availability(
+            template_ids, start_dt, end_dt)
+        return {'availability': availability}
+
+    @http.route('/rental/quote', type='jsonrpc', auth='public', website=True)
+    def rental_quote(self, items=None, **kwargs):
+        """
+        Devis de location en direct (appelé par RentalPriceCalculator).
+
+        Le prix est calculé par mybike.rental.pricing, la même fonction que
+        la ligne de commande et le contrat. Les tarifs viennent du cache
+        mémoire: un devis ne relit pas les vélos en base.
+
+        Args:
+            items: Liste de dict {'bike_id', 'rental_type', 'start_date', 'end_date'}
+
+        Returns:
+            dict: {'quotes': [...]} (voir RentalPricing.quote) ou {'error': message}
+        """
+        try:
+            quote_items = [{
+                'bike_id': int(item['bike_id']),
+                'rental_type': item.get('rental_type'),
+                'start': _parse_booking_datetime(item.get('start_date')),
+                'end': _parse_booking_datetime(item.get('end_date')),
+            } for item in (items or [])[:MAX_BATCH_SIZE]]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return {'error': "Demande de devis invalide"}
+
+        return {'quotes': request.env['mybike.rental.pricing'].sudo().quote(quote_items)}
 
     @http.route('/rental/bike/<int:bike_id>', type='http', auth='public', website=True)
     def rental_bike_detail(self, bike_id, **kwargs):
@@ -70,6 +348,7 @@ class MyBikeRental(http.Controller):
 
         values = {
             'bike': bike,
+            'tariff': request.env['mybike.rental.pricing'].sudo().get_display_tariffs(bike)[bike.id],
         }
         return request.render('mybike_store.rental_bike_detail_template', values)
 
@@ -84,9 +363,11 @@ class MyBikeRental(http.Controller):
         if request.env.user._is_public():
             return request.redirect('/web/login?redirect=/rental/booking')
 
+        # Les vélos actuellement loués restent réservables pour une période future:
+        # la disponibilité sur la période est vérifiée à la soumission.
         available_bikes = request.env['product.template'].sudo().search([
             ('is_rental', '=', True),
-            ('rental_state', '=', 'available')
+            ('rental_state', 'not in', ('maintenance', 'sold'))
         ])
 
         selected_bike = None
@@ -98,6 +379,7 @@ class MyBikeRental(http.Controller):
 
         values = {
             'bikes': available_bikes,
+            'tariffs': request.env['mybike.rental.pricing'].sudo().get_display_tariffs(available_bikes),
             'selected_bike': selected_bike,
             'partner': request.env.user.partner_id,
         }
@@ -122,15 +404,13 @@ class MyBikeRental(http.Controller):
 
             partner = request.env.user.partner_id
 
-            # Créer une commande de location
-            rental_order = request.env['mybike.rental.order'].sudo().create({
-                'partner_id': partner.id,
-                'order_date': fields.Date.today(),
-            })
-
             # Convertir les dates
-            start_dt = datetime.strptime(start_date, '%Y-%m-%dT%H:%M')
-            end_dt = datetime.strptime(end_date, '%Y-%m-%dT%H:%M')
+            start_dt = _parse_booking_datetime(start_date)
+            end_dt = _parse_booking_datetime(end_date)
+            if not start_dt or not end_dt:
+                raise ValueError("Format de date invalide")
+            if end_dt <= start_dt:
+                raise ValueError("La date de fin doit être après la date de début.")
 
             # Trouver le product.product
             product = request.env['product.product'].sudo().search([
@@ -140,18 +420,24 @@ class MyBikeRental(http.Controller):
             if not product:
                 raise ValueError("Vélo non trouvé")
 
-            # Récupérer le prix selon le type de location
-            product_tmpl = product.product_tmpl_id
-            if rental_type == 'hour':
-                unit_price = product_tmpl.rental_price_hour
-            elif rental_type == 'day':
-                unit_price = product_tmpl.rental_price_day
-            elif rental_type == 'week':
-                unit_price = product_tmpl.rental_price_week
-            elif rental_type == 'month':
-                unit_price = product_tmpl.rental_price_month
-            else:
-                unit_price = product_tmpl.rental_price_day
+            # Vérifier la disponibilité avant de créer quoi que ce soit. Contrôle
+            # indicatif: deux demandes simultanées peuvent passer, la garantie est
+            # la contrainte _no_double_booking à la confirmation de la commande
+            if not request.env['mybike.rental.availability'].sudo().is_available(
+                    product.id, start_dt, end_dt):
+                raise ValueError("Ce vélo est déjà réservé sur cette période.")
+
+            # Créer une commande de location
+            rental_order = request.env['mybike.rental.order'].sudo().create({
+                'partner_id': partner.id,
+                'order_date': fields.Date.today(),
+            })
+
+            # Récupérer le prix selon le type de location (tarifs en cache)
+            if rental_type not in RENTAL_PRICE_FIELDS:
+                rental_type = 'day'
+            unit_price = request.env['mybike.rental.pricing'].sudo().get_unit_price(
+                product.product_tmpl_id, rental_type, start_dt, end_dt)
 
             # Créer la ligne de commande
             order_line = request.env['mybike.rental.order.line'].sudo().create({
@@ -198,30 +484,87 @@ class MyBikeRental(http.Controller):
         return request.render('mybike_store.rental_confirmation_template', values)
 
     @http.route('/my/rentals', type='http', auth='user', website=True)
-    def my_rentals(self, **kwargs):
+    def my_rentals(self, contracts_after=None, orders_after=None, **kwargs):
         """
         Espace "Mes locations".
 
-        Affiche l'historique complet des locations de l'utilisateur:
-        - Commandes de location (devis)
+        Affiche l'historique des locations de l'utilisateur, par pages de
+        MY_RENTALS_PAGE_SIZE lignes:
         - Contrats de location actifs et terminés
+        - Commandes de location (devis)
+
+        Chaque liste a son propre curseur (identifiant de la dernière ligne
+        de la page précédente), le temps de chargement ne dépend donc pas de
+        la longueur de l'historique.
+
+        Args:
+            contracts_after: Dernier contrat de la page précédente (optionnel)
+            orders_after: Dernière commande de la page précédente (optionnel)
         """
         if request.env.user._is_public():
             return request.redirect('/web/login?redirect=/my/rentals')
 
         partner = request.env.user.partner_id
+        cursors = {
+            'contracts_after': int(contracts_after) if contracts_after and contracts_after.isdigit() else None,
+            'orders_after': int(orders_after) if orders_after and orders_after.isdigit() else None,
+        }
 
-        # Récupérer les commandes et contrats de l'utilisateur
-        orders = request.env['mybike.rental.order'].sudo().search([
-            ('partner_id', '=', partner.id)
-        ], order='create_date desc')
+        contracts, contracts_next = self._fetch_history_page(
+            'mybike.rental.contract', [('partner_id', '=', partner.id)], 'start_date',
+            cursors['contracts_after'],
+            ['name', 'product_id', 'start_date', 'end_date', 'total_price', 'state'])
+        orders, orders_next = self._fetch_history_page(
+            'mybike.rental.order', [('partner_id', '=', partner.id)], 'create_date',
+            cursors['orders_after'],
+            ['name', 'order_date', 'amount_total', 'state'])
 
-        contracts = request.env['mybike.rental.contract'].sudo().search([
-            ('partner_id', '=', partner.id)
-        ], order='start_date desc')
+        def page_url(**changes):
+            query = {key: value for key, value in dict(cursors, **changes).items() if value}
+            return '/my/rentals?%s' % urlencode(query) if query else '/my/rentals'
 
         values = {
             'orders': orders,
             'contracts': contracts,
+            'contracts_first_url': page_url(contracts_after=None) if cursors['contracts_after'] else None,
+            'contracts_next_url': page_url(contracts_after=contracts_next) if contracts_next else None,
+            'orders_first_url': page_url(orders_after=None) if cursors['orders_after'] else None,
+            'orders_next_url': page_url(orders_after=orders_next) if orders_next else None,
         }
         return request.render('mybike_store.my_rentals_template', values)
+
+    def _fetch_history_page(self, model, domain, sort_field, after_id, field_names):
+        """
+        Charge une page d'historique triée par (sort_field desc, id desc).
+
+        Pagination par curseur: la page suivante commence après l'enregistrement
+        `after_id`, sans OFFSET ni comptage total. Une ligne de plus que la page
+        est lue pour savoir s'il existe une page suivante. Seuls les champs
+        affichés sont chargés (search_fetch).
+
+        Args:
+            model: Nom du modèle (ex: 'mybike.rental.contract')
+            domain: Domaine de l'historique (ex: client courant)
+            sort_field: Champ de tri décroissant, non vide (ex: 'start_date')
+            after_id: Dernier enregistrement de la page précédente (optionnel)
+            field_names: Champs à charger
+
+        Returns:
+            tuple: (enregistrements de la page, curseur de la page suivante ou None)
+        """
+        Model = request.env[model].sudo()
+        if after_id:
+            cursor = Model.search_fetch([('id', '=', after_id)], [sort_field])
+            if cursor:
+                sort_value = cursor[sort_field]
+                domain = domain + [
+                    '|', (sort_field, '<', sort_value),
+                    '&', (sort_field, '=', sort_value), ('id', '<', cursor.id),
+                ]
+        records = Model.search_fetch(
+            domain, field_names, order='%s desc, id desc' % sort_field,
+            limit=MY_RENTALS_PAGE_SIZE + 1)
+        if len(records) > MY_RENTALS_PAGE_SIZE:
+            records = records[:MY_RENTALS_PAGE_SIZE]
+            return records, records[-1].id
+        return records, None
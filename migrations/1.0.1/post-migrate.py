@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Migration 1.0.1
+Description: Statistiques de location stockées des clients et écritures d'ouverture du journal des points
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """
+    Initialise les colonnes des statistiques de location des clients, créées
+    à 0 par la mise à jour (voir ResPartner._rebuild_rental_stats), puis passe
+    une écriture d'ouverture pour chaque client dont le solde de points a été
+    acquis avant le journal (voir LoyaltyLedger._post_opening_balances).
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['res.partner']._rebuild_rental_stats()
+    env['mybike.loyalty.ledger']._post_opening_balances()
@@ -2,3 +2,12 @@ from . import product_template
 from . import rental_order
 from . import rental_contract
 from . import res_partner
+from . import rental_availability
+from . import rental_pricing
+from . import rental_pricing_rule
+from . import rental_demand
+from . import loyalty_ledger
+from . import ir_sequence
+from . import ir_config_parameter
+from . import ir_actions_report
+from . import website_cache
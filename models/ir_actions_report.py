@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Report Extension (Rapports PDF)
+Description: Cache des PDF de contrats en pièces jointes et rendu parallèle des lots
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import models, api
+from odoo.tools import SQL, config
+from odoo.tools.safe_eval import safe_eval
+
+
+# Rapport PDF des contrats de location mis en cache
+CONTRACT_REPORT_NAME = 'mybike_store.report_rental_invoice_document'
+
+# Préfixe des pièces jointes du rapport (voir l'expression `attachment` du
+# rapport dans report/rental_contract_report.xml)
+CONTRACT_PDF_PREFIX = 'Facture_Location_'
+
+# Nombre maximal de processus wkhtmltopdf lancés en parallèle
+PDF_RENDER_WORKERS = 4
+
+# Part du pool de connexions (db_maxconn) que les rendus parallèles peuvent
+# occuper au total dans un processus Odoo: chaque paquet ouvre son propre
+# curseur, le reste du pool reste disponible pour les requêtes HTTP
+PDF_RENDER_POOL_SHARE = 0.25
+
+# Curseurs de rendu disponibles, partagés par toutes les impressions en cours
+# du processus (voir IrActionsReport._acquire_render_slots)
+_render_slots = threading.BoundedSemaphore(
+    max(1, int(config['db_maxconn'] * PDF_RENDER_POOL_SHARE)))
+
+# Nombre minimal de contrats par processus wkhtmltopdf (en dessous, un seul
+# processus est plus rapide que le coût de démarrage de plusieurs)
+PDF_RENDER_MIN_CHUNK = 5
+
+
+class IrActionsReport(models.Model):
+    """
+    Extension du modèle ir.actions.report.
+
+    Le PDF d'un contrat est stocké en pièce jointe, nommée d'après le
+    write_date du contrat (attachment_use sur le rapport): une réimpression
+    d'un contrat inchangé est servie depuis la pièce jointe, sans wkhtmltopdf.
+
+    Pour une impression en lot, seuls les contrats modifiés depuis leur dernier
+    rendu sont rendus, répartis en plusieurs processus wkhtmltopdf parallèles.
+    Les anciens PDF des contrats rendus à nouveau sont supprimés.
+    """
+    _inherit = 'ir.actions.report'
+
+    def _render_qweb_pdf_prepare_streams(self, report_ref, data, res_ids=None):
+        """
+        Rend en parallèle les PDF périmés d'un lot de contrats.
+
+        Les contrats dont le PDF est à jour sont laissés au rendu standard, qui
+        les lit depuis leur pièce jointe. Les autres sont répartis en paquets
+        rendus chacun par un processus wkhtmltopdf dans son propre thread.
+        Repli sur le rendu standard (un seul processus) pour les autres
+        rapports, les petits lots, si le rendu parallèle n'est pas sûr (voir
+        _can_render_in_parallel) ou si les curseurs de rendu du processus
+        sont déjà occupés (voir _acquire_render_slots).
+        """
+        report_sudo = self._get_report(report_ref)
+        if (report_sudo.report_name != CONTRACT_REPORT_NAME or not report_sudo.attachment
+                or not res_ids or len(set(res_ids)) != len(res_ids)
+                or self.env.context.get('report_pdf_no_attachment')):
+            return super(IrActionsReport, self)._render_qweb_pdf_prepare_streams(report_ref, data, res_ids=res_ids)
+
+        stale_ids = report_sudo._get_stale_contract_pdf_ids(res_ids)
+        chunk_count = min(PDF_RENDER_WORKERS, len(stale_ids) // PDF_RENDER_MIN_CHUNK)
+        if chunk_count >= 2 and self._can_render_in_parallel():
+            chunk_count = self._acquire_render_slots(chunk_count)
+        else:
+            chunk_count = 0
+        if chunk_count < 2:
+            self._release_render_slots(chunk_count)
+            streams = super(IrActionsReport, self)._render_qweb_pdf_prepare_streams(report_ref, data, res_ids=res_ids)
+            report_sudo._purge_contract_pdfs(stale_ids)
+            return streams
+
+        chunks = [stale_ids[index::chunk_count] for index in range(chunk_count)]
+        try:
+            with ThreadPoolExecutor(max_workers=chunk_count) as executor:
+                rendered = {}
+                for chunk_streams in executor.map(
+                        lambda chunk: self._render_pdf_chunk(report_ref, data, chunk), chunks):
+                    rendered.update(chunk_streams)
+        finally:
+            self._release_render_slots(chunk_count)
+
+        if False in rendered:
+            # PDF impossible à découper par contrat: rendu standard du lot
+            streams = super(IrActionsReport, self)._render_qweb_pdf_prepare_streams(report_ref, data, res_ids=res_ids)
+            report_sudo._purge_contract_pdfs(stale_ids)
+            return streams
+
+        fresh_ids = [res_id for res_id in res_ids if res_id not in rendered]
+        if fresh_ids:
+            rendered.update(super(IrActionsReport, self)._render_qweb_pdf_prepare_streams(
+                report_ref, data, res_ids=fresh_ids))
+        report_sudo._purge_contract_pdfs(stale_ids)
+        return {res_id: rendered[res_id] for res_id in res_ids}
+
+    def _get_stale_contract_pdf_ids(self, res_ids):
+        """
+        Retourne les contrats dont le PDF en pièce jointe n'est pas à jour.
+
+        Le nom attendu de chaque pièce jointe est calculé en mémoire (il
+        contient le write_date du contrat), puis une seule recherche trouve
+        les PDF existants du lot.
+
+        Args:
+            res_ids: IDs des contrats à imprimer
+
+        Returns:
+            list: IDs des contrats à rendre, dans l'ordre de res_ids
+        """
+        records = self.env[self.model].browse(res_ids)
+        expected = {
+            record.id: safe_eval(self.attachment, {'object': record, 'time': time})
+            for record in records
+        }
+        attachments = self.env['ir.attachment'].search_fetch([
+            ('res_model', '=', self.model),
+            ('res_id', 'in', records.ids),
+            ('name', 'in', [name for name in expected.values() if name]),
+        ], ['res_id', 'name'])
+        cached = {(attachment.res_id, attachment.name) for attachment in attachments}
+        return [res_id for res_id in res_ids if (res_id, expected[res_id]) not in cached]
+
+    def _purge_contract_pdfs(self, res_ids):
+        """
+        Supprime les PDF périmés des contrats qui viennent d'être rendus.
+
+        Appelée avant l'enregistrement des nouveaux PDF par le rendu standard:
+        toutes les pièces jointes du rapport sur ces contrats sont périmées.
+
+        Args:
+            res_ids: IDs des contrats rendus à nouveau
+        """
+        if not res_ids:
+            return
+        self.env['ir.attachment'].search([
+            ('res_model', '=', self.model),
+            ('res_id', 'in', res_ids),
+            ('name', '=like', CONTRACT_PDF_PREFIX + '%'),
+        ]).unlink()
+
+    @api.model
+    def _can_render_in_parallel(self):
+        """
+        Indique si des paquets peuvent être rendus dans des curseurs séparés.
+
+        Chaque thread de rendu ouvre son propre curseur, qui ne voit que les
+        données validées en base. Le rendu parallèle n'est donc sûr que si la
+        transaction courante n'a encore rien écrit (aucun identifiant de
+        transaction attribué par PostgreSQL). Jamais en mode test, où les
+        curseurs partagent une seule connexion.
+
+        Returns:
+            bool: True si le rendu parallèle est possible
+        """
+        if self.env.registry.in_test_mode():
+            return False
+        self.env.flush_all()
+        [(txid,)] = self.env.execute_query(SQL("SELECT txid_current_if_assigned()"))
+        return txid is None
+
+    @api.model
+    def _acquire_render_slots(self, count):
+        """
+        Réserve jusqu'à `count` curseurs de rendu parallèle, sans attendre.
+
+        Le nombre de curseurs ouverts par les rendus parallèles est borné
+        pour tout le processus (PDF_RENDER_POOL_SHARE du pool db_maxconn):
+        plusieurs impressions en lot simultanées se partagent ces curseurs au
+        lieu d'épuiser le pool de connexions. Quand le pool est déjà occupé,
+        le lot est rendu en moins de paquets, ou en un seul.
+
+        Args:
+            count: Nombre de curseurs souhaités
+
+        Returns:
+            int: Nombre de curseurs obtenus (à libérer avec _release_render_slots)
+        """
+        acquired = 0
+        while acquired < count and _render_slots.acquire(blocking=False):
+            acquired += 1
+        return acquired
+
+    @api.model
+    def _release_render_slots(self, count):
+        """
+        Libère des curseurs réservés par _acquire_render_slots.
+
+        Args:
+            count: Nombre de curseurs à libérer
+        """
+        for _index in range(count):
+            _render_slots.release()
+
+    def _render_pdf_chunk(self, report_ref, data, res_ids):
+        """
+        Rend un paquet de contrats dans un thread, avec son propre curseur.
+
+        Le rendu standard (HTML puis un processus wkhtmltopdf, découpage du
+        PDF par contrat) est exécuté dans un environnement séparé: l'ORM
+        n'est pas partagé entre threads.
+
+        Args:
+            report_ref: Référence du rapport
+            data: Données du rapport
+            res_ids: IDs des contrats du paquet
+
+        Returns:
+            dict: {res_id: {'stream': ..., 'attachment': None}}, ou une seule
+                  clé False si le PDF n'a pas pu être découpé par contrat
+        """
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context, su=self.env.su)
+            streams = super(IrActionsReport, self.with_env(env))._render_qweb_pdf_prepare_streams(
+                report_ref, data, res_ids=res_ids)
+            return {
+                res_id: dict(stream_data, attachment=None)
+                for res_id, stream_data in streams.items()
+            }
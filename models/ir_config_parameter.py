@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Config Parameter Extension (Générations de Cache)
+Description: Compteurs de génération des caches mémoire du module, invalidation ciblée
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import models, api
+from odoo.tools import SQL
+
+
+# Préfixe des paramètres portant la génération de chaque cache du module
+CACHE_GENERATION_PREFIX = 'mybike_store.cache_generation.'
+
+# Séquence PostgreSQL qui fournit les numéros de génération
+CACHE_GENERATION_SEQUENCE = 'mybike_cache_generation_seq'
+
+
+class IrConfigParameter(models.Model):
+    """
+    Extension du modèle ir.config_parameter.
+
+    Chaque cache mémoire du module (pages du site, tarifs, règles de
+    tarification, multiplicateurs de demande) inclut dans sa clé ormcache un
+    numéro de génération stocké en paramètre système. Incrémenter la
+    génération invalide uniquement ce cache: les entrées de l'ancienne
+    génération ne sont plus lues et sortent du cache LRU, sans vider les
+    autres caches du registre (droits d'accès, vues, ...).
+
+    La génération est lue et écrite en SQL, sans passer par get_param /
+    set_param: set_param vide le cache du registre, ce qu'on veut justement
+    éviter. Elle est lue une fois par transaction (cache du curseur) et,
+    étant transactionnelle, n'est vue par les autres workers qu'après le
+    commit des données qui l'ont rendue obsolète. Les numéros viennent d'une
+    séquence PostgreSQL (hors transaction): une génération d'une transaction
+    annulée n'est jamais réattribuée, les entrées mises en cache pendant
+    cette transaction ne sont donc jamais relues.
+    """
+    _inherit = 'ir.config_parameter'
+
+    def init(self):
+        """
+        Crée la séquence des numéros de génération.
+        """
+        super(IrConfigParameter, self).init()
+        self.env.cr.execute(SQL(
+            "CREATE SEQUENCE IF NOT EXISTS %s", SQL.identifier(CACHE_GENERATION_SEQUENCE)))
+
+    @api.model
+    def _get_cache_generation(self, name):
+        """
+        Retourne la génération courante d'un cache du module.
+
+        Args:
+            name: Nom du cache (ex: 'website', 'tariff')
+
+        Returns:
+            int: Génération (0 si le cache n'a jamais été invalidé)
+        """
+        generations = self.env.cr.cache.setdefault('mybike_cache_generations', {})
+        if name not in generations:
+            rows = self.env.execute_query(SQL(
+                "SELECT value FROM ir_config_parameter WHERE key = %s",
+                CACHE_GENERATION_PREFIX + name,
+            ))
+            generations[name] = int(rows[0][0]) if rows else 0
+        return generations[name]
+
+    @api.model
+    def _bump_cache_generation(self, *names):
+        """
+        Invalide des caches du module en leur attribuant une nouvelle génération.
+
+        Args:
+            *names: Noms des caches à invalider
+        """
+        generations = self.env.cr.cache.setdefault('mybike_cache_generations', {})
+        for name in names:
+            [(value,)] = self.env.execute_query(SQL(
+                """
+                INSERT INTO ir_config_parameter (key, value, create_uid, create_date, write_uid, write_date)
+                VALUES (%(key)s, nextval(%(sequence)s)::text, %(uid)s, NOW() AT TIME ZONE 'UTC',
+                        %(uid)s, NOW() AT TIME ZONE 'UTC')
+                ON CONFLICT (key) DO UPDATE
+                   SET value = EXCLUDED.value,
+                       write_uid = EXCLUDED.write_uid,
+                       write_date = EXCLUDED.write_date
+                RETURNING value
+                """,
+                key=CACHE_GENERATION_PREFIX + name,
+                sequence=CACHE_GENERATION_SEQUENCE,
+                uid=self.env.uid,
+            ))
+            generations[name] = int(value)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Sequence Extension (Séquences)
+Description: Réservation groupée de numéros de séquence pour les créations en lot
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import models, api
+from odoo.tools import SQL
+
+
+class IrSequence(models.Model):
+    """
+    Extension du modèle ir.sequence.
+
+    Ajoute la réservation de N numéros en un seul appel à la base, utilisée
+    par les créations en lot de commandes et de contrats de location.
+    """
+    _inherit = 'ir.sequence'
+
+    @api.model
+    def _next_by_code_batch(self, sequence_code, count):
+        """
+        Réserve `count` numéros d'une séquence et les formate localement.
+
+        Pour une séquence standard (séquence PostgreSQL), tous les numéros
+        sont tirés par un seul SELECT nextval(...) FROM generate_series(...)
+        puis formatés avec le préfixe, le suffixe et le remplissage de la
+        séquence: le format est donc identique à next_by_code.
+        Les séquences sans trou (no_gap) ou à plages de dates passent par
+        next_by_code, numéro par numéro.
+
+        Args:
+            sequence_code: Code de la séquence (ex: 'mybike.rental.contract')
+            count: Nombre de numéros à réserver
+
+        Returns:
+            list: `count` références formatées (False si la séquence n'existe pas)
+        """
+        if count <= 0:
+            return []
+
+        self.check_access('read')
+        company_id = self.env.company.id
+        sequence = self.search([
+            ('code', '=', sequence_code),
+            ('company_id', 'in', [company_id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return [False] * count
+
+        if sequence.implementation != 'standard' or sequence.use_date_range:
+            return [sequence._next() for _i in range(count)]
+
+        self.env.cr.execute(SQL(
+            "SELECT nextval(%s) FROM generate_series(1, %s)",
+            'ir_sequence_%03d' % sequence.id, count,
+        ))
+        return [sequence.get_next_char(number) for number, in self.env.cr.fetchall()]
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Loyalty Ledger (Journal des Points Fidélité)
+Description: Journal en ajout seul des points de fidélité, solde client incrémenté atomiquement
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+
+# Points de fidélité gagnés par euro de location facturé (arrondi à l'inférieur)
+LOYALTY_POINTS_PER_EURO = 1
+
+
+class LoyaltyLedger(models.Model):
+    """
+    Journal des points de fidélité.
+
+    Chaque gain ou ajustement de points est une écriture, jamais modifiée ni
+    supprimée: l'historique des points d'un client est donc toujours
+    justifiable. Le solde (res.partner.loyalty_points) est stocké sur le client
+    et incrémenté atomiquement en base à chaque écriture (voir _post_entries).
+
+    Un contrat ne rapporte des points qu'une fois: l'index unique sur
+    contract_id ignore une deuxième écriture pour le même contrat.
+    """
+    _name = 'mybike.loyalty.ledger'
+    _description = 'Écriture de Points Fidélité'
+    _order = 'id desc'
+    _rec_name = 'partner_id'
+
+    _contract_uniq = models.UniqueIndex(
+        "(contract_id) WHERE contract_id IS NOT NULL",
+        "Un contrat ne rapporte des points de fidélité qu'une seule fois.")
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Client',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade')
+
+    contract_id = fields.Many2one(
+        'mybike.rental.contract',
+        string='Contrat',
+        readonly=True,
+        ondelete='set null',
+        help='Contrat de location à l\'origine des points')
+
+    points = fields.Integer(
+        string='Points',
+        required=True,
+        readonly=True,
+        help='Points gagnés (positif) ou retirés (négatif)')
+
+    reason = fields.Selection([
+        ('opening', 'Solde d\'ouverture'),
+        ('rental', 'Location'),
+        ('adjustment', 'Ajustement'),
+    ], string='Motif',
+       required=True,
+       readonly=True,
+       default='adjustment')
+
+    # ============================================================================
+    # JOURNAL EN AJOUT SEUL
+    # ============================================================================
+
+    def write(self, vals):
+        """
+        Interdit la modification d'une écriture.
+
+        Raises:
+            UserError: Toujours (corriger par une écriture inverse)
+        """
+        raise UserError("Une écriture de points de fidélité ne peut pas être modifiée: "
+                        "passez une écriture d'ajustement.")
+
+    def unlink(self):
+        """
+        Interdit la suppression d'une écriture.
+
+        Raises:
+            UserError: Toujours (corriger par une écriture inverse)
+        """
+        raise UserError("Une écriture de points de fidélité ne peut pas être supprimée: "
+                        "passez une écriture d'ajustement.")
+
+    # ============================================================================
+    # COMPTABILISATION
+    # ============================================================================
+
+    @api.model
+    def _post_entries(self, entries):
+        """
+        Enregistre des écritures de points et met à jour les soldes des clients.
+
+        Une seule requête pour tout le lot: un INSERT multi-lignes des
+        écritures, puis un UPDATE ... FROM qui ajoute à chaque client la somme
+        de ses écritures réellement insérées (les écritures d'un contrat déjà
+        comptabilisé sont ignorées par ON CONFLICT DO NOTHING). L'incrément
+        est atomique: deux comptabilisations simultanées pour un même client
+        ne perdent pas de points. Seuls les niveaux de fidélité des clients
+        touchés sont ensuite recalculés, en un lot.
+
+        Args:
+            entries: Liste de dict avec partner_id, points et optionnellement
+                     contract_id et reason
+
+        Returns:
+            mybike.loyalty.ledger: Écritures créées
+        """
+        entries = [entry for entry in entries if entry['partner_id'] and entry['points']]
+        if not entries:
+            return self.browse()
+
+        self.check_access('create')
+        Partner = self.env['res.partner']
+        Partner.flush_model(['loyalty_points'])
+        rows = self.env.execute_query(SQL(
+            """
+            WITH entry AS (
+                INSERT INTO %(ledger)s (partner_id, contract_id, points, reason,
+                                        create_uid, create_date, write_uid, write_date)
+                SELECT v.partner_id, v.contract_id, v.points, v.reason,
+                       %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+                  FROM (VALUES %(values)s) AS v(partner_id, contract_id, points, reason)
+                ON CONFLICT DO NOTHING
+                RETURNING id, partner_id, points
+            ), balance AS (
+                UPDATE %(partner)s AS p
+                   SET loyalty_points = COALESCE(p.loyalty_points, 0) + t.points
+                  FROM (SELECT partner_id, SUM(points) AS points FROM entry GROUP BY partner_id) AS t
+                 WHERE p.id = t.partner_id
+            )
+            SELECT id, partner_id FROM entry
+            """,
+            ledger=SQL.identifier(self._table),
+            partner=SQL.identifier(Partner._table),
+            uid=self.env.uid,
+            values=SQL(', ').join(
+                SQL('(%s::int, %s::int, %s::int, %s)',
+                    entry['partner_id'], entry.get('contract_id') or None,
+                    entry['points'], entry.get('reason', 'adjustment'))
+                for entry in entries
+            ),
+        ))
+        if not rows:
+            return self.browse()
+
+        # Le solde a changé en base: vider le cache et recalculer les niveaux
+        partners = Partner.browse({partner_id for _id, partner_id in rows})
+        Partner.invalidate_model(['loyalty_points', 'loyalty_entry_ids'])
+        partners.modified(['loyalty_points'])
+        return self.browse([entry_id for entry_id, _partner_id in rows])
+
+    @api.model
+    def _post_opening_balances(self):
+        """
+        Justifie les soldes de points antérieurs au journal.
+
+        Pour chaque client dont le solde ne correspond pas à la somme de ses
+        écritures (points gagnés avant l'installation du journal), passe une
+        écriture d'ouverture de la différence. Une seule requête INSERT ...
+        SELECT, sans toucher au solde: le solde est déjà à jour, seule son
+        écriture manquait. Sans effet si elle est exécutée une deuxième fois.
+
+        Returns:
+            int: Nombre d'écritures d'ouverture créées
+        """
+        Partner = self.env['res.partner']
+        Partner.flush_model(['loyalty_points'])
+        self.flush_model()
+        rows = self.env.execute_query(SQL(
+            """
+            INSERT INTO %(ledger)s (partner_id, points, reason,
+                                    create_uid, create_date, write_uid, write_date)
+            SELECT p.id, COALESCE(p.loyalty_points, 0) - COALESCE(l.points, 0), 'opening',
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM %(partner)s AS p
+              LEFT JOIN (SELECT partner_id, SUM(points) AS points
+                           FROM %(ledger)s GROUP BY partner_id) AS l ON l.partner_id = p.id
+             WHERE COALESCE(p.loyalty_points, 0) != COALESCE(l.points, 0)
+            RETURNING id
+            """,
+            ledger=SQL.identifier(self._table),
+            partner=SQL.identifier(Partner._table),
+            uid=self.env.uid,
+        ))
+        Partner.invalidate_model(['loyalty_entry_ids'])
+        return len(rows)
+
+    @api.model
+    def _post_contract_accruals(self, contracts):
+        """
+        Comptabilise les points gagnés par des contrats de location clôturés.
+
+        Un point par euro de location (LOYALTY_POINTS_PER_EURO, sur total_price)
+        pour les clients membres du programme de fidélité. Tout le lot est
+        comptabilisé en une seule requête (voir _post_entries).
+
+        Args:
+            contracts: Contrats de location (mybike.rental.contract)
+
+        Returns:
+            mybike.loyalty.ledger: Écritures créées
+        """
+        return self._post_entries([
+            {
+                'partner_id': contract.partner_id.id,
+                'contract_id': contract.id,
+                'points': int(contract.total_price * LOYALTY_POINTS_PER_EURO),
+                'reason': 'rental',
+            }
+            for contract in contracts if contract.partner_id.is_loyalty_member
+        ])
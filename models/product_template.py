@@ -6,6 +6,15 @@ Auteur: Harith Lemti & Younes Loukili
 """
 
 from odoo import models, fields, api
+from odoo.tools import SQL
+
+from .rental_availability import UNBOOKABLE_RENTAL_STATES
+from .rental_pricing import TARIFF_FIELDS
+from .website_cache import CATALOG_FIELDS, HOMEPAGE_FIELDS
+
+
+# Champs filtrables du catalogue de location, avec compteur par valeur
+CATALOG_FACET_FIELDS = ('frame_size', 'wheel_size', 'is_electric', 'bike_brand')
 
 
 class ProductTemplate(models.Model):
@@ -21,6 +30,16 @@ class ProductTemplate(models.Model):
     """
     _inherit = 'product.template'
 
+    # Index partiels du catalogue de location (domaine is_rental + rental_state
+    # [+ bike_category], pagination par id): seuls les vélos de location sont indexés
+    _rental_catalog_idx = models.Index("(rental_state, id) WHERE is_rental IS TRUE")
+    _rental_category_idx = models.Index("(bike_category, rental_state, id) WHERE is_rental IS TRUE")
+
+    # Un numéro de série identifie un seul vélo (lecture code-barres au comptoir)
+    _serial_number_uniq = models.UniqueIndex(
+        "(serial_number) WHERE serial_number IS NOT NULL",
+        "Ce numéro de série est déjà attribué à un autre vélo.")
+
     # ============================================================================
     # CATÉGORIE ET INFORMATIONS DE BASE
     # ============================================================================
@@ -63,6 +82,7 @@ class ProductTemplate(models.Model):
 
     serial_number = fields.Char(
         string='Numéro de Série',
+        copy=False,
         help='Numéro de série unique du vélo pour identification et traçabilité')
 
     # ============================================================================
@@ -166,6 +186,178 @@ class ProductTemplate(models.Model):
         for product in self:
             product.is_electric = product.bike_category == 'electric'
 
+    # ============================================================================
+    # MÉTHODES CRUD
+    # ============================================================================
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Vide le cache des pages du site si un vélo est créé.
+        """
+        templates = super(ProductTemplate, self).create(vals_list)
+        if templates._is_website_cache_stale():
+            self.env['mybike.website.cache'].invalidate()
+        return templates
+
+    def write(self, vals):
+        """
+        Vide les caches mémoire si un champ qu'ils contiennent change.
+
+        - Tarifs (mybike.rental.pricing): prix et caution
+        - Pages du site (mybike.website.cache): prix, publication, nom,
+          image et catégorie des vélos, passage en ou hors maintenance
+
+        Seuls ces caches sont invalidés (génération de cache, voir
+        IrConfigParameter._bump_cache_generation), sur tous les workers.
+        """
+        # Avant l'écriture: l'ancien état de location compte aussi
+        website_stale = self._is_website_cache_stale(vals)
+        res = super(ProductTemplate, self).write(vals)
+        if any(field in vals for field in TARIFF_FIELDS):
+            self.env['mybike.rental.pricing'].invalidate_tariffs()
+        elif website_stale:
+            self.env['mybike.website.cache'].invalidate()
+        return res
+
+    def unlink(self):
+        """
+        Vide le cache des pages du site si un vélo est supprimé.
+        """
+        stale = self._is_website_cache_stale()
+        res = super(ProductTemplate, self).unlink()
+        if stale:
+            self.env['mybike.website.cache'].invalidate()
+        return res
+
+    def _is_website_cache_stale(self, vals=None):
+        """
+        Indique si une modification rend obsolète le cache des pages du site.
+
+        Seuls les vélos (location ou catégorie vélo) apparaissent sur les pages
+        mises en cache: les autres produits ne vident pas le cache. Un
+        changement d'état de location ne compte que s'il fait entrer ou sortir
+        le vélo du catalogue (maintenance, vendu): à appeler avant l'écriture.
+
+        Args:
+            vals: Valeurs écrites (None pour une création ou une suppression)
+
+        Returns:
+            bool
+        """
+        if vals is not None:
+            state_change = 'rental_state' in vals and (
+                vals['rental_state'] in UNBOOKABLE_RENTAL_STATES
+                or any(template.rental_state in UNBOOKABLE_RENTAL_STATES for template in self))
+            if not state_change and not any(field in vals for field in CATALOG_FIELDS + HOMEPAGE_FIELDS):
+                return False
+            if 'is_rental' in vals or 'bike_category' in vals:
+                return True
+        return any(template.is_rental or template.bike_category for template in self)
+
+    # ============================================================================
+    # STATISTIQUES DE LOCATION
+    # ============================================================================
+
+    @api.model
+    def _increment_rental_stats(self, stats):
+        """
+        Ajoute des heures et des revenus aux statistiques de plusieurs vélos.
+
+        Les compteurs sont incrémentés côté base par un seul UPDATE ... FROM
+        (VALUES ...): pas de lecture-modification-écriture en Python, donc
+        pas de mise à jour perdue quand deux caisses clôturent des contrats
+        du même vélo en même temps.
+
+        Args:
+            stats: dict {product_template_id: (heures, revenu)}
+        """
+        if not stats:
+            return
+        stat_fields = ['total_rental_hours', 'total_rental_revenue']
+        self.flush_model(stat_fields)
+        self.env.cr.execute(SQL(
+            """
+            UPDATE %(table)s AS pt
+               SET total_rental_hours = COALESCE(pt.total_rental_hours, 0) + v.hours,
+                   total_rental_revenue = COALESCE(pt.total_rental_revenue, 0) + v.revenue
+              FROM (VALUES %(values)s) AS v(id, hours, revenue)
+             WHERE pt.id = v.id
+            """,
+            table=SQL.identifier(self._table),
+            values=SQL(', ').join(
+                SQL('(%s, %s::float8, %s::float8)', tmpl_id, hours, revenue)
+                for tmpl_id, (hours, revenue) in stats.items()
+            ),
+        ))
+        self.invalidate_model(stat_fields)
+
+    # ============================================================================
+    # CATALOGUE DE LOCATION
+    # ============================================================================
+
+    @api.model
+    def _get_rental_catalog_facets(self, domain, selected=None):
+        """
+        Compte les vélos par valeur de chaque filtre du catalogue.
+
+        Le compteur d'une valeur indique le nombre de vélos affichés si l'on
+        choisit cette valeur: il tient compte des autres filtres actifs, mais
+        pas du filtre du champ compté lui-même (sinon un filtre actif masquerait
+        toutes ses autres valeurs).
+
+        Tous les compteurs sont calculés par une seule requête groupée
+        (GROUP BY GROUPING SETS), au lieu d'une requête de comptage par
+        filtre. GROUPING(colonne) vaut 0 sur les lignes du groupe de cette
+        colonne, ce qui permet de répartir les résultats par filtre; chaque
+        filtre a son propre COUNT(*) FILTER (WHERE ...) qui applique les
+        autres filtres actifs.
+
+        Args:
+            domain: Domaine des vélos du catalogue, sans les filtres de
+                    CATALOG_FACET_FIELDS
+            selected: dict {champ: valeur} des filtres actifs parmi
+                      CATALOG_FACET_FIELDS (optionnel)
+
+        Returns:
+            dict: {champ: [(valeur, nombre), ...]} pour chaque champ de
+                  CATALOG_FACET_FIELDS, trié par valeur, sans les valeurs non
+                  renseignées ni les valeurs sans vélo
+        """
+        selected = selected or {}
+        query = self._search(domain)
+        query.order = None
+        columns = [SQL.identifier(query.table, fname) for fname in CATALOG_FACET_FIELDS]
+        conditions = {
+            fname: SQL("%s = %s", column, selected[fname])
+            for fname, column in zip(CATALOG_FACET_FIELDS, columns) if fname in selected
+        }
+        counts = [
+            SQL("COUNT(*) FILTER (WHERE %s)", SQL(" AND ").join(
+                [condition for other, condition in conditions.items() if other != fname]
+                or [SQL("TRUE")]))
+            for fname in CATALOG_FACET_FIELDS
+        ]
+        query.groupby = SQL(
+            "GROUPING SETS (%s)", SQL(", ").join(SQL("(%s)", column) for column in columns))
+        rows = self.env.execute_query(query.select(
+            *[SQL("GROUPING(%s)", column) for column in columns],
+            *columns,
+            *counts,
+        ))
+
+        size = len(CATALOG_FACET_FIELDS)
+        facets = {fname: [] for fname in CATALOG_FACET_FIELDS}
+        for row in rows:
+            grouping, values, count = row[:size], row[size:2 * size], row[2 * size:]
+            index = grouping.index(0)
+            if values[index] is None or values[index] == '' or not count[index]:
+                continue
+            facets[CATALOG_FACET_FIELDS[index]].append((values[index], count[index]))
+        for items in facets.values():
+            items.sort(key=lambda item: item[0])
+        return facets
+
     # ============================================================================
     # MÉTHODES ONCHANGE (réactions aux changements utilisateur)
     # ============================================================================
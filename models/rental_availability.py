@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Rental Availability (Disponibilité des Vélos)
+Description: Moteur de disponibilité par intervalle de temps pour les vélos de location
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import models, api
+from odoo.tools import SQL
+
+
+# États de contrat qui réservent le vélo sur leur période [start_date, end_date)
+# Les contrats annulés ou clôturés libèrent le vélo. Un contrat retourné ne le
+# réserve plus que jusqu'à son retour réel (voir BOOKING_END_SQL).
+BOOKING_STATES = ('draft', 'confirmed', 'ongoing', 'returned')
+
+# Fin effective de la réservation d'un contrat: un vélo rendu en avance est
+# libre dès son retour (actual_return_date), un retard ne prolonge pas la
+# réservation au-delà de end_date. LEAST ignore actual_return_date tant qu'il
+# est vide; GREATEST garde un intervalle valide pour un retour avant le début.
+BOOKING_END_SQL = "GREATEST(start_date, LEAST(end_date, actual_return_date))"
+
+# États du vélo qui l'excluent de toute réservation, quelle que soit la période
+UNBOOKABLE_RENTAL_STATES = ('maintenance', 'sold')
+
+
+class RentalAvailability(models.AbstractModel):
+    """
+    Moteur de disponibilité des vélos de location.
+
+    La disponibilité n'est plus un simple drapeau (rental_state) mais se calcule
+    à partir des périodes réservées par les contrats (mybike.rental.contract).
+    Les lignes de commandes confirmées sont matérialisées en contrats lors de
+    RentalOrder.action_confirm, la table des contrats est donc la seule source.
+
+    Les requêtes s'appuient sur l'index (product_id, start_date, end_date) des
+    contrats: une recherche d'intervalle ne parcourt que les réservations des
+    vélos concernés. Aucun état n'est mis en cache, l'index reste donc exact
+    lors des confirmations, annulations, retours et replanifications.
+
+    Deux intervalles [a, b) et [c, d) se chevauchent si a < d et c < b.
+    """
+    _name = 'mybike.rental.availability'
+    _description = 'Moteur de Disponibilité Location'
+
+    # ============================================================================
+    # REQUÊTES D'INTERVALLE
+    # ============================================================================
+
+    @api.model
+    def _get_booked_product_ids(self, start, end, product_ids=None, exclude_order_ids=None):
+        """
+        Retourne les vélos (product.product) réservés sur l'intervalle [start, end).
+
+        Args:
+            start: Début de l'intervalle (datetime UTC)
+            end: Fin de l'intervalle (datetime UTC)
+            product_ids: Limite la recherche à ces vélos (optionnel)
+            exclude_order_ids: Commandes dont les contrats sont ignorés
+
+        Returns:
+            set: Identifiants des product.product réservés
+        """
+        if product_ids is not None and not product_ids:
+            return set()
+
+        Contract = self.env['mybike.rental.contract']
+        Contract.flush_model(['product_id', 'start_date', 'end_date', 'actual_return_date',
+                              'state', 'order_id'])
+
+        conditions = [
+            SQL("state IN %s", BOOKING_STATES),
+            SQL("start_date < %s", end),
+            SQL("%s > %s", SQL(BOOKING_END_SQL), start),
+        ]
+        if product_ids is not None:
+            conditions.append(SQL("product_id IN %s", tuple(product_ids)))
+        if exclude_order_ids:
+            conditions.append(SQL(
+                "(order_id IS NULL OR order_id NOT IN %s)", tuple(exclude_order_ids)))
+
+        self.env.cr.execute(SQL(
+            "SELECT DISTINCT product_id FROM %s WHERE %s",
+            SQL.identifier(Contract._table),
+            SQL(" AND ").join(conditions),
+        ))
+        return {row[0] for row in self.env.cr.fetchall()}
+
+    @api.model
+    def is_available(self, product_id, start, end, exclude_order_ids=None):
+        """
+        Indique si un vélo est libre sur l'intervalle [start, end).
+
+        Args:
+            product_id: Identifiant du product.product
+            start: Début de l'intervalle (datetime UTC)
+            end: Fin de l'intervalle (datetime UTC)
+
+        Returns:
+            bool: True si aucun contrat actif ne chevauche l'intervalle
+        """
+        product = self.env['product.product'].browse(product_id)
+        if product.product_tmpl_id.rental_state in UNBOOKABLE_RENTAL_STATES:
+            return False
+        return product_id not in self._get_booked_product_ids(
+            start, end, product_ids=[product_id], exclude_order_ids=exclude_order_ids)
+
+    @api.model
+    def get_templates_availability(self, template_ids, start, end):
+        """
+        Calcule la disponibilité d'un lot de modèles de vélos sur [start, end).
+
+        Une seule requête d'intervalle est faite pour toutes les variantes
+        du lot, quel que soit le nombre de vélos demandés.
+
+        Args:
+            template_ids: Identifiants des product.template à vérifier
+            start: Début de l'intervalle (datetime UTC)
+            end: Fin de l'intervalle (datetime UTC)
+
+        Returns:
+            dict: {template_id: bool} pour chaque modèle existant
+        """
+        templates = self.env['product.template'].browse(template_ids).exists()
+        booked = self._get_booked_product_ids(
+            start, end, product_ids=templates.product_variant_ids.ids)
+        return {
+            template.id: bool(
+                template.is_rental
+                and template.rental_state not in UNBOOKABLE_RENTAL_STATES
+                and any(variant.id not in booked for variant in template.product_variant_ids)
+            )
+            for template in templates
+        }
+
+    @api.model
+    def get_booked_template_ids(self, start, end):
+        """
+        Retourne les modèles de vélos dont toutes les variantes sont réservées
+        sur [start, end).
+
+        Le résultat est borné par le nombre de réservations de la période et
+        non par la taille du parc: il sert à exclure ces modèles d'un domaine
+        de recherche paginé (catalogue du site).
+
+        Args:
+            start: Début de l'intervalle (datetime UTC)
+            end: Fin de l'intervalle (datetime UTC)
+
+        Returns:
+            list: Identifiants des product.template entièrement réservés
+        """
+        booked = self._get_booked_product_ids(start, end)
+        templates = self.env['product.product'].browse(list(booked)).product_tmpl_id
+        return [
+            template.id for template in templates
+            if all(variant.id in booked for variant in template.product_variant_ids)
+        ]
@@ -5,8 +5,31 @@ Description: Gestion complète du cycle de vie d'un contrat de location de vélo
 Auteur: Harith Lemti & Younes Loukili
 """
 
+from collections import defaultdict
+
+from psycopg2 import errors
+
 from odoo import models, fields, api
-from odoo.exceptions import UserError
+from odoo.exceptions import UserError, ValidationError
+from odoo.tools import SQL, frozendict
+
+from .rental_pricing import (
+    RENTAL_PRICE_FIELDS, compute_rental_duration, compute_best_rental_price, format_rental_breakdown,
+)
+from .res_partner import COMPLETED_RENTAL_STATES, ACTIVE_RENTAL_STATES
+from .rental_availability import BOOKING_END_SQL
+
+# Champs qui définissent la réservation d'un vélo (voir _no_double_booking)
+BOOKING_FIELDS = ('product_id', 'start_date', 'end_date', 'actual_return_date', 'state')
+
+# Champs dont dépend la contribution d'un contrat aux statistiques client; les
+# dépendances du montant s'y ajoutent (voir _get_rental_stat_dependencies)
+RENTAL_STAT_ROOT_FIELDS = ('partner_id', 'state', 'total_price')
+
+# Nombre de contrats en retard réclamés par requête du cron des frais de retard
+LATE_FEE_BATCH_SIZE = 500
+
+DOUBLE_BOOKING_MESSAGE = "Ce vélo est déjà réservé sur cette période (chevauchement avec un autre contrat)."
 
 
 class RentalContract(models.Model):
@@ -35,6 +58,36 @@ class RentalContract(models.Model):
     _inherit = ['mail.thread', 'mail.activity.mixin']  # Chatter + activités
     _order = 'start_date desc'
 
+    # Index de recherche d'intervalle (voir mybike.rental.availability)
+    _product_period_idx = models.Index('(product_id, start_date, end_date)')
+
+    # Statistiques client (partner_id + state) et historique "Mes locations"
+    _partner_state_idx = models.Index('(partner_id, state)')
+    _partner_start_idx = models.Index('(partner_id, start_date DESC, id DESC)')
+
+    # Contrats en retard: seuls les contrats en cours sont indexés
+    _overdue_idx = models.Index("(end_date) WHERE state = 'ongoing'")
+
+    # ============================================================================
+    # CONTRAINTES SQL
+    # ============================================================================
+
+    _period_check = models.Constraint(
+        'CHECK (end_date > start_date)',
+        "La date de fin doit être après la date de début.")
+
+    # Interdit deux réservations actives du même vélo sur des périodes qui se
+    # chevauchent. L'index GiST de la contrainte rend la détection atomique et
+    # sûre en concurrence, sans verrou côté Python. int4range remplace l'égalité
+    # sur product_id pour éviter de dépendre de l'extension btree_gist. Un vélo
+    # rendu en avance est libre dès son retour réel (voir BOOKING_END_SQL).
+    _no_double_booking = models.Constraint(
+        "EXCLUDE USING gist ("
+        "int4range(product_id, product_id, '[]') WITH &&, "
+        "tsrange(start_date, %s, '[)') WITH &&"
+        ") WHERE (state NOT IN ('cancelled', 'closed'))" % BOOKING_END_SQL,
+        DOUBLE_BOOKING_MESSAGE)
+
     # ============================================================================
     # INFORMATIONS PRINCIPALES
     # ============================================================================
@@ -123,6 +176,40 @@ class RentalContract(models.Model):
         store=True,
         help='Montant de base de la location (prix × durée)')
 
+    # Tarifs de la période figés à la confirmation (règles de tarification et
+    # multiplicateur de demande compris): voir _get_best_price
+    tariff_frozen = fields.Boolean(
+        string='Tarifs Figés',
+        readonly=True,
+        copy=False,
+        help='Les tarifs de la location ont été figés à la confirmation')
+
+    tariff_hour = fields.Float(
+        string='Tarif Heure Figé',
+        readonly=True,
+        copy=False)
+
+    tariff_day = fields.Float(
+        string='Tarif Jour Figé',
+        readonly=True,
+        copy=False)
+
+    tariff_week = fields.Float(
+        string='Tarif Semaine Figé',
+        readonly=True,
+        copy=False)
+
+    tariff_month = fields.Float(
+        string='Tarif Mois Figé',
+        readonly=True,
+        copy=False)
+
+    demand_multiplier = fields.Float(
+        string='Multiplicateur de Demande',
+        readonly=True,
+        copy=False,
+        help='Multiplicateur de demande appliqué aux tarifs à la confirmation')
+
     # ============================================================================
     # CAUTION ET FRAIS SUPPLÉMENTAIRES
     # ============================================================================
@@ -151,6 +238,19 @@ class RentalContract(models.Model):
         default=0.0,
         help='Frais facturés en cas de retour tardif (€)')
 
+    late_fee_date = fields.Datetime(
+        string='Frais de Retard Calculés le',
+        readonly=True,
+        copy=False,
+        help='Date du dernier calcul automatique des frais de retard')
+
+    late_fee_manual = fields.Boolean(
+        string='Frais de Retard Saisis à la Main',
+        default=False,
+        copy=False,
+        help='Coché dès que les frais de retard sont saisis ou annulés à la main: '
+             'le calcul automatique ne les écrase plus. Décocher pour le réactiver.')
+
     damage_fee = fields.Float(
         string='Frais Dommages',
         default=0.0,
@@ -255,6 +355,11 @@ class RentalContract(models.Model):
 
         Le numéro est généré via une séquence Odoo configurée dans
         data/sequence.xml. Format: CONT/YYYY/XXXX
+        Les numéros d'un lot sont réservés en un seul appel
+        (voir IrSequence._next_by_code_batch).
+
+        Une violation de la contrainte _no_double_booking est convertie en
+        ValidationError.
 
         Args:
             vals_list: Liste de dictionnaires de valeurs
@@ -262,52 +367,227 @@ class RentalContract(models.Model):
         Returns:
             Enregistrements créés
         """
-        for vals in vals_list:
-            if vals.get('name', 'Nouveau') == 'Nouveau':
-                vals['name'] = self.env['ir.sequence'].next_by_code('mybike.rental.contract') or 'Nouveau'
-        return super(RentalContract, self).create(vals_list)
+        # Réserver tous les numéros du lot en un seul appel à la séquence
+        to_name = [vals for vals in vals_list if vals.get('name', 'Nouveau') == 'Nouveau']
+        names = self.env['ir.sequence']._next_by_code_batch('mybike.rental.contract', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or 'Nouveau'
+        try:
+            with self.env.cr.savepoint():
+                contracts = super(RentalContract, self).create(vals_list)
+        except errors.ExclusionViolation:
+            raise ValidationError(DOUBLE_BOOKING_MESSAGE)
+
+        self.env['res.partner']._apply_rental_stat_deltas(contracts._get_rental_stat_contributions())
+        return contracts
+
+    def write(self, vals):
+        """
+        Vérifie immédiatement la contrainte anti double réservation et
+        maintient les statistiques de location des clients
+        (voir _before_write_hooks et _after_write_hooks).
+
+        Des frais de retard écrits par cette méthode sont considérés comme
+        saisis à la main (late_fee_manual): les calculs automatiques passent
+        par _write_grouped.
+        """
+        if 'late_fee' in vals and 'late_fee_manual' not in vals:
+            vals = dict(vals, late_fee_manual=True)
+        fnames = set(vals)
+        old_contributions = self._before_write_hooks(fnames)
+        res = super(RentalContract, self).write(vals)
+        self._after_write_hooks(fnames, old_contributions)
+        return res
+
+    def _before_write_hooks(self, fnames):
+        """
+        Relève la contribution des contrats aux statistiques client avant une
+        écriture, si l'écriture peut la changer (état, client, montant).
+
+        Args:
+            fnames: Champs écrits
+
+        Returns:
+            dict: Contributions avant l'écriture (voir _get_rental_stat_contributions),
+                  ou None si l'écriture ne les change pas
+        """
+        if fnames & self._get_rental_stat_dependencies():
+            return self._get_rental_stat_contributions()
+        return None
+
+    def _after_write_hooks(self, fnames, old_contributions):
+        """
+        Termine une écriture des contrats.
+
+        L'écriture ORM étant différée, les champs de réservation sont envoyés
+        en base dans un savepoint pour que la violation de _no_double_booking
+        soit levée ici, sous forme de ValidationError lisible. Si l'écriture a
+        changé la contribution des contrats aux statistiques client, seule la
+        différence est appliquée, en une requête pour tout le lot.
+
+        Args:
+            fnames: Champs écrits
+            old_contributions: Résultat de _before_write_hooks
+        """
+        if fnames & set(BOOKING_FIELDS):
+            try:
+                with self.env.cr.savepoint(flush=False):
+                    self.flush_recordset(list(BOOKING_FIELDS))
+            except errors.ExclusionViolation:
+                raise ValidationError(DOUBLE_BOOKING_MESSAGE)
+
+        if old_contributions is not None:
+            deltas = self._get_rental_stat_contributions()
+            for partner_id, (count, amount, active) in old_contributions.items():
+                delta = deltas[partner_id]
+                delta[0] -= count
+                delta[1] -= amount
+                delta[2] -= active
+            self.env['res.partner']._apply_rental_stat_deltas(deltas)
+
+    def unlink(self):
+        """
+        Retire la contribution des contrats supprimés des statistiques client.
+        """
+        deltas = {
+            partner_id: [-count, -amount, -active]
+            for partner_id, (count, amount, active) in self._get_rental_stat_contributions().items()
+        }
+        res = super(RentalContract, self).unlink()
+        self.env['res.partner']._apply_rental_stat_deltas(deltas)
+        return res
+
+    def _write_grouped(self, vals_by_id, shared_vals=None):
+        """
+        Écrit des valeurs différentes sur un lot de contrats.
+
+        Les valeurs communes (shared_vals) sont écrites en une fois sur tout
+        le lot, puis les valeurs propres à chaque contrat avec une écriture ORM
+        par groupe de contrats aux valeurs identiques (envoyées en base au
+        flush). La vérification des réservations et les statistiques client
+        (voir _after_write_hooks) ne sont exécutées qu'une fois pour le lot,
+        quel que soit le nombre de groupes.
+
+        Args:
+            vals_by_id: dict {contract_id: dict de valeurs}
+            shared_vals: Valeurs communes à tous les contrats du lot (optionnel)
+        """
+        contracts = self.browse(list(vals_by_id))
+        shared_vals = shared_vals or {}
+        fnames = set(shared_vals).union(*vals_by_id.values())
+        if not contracts or not fnames:
+            return
+        old_contributions = contracts._before_write_hooks(fnames)
+        if shared_vals:
+            super(RentalContract, contracts).write(shared_vals)
+        groups = defaultdict(list)
+        for contract_id, vals in vals_by_id.items():
+            if vals:
+                groups[frozendict(vals)].append(contract_id)
+        for vals, contract_ids in groups.items():
+            super(RentalContract, self.browse(contract_ids)).write(dict(vals))
+        contracts._after_write_hooks(fnames, old_contributions)
+
+    @api.model
+    def _get_rental_stat_dependencies(self):
+        """
+        Retourne les champs dont l'écriture peut changer la contribution d'un
+        contrat aux statistiques client.
+
+        Dérivés des @api.depends des champs calculés (total_price, subtotal,
+        ...) via le registre: un champ ajouté au calcul du montant (ex: le
+        vélo, les tarifs figés) est suivi sans liste à maintenir à la main.
+
+        Returns:
+            set: Noms de champs du contrat
+        """
+        names = set(RENTAL_STAT_ROOT_FIELDS)
+        todo = [self._fields[name] for name in RENTAL_STAT_ROOT_FIELDS if self._fields[name].compute]
+        while todo:
+            for dependency in self.pool.field_depends[todo.pop()]:
+                name = dependency.split('.')[0]
+                if name not in names:
+                    names.add(name)
+                    if self._fields[name].compute:
+                        todo.append(self._fields[name])
+        return names
+
+    def _get_rental_stat_contributions(self):
+        """
+        Calcule la contribution des contrats aux statistiques de location client.
+
+        Returns:
+            defaultdict: {partner_id: [nb contrats, montant terminé, nb actifs]}
+        """
+        contributions = defaultdict(lambda: [0, 0.0, 0])
+        for contract in self:
+            partner_stats = contributions[contract.partner_id.id]
+            partner_stats[0] += 1
+            if contract.state in COMPLETED_RENTAL_STATES:
+                partner_stats[1] += contract.total_price
+            if contract.state in ACTIVE_RENTAL_STATES:
+                partner_stats[2] += 1
+        return contributions
 
     # ============================================================================
     # MÉTHODES CALCULÉES
     # ============================================================================
 
-    @api.depends('start_date', 'end_date')
+    @api.depends('rental_type', 'start_date', 'end_date')
     def _compute_duration(self):
         """
         Calcule la durée de location selon le type de tarification.
 
-        Conversions selon rental_type:
+        Utilise compute_rental_duration (models/rental_pricing.py), la même
+        règle que la ligne de commande et le devis du site web:
         - hour: différence en heures
-        - day: différence en jours entiers (minimum 1)
+        - day: différence en jours (24 h)
         - week: différence en jours / 7
         - month: différence en jours / 30
 
-        La durée est ensuite utilisée pour calculer le montant.
+        La durée est informative: le montant est calculé au meilleur tarif
+        (voir _compute_subtotal).
         """
         for contract in self:
-            if contract.start_date and contract.end_date:
-                delta = contract.end_date - contract.start_date
-                if contract.rental_type == 'hour':
-                    contract.duration = delta.total_seconds() / 3600
-                elif contract.rental_type == 'day':
-                    contract.duration = delta.days or 1
-                elif contract.rental_type == 'week':
-                    contract.duration = delta.days / 7
-                elif contract.rental_type == 'month':
-                    contract.duration = delta.days / 30
-            else:
-                contract.duration = 0
-
-    @api.depends('unit_price', 'duration')
+            contract.duration = compute_rental_duration(
+                contract.rental_type, contract.start_date, contract.end_date)
+
+    @api.depends('product_id', 'unit_price', 'rental_type', 'start_date', 'end_date',
+                 'tariff_frozen', 'tariff_hour', 'tariff_day', 'tariff_week', 'tariff_month')
     def _compute_subtotal(self):
         """
-        Calcule le sous-total de base de la location.
+        Calcule le sous-total de base de la location, au meilleur tarif.
 
-        Formule simple: prix_unitaire × durée
+        Même règle que la ligne de commande (voir _get_best_price).
         Les frais supplémentaires sont ajoutés dans _compute_total_price
         """
         for contract in self:
-            contract.subtotal = contract.unit_price * contract.duration
+            contract.subtotal = contract._get_best_price()[0]
+
+    def _get_best_price(self):
+        """
+        Calcule le meilleur prix du contrat (compute_best_rental_price).
+
+        Le prix unitaire du contrat remplace le tarif de son type de location
+        (voir RentalPricing.get_line_tariff). Une fois le contrat confirmé, les
+        tarifs figés (tariff_*) remplacent les tarifs du moment: un changement
+        de dates ou la facture ne dépendent plus des règles de tarification
+        ni de la demande courantes.
+
+        Returns:
+            tuple: (montant, {type de location: nombre})
+        """
+        self.ensure_one()
+        pricing = self.env['mybike.rental.pricing']
+        if self.tariff_frozen:
+            tariff = pricing._override_unit_price(
+                {rental_type: self['tariff_' + rental_type] for rental_type in RENTAL_PRICE_FIELDS},
+                self.rental_type, self.unit_price)
+        else:
+            tariff = pricing.get_line_tariff(
+                self.product_id.product_tmpl_id, self.rental_type, self.unit_price,
+                self.start_date, self.end_date)
+        return compute_best_rental_price(tariff, self.start_date, self.end_date)
 
     @api.depends('subtotal', 'late_fee', 'damage_fee', 'additional_fees')
     def _compute_total_price(self):
@@ -328,19 +608,43 @@ class RentalContract(models.Model):
     # ACTIONS WORKFLOW
     # ============================================================================
 
+    def _check_workflow_state(self, allowed_states, message):
+        """
+        Valide tout le lot avant une action workflow.
+
+        Args:
+            allowed_states: États autorisés pour l'action
+            message: Message d'erreur
+
+        Raises:
+            UserError: Si au moins un contrat n'est pas dans un état autorisé,
+                       avec la liste des contrats concernés
+        """
+        invalid = self.filtered(lambda c: c.state not in allowed_states)
+        if invalid:
+            raise UserError("%s\n%s" % (message, ", ".join(invalid.mapped('name'))))
+
     def action_confirm(self):
         """
-        Confirme le contrat.
+        Confirme les contrats.
 
-        Vérifie que le contrat est en brouillon avant de le confirmer.
+        Vérifie que tous les contrats sont en brouillon avant de les confirmer,
+        fige les tarifs de la période des contrats qui ne les ont pas encore
+        (voir RentalPricing.get_tariff_snapshot), puis les confirme en une
+        seule écriture.
         À ce stade, le vélo n'est pas encore marqué comme loué.
 
         Raises:
-            UserError: Si le contrat n'est pas en brouillon
+            UserError: Si un contrat n'est pas en brouillon
         """
-        self.ensure_one()
-        if self.state != 'draft':
-            raise UserError("Seuls les contrats en brouillon peuvent être confirmés.")
+        self._check_workflow_state(('draft',), "Seuls les contrats en brouillon peuvent être confirmés.")
+
+        pricing = self.env['mybike.rental.pricing']
+        self._write_grouped({
+            contract.id: pricing.get_tariff_snapshot(
+                contract.product_id.product_tmpl_id, contract.start_date, contract.end_date)
+            for contract in self if not contract.tariff_frozen
+        })
 
         self.write({
             'state': 'confirmed',
@@ -349,27 +653,26 @@ class RentalContract(models.Model):
 
     def action_start_rental(self):
         """
-        Démarre la location (vélo retiré par le client).
+        Démarre les locations (vélos retirés par les clients).
 
-        Cette méthode:
-        1. Vérifie que le contrat est confirmé
-        2. Vérifie que la caution a été payée
-        3. Marque le vélo comme 'loué' (rental_state = 'rented')
-        4. Passe le contrat à l'état 'ongoing'
+        Fonctionne sur un lot (ex: départ d'une sortie de groupe):
+        1. Vérifie que tous les contrats sont confirmés
+        2. Vérifie que toutes les cautions ont été payées
+        3. Marque tous les vélos comme 'loués' en une écriture
+        4. Passe tous les contrats à l'état 'ongoing' en une écriture
 
         Raises:
-            UserError: Si le contrat n'est pas confirmé ou si la caution n'est pas payée
+            UserError: Si un contrat n'est pas confirmé ou si une caution n'est pas payée
         """
-        self.ensure_one()
-        if self.state != 'confirmed':
-            raise UserError("Le contrat doit être confirmé d'abord.")
+        self._check_workflow_state(('confirmed',), "Le contrat doit être confirmé d'abord.")
 
-        if not self.deposit_paid:
-            raise UserError("La caution doit être payée avant de retirer le vélo.")
+        unpaid = self.filtered(lambda c: not c.deposit_paid)
+        if unpaid:
+            raise UserError("La caution doit être payée avant de retirer le vélo.\n%s"
+                            % ", ".join(unpaid.mapped('name')))
 
-        # Mettre le vélo en état "loué"
-        product_tmpl = self.product_id.product_tmpl_id
-        product_tmpl.write({
+        # Mettre les vélos en état "loué"
+        self.product_id.product_tmpl_id.write({
             'rental_state': 'rented',
         })
 
@@ -410,41 +713,152 @@ class RentalContract(models.Model):
             }
         }
 
-    def action_close_contract(self):
+    def action_return_bikes(self):
         """
-        Clôture le contrat et génère la facture.
+        Ouvre l'assistant de retour groupé (ex: retour d'une sortie de groupe).
 
-        Cette méthode finale du workflow:
-        1. Vérifie que le vélo a été retourné
-        2. Génère la facture si pas déjà facturé
-        3. Remet le vélo disponible (rental_state = 'available')
-        4. Met à jour les statistiques du vélo (heures louées, revenus)
-        5. Passe le contrat à l'état 'closed'
+        L'assistant liste tous les contrats sélectionnés, avec l'état, les
+        dommages et la déduction de caution de chaque vélo, et enregistre
+        tous les retours en une seule transaction.
+
+        Returns:
+            dict: Action pour ouvrir le wizard en popup
 
         Raises:
-            UserError: Si le vélo n'a pas été retourné (état != returned)
+            UserError: Si un vélo n'est pas en location (état != ongoing)
         """
-        self.ensure_one()
-        if self.state != 'returned':
-            raise UserError("Le vélo doit être retourné avant de clôturer le contrat.")
+        self._check_workflow_state(('ongoing',), "Le vélo doit être en location pour être retourné.")
 
-        # Générer la facture si nécessaire
-        if not self.invoiced:
-            self._generate_invoice()
+        return {
+            'name': 'Retour Groupé de Vélos',
+            'type': 'ir.actions.act_window',
+            'res_model': 'mybike.rental.return.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {
+                'default_line_ids': [(0, 0, {'contract_id': contract.id}) for contract in self],
+            }
+        }
 
-        # Remettre le vélo disponible
-        product_tmpl = self.product_id.product_tmpl_id
-        product_tmpl.write({
-            'rental_state': 'available',
-        })
+    @api.model
+    def action_scan_serial_number(self, serial_number):
+        """
+        Traite la lecture du code-barres (numéro de série) d'un vélo au comptoir.
+
+        - Contrat en cours: ouvre l'assistant de retour
+        - Contrat confirmé: démarre la location et ouvre le contrat
+
+        Args:
+            serial_number: Numéro de série lu par la douchette
+
+        Returns:
+            dict: Action à exécuter par le client
+
+        Raises:
+            UserError: Si le vélo est inconnu ou n'a aucun contrat en cours ou confirmé
+        """
+        contract = self._find_by_serial_number(serial_number)
+        if contract.state == 'ongoing':
+            return contract.action_return_bike()
+
+        contract.action_start_rental()
+        return {
+            'name': 'Contrat de Location',
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'view_mode': 'form',
+            'res_id': contract.id,
+            'target': 'current',
+        }
+
+    @api.model
+    def _find_by_serial_number(self, serial_number):
+        """
+        Retrouve le contrat courant d'un vélo à partir de son numéro de série.
+
+        Une seule requête: numéro de série (index unique) → variantes du vélo
+        → contrats en cours ou confirmés (index product_id + dates). Le contrat
+        en cours est prioritaire, sinon le contrat confirmé qui commence le
+        plus tôt.
+
+        Args:
+            serial_number: Numéro de série du vélo
+
+        Returns:
+            mybike.rental.contract: Contrat en cours ou confirmé
+
+        Raises:
+            UserError: Si le vélo est inconnu ou n'a aucun contrat en cours ou confirmé
+        """
+        serial_number = (serial_number or '').strip()
+        self.env['product.template'].flush_model(['serial_number'])
+        self.flush_model(['product_id', 'state', 'start_date'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT pt.id, c.id
+              FROM product_template pt
+              LEFT JOIN product_product pp ON pp.product_tmpl_id = pt.id
+              LEFT JOIN %(contract)s c ON c.product_id = pp.id
+                                      AND c.state IN ('ongoing', 'confirmed')
+             WHERE pt.serial_number = %(serial_number)s
+             ORDER BY c.state = 'ongoing' DESC NULLS LAST, c.start_date
+             LIMIT 1
+            """,
+            contract=SQL.identifier(self._table),
+            serial_number=serial_number,
+        ))
+        row = self.env.cr.fetchone()
+        if not row:
+            raise UserError("Aucun vélo ne porte le numéro de série %s." % serial_number)
+        if not row[1]:
+            raise UserError("Aucun contrat en cours ou confirmé pour le vélo %s."
+                            % self.env['product.template'].browse(row[0]).display_name)
+        return self.browse(row[1])
+
+    def action_close_contract(self):
+        """
+        Clôture les contrats et génère les factures.
+
+        Cette méthode finale du workflow fonctionne sur un lot:
+        1. Vérifie que tous les vélos ont été retournés
+        2. Génère les factures des contrats pas encore facturés, en un seul
+           create (une facture par client si le contexte contient
+           mybike_invoice_group_by_partner)
+        3. Remet les vélos disponibles (rental_state = 'available') en une écriture
+        4. Incrémente atomiquement les statistiques des vélos (heures louées,
+           revenus) en une seule requête
+        5. Comptabilise les points de fidélité gagnés sur tout le lot, en une
+           seule requête (voir LoyaltyLedger._post_contract_accruals)
+        6. Passe tous les contrats à l'état 'closed' en une écriture
+
+        Raises:
+            UserError: Si un vélo n'a pas été retourné (état != returned)
+        """
+        self._check_workflow_state(('returned',), "Le vélo doit être retourné avant de clôturer le contrat.")
+
+        # Générer les factures si nécessaire (une seule création pour le lot)
+        self.filtered(lambda c: not c.invoiced)._generate_invoices(
+            group_by_partner=self.env.context.get('mybike_invoice_group_by_partner', False))
 
-        # Mettre à jour les statistiques du vélo
-        product_tmpl.write({
-            'total_rental_hours': product_tmpl.total_rental_hours + self.duration,
-            'total_rental_revenue': product_tmpl.total_rental_revenue + self.total_price,
+        # Remettre les vélos disponibles
+        product_tmpls = self.product_id.product_tmpl_id
+        product_tmpls.write({
+            'rental_state': 'available',
             'last_rental_date': fields.Date.today(),
         })
 
+        # Mettre à jour les statistiques des vélos: cumul par vélo sur le lot,
+        # puis un seul incrément atomique en base pour tous les vélos
+        stats = defaultdict(lambda: [0.0, 0.0])
+        for contract in self:
+            product_stats = stats[contract.product_id.product_tmpl_id.id]
+            product_stats[0] += contract.duration
+            product_stats[1] += contract.total_price
+        self.env['product.template']._increment_rental_stats(stats)
+
+        # Points de fidélité: une écriture par contrat, un incrément par client
+        self.env['mybike.loyalty.ledger']._post_contract_accruals(self)
+
         self.write({
             'state': 'closed',
         })
@@ -452,22 +866,22 @@ class RentalContract(models.Model):
 
     def action_cancel(self):
         """
-        Annule le contrat.
+        Annule les contrats.
 
         Peut être utilisé à tout moment sauf quand le contrat est clôturé.
-        Si le vélo était en location (ongoing), le remet automatiquement disponible.
+        Les vélos des contrats en location (ongoing) sont remis disponibles
+        en une seule écriture.
 
         Raises:
-            UserError: Si le contrat est déjà clôturé ou annulé
+            UserError: Si un contrat est déjà clôturé ou annulé
         """
-        self.ensure_one()
-        if self.state in ('closed', 'cancelled'):
-            raise UserError("Ce contrat ne peut plus être annulé.")
+        self._check_workflow_state(
+            ('draft', 'confirmed', 'ongoing', 'returned'), "Ce contrat ne peut plus être annulé.")
 
-        # Remettre le vélo disponible si nécessaire
-        if self.state == 'ongoing':
-            product_tmpl = self.product_id.product_tmpl_id
-            product_tmpl.write({
+        # Remettre les vélos disponibles si nécessaire
+        ongoing = self.filtered(lambda c: c.state == 'ongoing')
+        if ongoing:
+            ongoing.product_id.product_tmpl_id.write({
                 'rental_state': 'available',
             })
 
@@ -480,75 +894,139 @@ class RentalContract(models.Model):
     # FACTURATION
     # ============================================================================
 
-    def _generate_invoice(self):
+    def _prepare_invoice_line_values(self):
         """
-        Génère la facture client pour la location.
+        Prépare les lignes de facture d'un contrat.
 
-        Crée une facture (account.move) avec:
-        - Ligne principale: location du vélo
+        - Ligne principale: location du vélo au meilleur tarif, avec le détail
+          de la combinaison appliquée (ex: 1 semaine + 2 jours)
         - Lignes supplémentaires: frais de retard, dommages, autres
 
-        La facture reste en brouillon, l'utilisateur doit la valider manuellement.
-
         Note: La caution n'apparaît pas sur la facture car elle est gérée séparément
+
+        Returns:
+            list: Commandes (0, 0, vals) pour invoice_line_ids
         """
         self.ensure_one()
+        breakdown = format_rental_breakdown(self._get_best_price()[1])
+        lines = [
+            (0, 0, {
+                'name': f'Location {self.product_id.display_name} - {self.name} ({breakdown})',
+                'product_id': self.product_id.id,
+                'quantity': 1,
+                'price_unit': self.subtotal,
+            }),
+        ]
+
+        # Frais de retard, de dommages et supplémentaires si applicables
+        fees = [
+            ('Frais de retard', self.late_fee),
+            ('Frais de dommages', self.damage_fee),
+            ('Frais supplémentaires', self.additional_fees),
+        ]
+        for label, amount in fees:
+            if amount > 0:
+                lines.append((0, 0, {
+                    'name': f'{label} - {self.name}',
+                    'quantity': 1,
+                    'price_unit': amount,
+                }))
+        return lines
 
-        # Préparer les lignes de facture
-        invoice_vals = {
-            'move_type': 'out_invoice',  # Facture client
-            'partner_id': self.partner_id.id,
-            'invoice_date': fields.Date.today(),
-            'invoice_line_ids': [
-                (0, 0, {
-                    'name': f'Location {self.product_id.display_name} - {self.name}',
-                    'product_id': self.product_id.id,
-                    'quantity': self.duration,
-                    'price_unit': self.unit_price,
-                }),
-            ]
-        }
+    def _generate_invoices(self, group_by_partner=False):
+        """
+        Génère les factures client d'un lot de contrats.
 
-        # Ajouter les frais de retard si applicable
-        if self.late_fee > 0:
-            invoice_vals['invoice_line_ids'].append(
-                (0, 0, {
-                    'name': 'Frais de retard',
-                    'quantity': 1,
-                    'price_unit': self.late_fee,
-                })
-            )
-
-        # Ajouter les frais de dommages si applicable
-        if self.damage_fee > 0:
-            invoice_vals['invoice_line_ids'].append(
-                (0, 0, {
-                    'name': 'Frais de dommages',
-                    'quantity': 1,
-                    'price_unit': self.damage_fee,
-                })
-            )
-
-        # Ajouter les frais supplémentaires si applicable
-        if self.additional_fees > 0:
-            invoice_vals['invoice_line_ids'].append(
-                (0, 0, {
-                    'name': 'Frais supplémentaires',
-                    'quantity': 1,
-                    'price_unit': self.additional_fees,
-                })
-            )
+        Toutes les factures (account.move) sont créées en un seul
+        create(vals_list), puis liées aux contrats en une seule requête.
 
-        # Créer la facture
-        invoice = self.env['account.move'].create(invoice_vals)
+        Les factures restent en brouillon, l'utilisateur doit les valider manuellement.
 
-        # Lier la facture au contrat
-        self.write({
-            'invoice_id': invoice.id,
-            'invoiced': True,
-        })
+        Args:
+            group_by_partner: Si True, une seule facture par client avec une
+                              ligne par contrat et par type de frais.
+                              Sinon, une facture par contrat.
+
+        Returns:
+            account.move: Factures créées
+
+        Raises:
+            UserError: Si un contrat n'est pas retourné/clôturé ou est déjà facturé
+        """
+        invalid = self.filtered(lambda c: c.state not in ('returned', 'closed') or c.invoiced)
+        if invalid:
+            raise UserError("Seuls les contrats retournés et non facturés peuvent être facturés.\n%s"
+                            % ", ".join(invalid.mapped('name')))
+        if not self:
+            return self.env['account.move']
+
+        # Regrouper les contrats par facture à créer
+        if group_by_partner:
+            groups = defaultdict(lambda: self.browse())
+            for contract in self:
+                groups[contract.partner_id] |= contract
+            contract_groups = list(groups.values())
+        else:
+            contract_groups = list(self)
+
+        today = fields.Date.today()
+        invoice_vals_list = []
+        for contracts in contract_groups:
+            invoice_line_ids = []
+            for contract in contracts:
+                invoice_line_ids += contract._prepare_invoice_line_values()
+            invoice_vals_list.append({
+                'move_type': 'out_invoice',  # Facture client
+                'partner_id': contracts.partner_id.id,
+                'invoice_date': today,
+                'invoice_line_ids': invoice_line_ids,
+            })
+
+        # Créer les factures
+        invoices = self.env['account.move'].create(invoice_vals_list)
+
+        # Lier les factures aux contrats: une écriture pour tout le lot
+        # (invoiced), puis un seul UPDATE ... FROM (VALUES ...) pour invoice_id
+        self.write({'invoiced': True})
+        self.flush_recordset(['invoice_id'])
+        self.env.execute_query(SQL(
+            """
+            UPDATE %(table)s AS c
+               SET invoice_id = v.invoice_id
+              FROM (VALUES %(values)s) AS v(id, invoice_id)
+             WHERE c.id = v.id
+            """,
+            table=SQL.identifier(self._table),
+            values=SQL(', ').join(
+                SQL('(%s::int, %s::int)', contract.id, invoice.id)
+                for contracts, invoice in zip(contract_groups, invoices)
+                for contract in contracts
+            ),
+        ))
+        self.invalidate_recordset(['invoice_id'])
+        self.modified(['invoice_id'])
+
+        return invoices
+
+    def action_generate_invoices(self):
+        """
+        Facturation groupée des contrats sélectionnés.
 
-        return invoice
+        Crée une facture par client regroupant tous ses contrats retournés
+        (action disponible depuis la liste des contrats).
+
+        Returns:
+            dict: Action pour afficher les factures créées
+        """
+        invoices = self._generate_invoices(group_by_partner=True)
+        return {
+            'name': 'Factures',
+            'type': 'ir.actions.act_window',
+            'res_model': 'account.move',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', invoices.ids)],
+            'target': 'current',
+        }
 
     def action_view_invoice(self):
         """
@@ -566,3 +1044,65 @@ class RentalContract(models.Model):
             'res_id': self.invoice_id.id,
             'target': 'current',
         }
+
+    # ============================================================================
+    # FRAIS DE RETARD (tâche planifiée)
+    # ============================================================================
+
+    @api.model
+    def _cron_compute_late_fees(self, batch_size=LATE_FEE_BATCH_SIZE):
+        """
+        Calcule les frais de retard des contrats en cours dont la date de fin
+        prévue est dépassée (tâche planifiée).
+
+        Les contrats sont réclamés par lots avec SELECT ... FOR UPDATE SKIP
+        LOCKED sur l'index partiel _overdue_idx: plusieurs workers peuvent se
+        partager le travail sans traiter deux fois le même contrat, et un
+        contrat verrouillé par un retour en cours au comptoir est simplement
+        ignoré jusqu'au prochain passage. Les contrats dont les frais ont été
+        saisis ou annulés à la main (late_fee_manual) ne sont pas recalculés.
+        Les frais sont calculés pour tout le lot depuis le cache des tarifs,
+        puis écrits avec les statistiques client mises à jour une seule fois
+        pour le lot (voir _write_grouped).
+
+        Chaque lot est validé (commit) dès qu'il est écrit: les verrous du lot
+        sont relâchés tout de suite, et une tâche interrompue (timeout du
+        worker) garde les lots déjà traités. Pas de commit en mode test.
+
+        Args:
+            batch_size: Nombre de contrats réclamés par requête
+
+        Returns:
+            int: Nombre de contrats traités
+        """
+        now = fields.Datetime.now()
+        auto_commit = not self.env.registry.in_test_mode()
+        processed = 0
+        while True:
+            # Les contrats déjà traités pendant ce passage ont late_fee_date >= now
+            self.flush_model(['state', 'end_date', 'late_fee', 'late_fee_date', 'late_fee_manual'])
+            self.env.cr.execute(SQL(
+                """
+                SELECT id FROM %s
+                 WHERE state = 'ongoing' AND end_date < %s
+                   AND late_fee_manual IS NOT TRUE
+                   AND (late_fee_date IS NULL OR late_fee_date < %s)
+                 ORDER BY end_date
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+                """,
+                SQL.identifier(self._table), now, now, batch_size,
+            ))
+            contracts = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not contracts:
+                return processed
+
+            late_fees = self.env['mybike.rental.pricing'].get_late_fees(
+                contracts, dict.fromkeys(contracts.ids, now))
+            contracts._write_grouped({
+                contract.id: {'late_fee': late_fees[contract.id], 'late_fee_date': now}
+                for contract in contracts
+            })
+            processed += len(contracts)
+            if auto_commit:
+                self.env.cr.commit()
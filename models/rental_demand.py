@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Rental Demand (Tarification Dynamique)
+Description: Taux d'utilisation par catégorie et multiplicateurs de prix selon la demande
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+from odoo.tools import SQL, frozendict
+
+
+# États de contrat qui occupent un vélo (location réelle ou réservation ferme)
+UTILIZATION_STATES = ('confirmed', 'ongoing', 'returned', 'closed')
+
+# Fenêtres glissantes: (clé, début en jours, fin en jours, poids dans l'indice de demande)
+# Les jours sont relatifs au moment du calcul (négatif = passé)
+UTILIZATION_WINDOWS = (
+    ('past_30', -30, 0, 0.2),
+    ('past_7', -7, 0, 0.3),
+    ('next_7', 0, 7, 0.5),
+)
+
+# Multiplicateur de prix par palier d'indice de demande (premier palier atteint)
+DEMAND_MULTIPLIER_STEPS = (
+    (0.85, 1.25),
+    (0.70, 1.15),
+    (0.50, 1.0),
+    (0.25, 0.95),
+    (0.0, 0.9),
+)
+
+
+class RentalDemand(models.Model):
+    """
+    Table des multiplicateurs de prix selon la demande (une ligne par catégorie).
+
+    Une tâche planifiée calcule le taux d'utilisation de chaque catégorie de
+    vélos sur des fenêtres glissantes (30 et 7 derniers jours, 7 prochains
+    jours), en déduit un indice de demande pondéré puis un multiplicateur de
+    prix (DEMAND_MULTIPLIER_STEPS).
+
+    Le multiplicateur est appliqué aux tarifs d'une période (voir
+    RentalPricing.get_tariff): réservation sur le site, devis et prix unitaire
+    des lignes de commande. Il est figé sur le contrat à la confirmation
+    (voir RentalPricing.get_tariff_snapshot).
+
+    La table est lue en mémoire (ormcache): la lecture des multiplicateurs au
+    moment du devis ne coûte donc aucune requête.
+    """
+    _name = 'mybike.rental.demand'
+    _description = 'Demande et Multiplicateur de Prix Location'
+    _order = 'bike_category'
+
+    _bike_category_uniq = models.Constraint(
+        'UNIQUE (bike_category)',
+        "Une seule ligne de demande par catégorie de vélo.")
+
+    bike_category = fields.Selection(
+        selection=lambda self: self.env['product.template']._fields['bike_category'].selection,
+        string='Catégorie Vélo',
+        required=True,
+        readonly=True)
+
+    fleet_size = fields.Integer(
+        string='Vélos',
+        readonly=True,
+        help='Nombre de vélos de location de la catégorie')
+
+    utilization_past_30 = fields.Float(
+        string='Utilisation 30 j',
+        readonly=True,
+        help='Part des heures-vélo louées sur les 30 derniers jours (0 à 1)')
+
+    utilization_past_7 = fields.Float(
+        string='Utilisation 7 j',
+        readonly=True,
+        help='Part des heures-vélo louées sur les 7 derniers jours (0 à 1)')
+
+    utilization_next_7 = fields.Float(
+        string='Réservations 7 j',
+        readonly=True,
+        help='Part des heures-vélo déjà réservées sur les 7 prochains jours (0 à 1)')
+
+    demand_index = fields.Float(
+        string='Indice de Demande',
+        readonly=True,
+        help='Moyenne pondérée des taux d\'utilisation')
+
+    multiplier = fields.Float(
+        string='Multiplicateur',
+        default=1.0,
+        readonly=True,
+        help='Coefficient appliqué aux tarifs de location de la catégorie')
+
+    computed_at = fields.Datetime(
+        string='Calculé le',
+        readonly=True)
+
+    # ============================================================================
+    # LECTURE (chemin chaud)
+    # ============================================================================
+
+    @api.model
+    def _get_multipliers(self):
+        """
+        Retourne les multiplicateurs de prix par catégorie (en cache mémoire).
+
+        Returns:
+            frozendict: {catégorie: multiplicateur}
+        """
+        generation = self.env['ir.config_parameter']._get_cache_generation('demand')
+        return self._read_multipliers(generation)
+
+    @api.model
+    @tools.ormcache('generation')
+    def _read_multipliers(self, generation):
+        """
+        Lit les multiplicateurs, en cache pour la génération courante
+        (invalidée par _cron_compute_demand quand un multiplicateur change).
+        """
+        return frozendict({
+            demand.bike_category: demand.multiplier
+            for demand in self.sudo().search([])
+        })
+
+    # ============================================================================
+    # CALCUL (tâche planifiée)
+    # ============================================================================
+
+    @api.model
+    def _cron_compute_demand(self):
+        """
+        Recalcule les taux d'utilisation et les multiplicateurs de prix.
+
+        Tout le calcul d'utilisation est fait par PostgreSQL en deux requêtes
+        agrégées, quel que soit le volume de contrats:
+        - heures-vélo louées par (catégorie, fenêtre): intersection de chaque
+          contrat avec chaque fenêtre, sommée en une passe
+        - taille du parc par catégorie
+
+        Le cache des multiplicateurs n'est invalidé (sur tous les workers) que
+        si un multiplicateur a changé. Les contrats confirmés gardent le
+        multiplicateur figé à leur confirmation (voir RentalContract.action_confirm).
+        """
+        now = fields.Datetime.now()
+        windows = {
+            key: (now + timedelta(days=start_days), now + timedelta(days=end_days), weight)
+            for key, start_days, end_days, weight in UTILIZATION_WINDOWS
+        }
+
+        Contract = self.env['mybike.rental.contract']
+        Contract.flush_model(['product_id', 'start_date', 'end_date', 'state'])
+        self.env['product.template'].flush_model(['bike_category', 'is_rental', 'rental_state'])
+
+        booked_hours = {
+            (category, key): hours
+            for category, key, hours in self.env.execute_query(SQL(
+                """
+                SELECT pt.bike_category, w.key,
+                       (SUM(EXTRACT(EPOCH FROM LEAST(c.end_date, w.stop) - GREATEST(c.start_date, w.start)))
+                        / 3600.0)::float8
+                  FROM %(contract)s c
+                  JOIN product_product pp ON pp.id = c.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                  JOIN (VALUES %(windows)s) AS w(key, start, stop)
+                    ON c.start_date < w.stop AND c.end_date > w.start
+                 WHERE c.state IN %(states)s
+                   AND pt.bike_category IS NOT NULL
+                 GROUP BY pt.bike_category, w.key
+                """,
+                contract=SQL.identifier(Contract._table),
+                windows=SQL(', ').join(
+                    SQL('(%s, %s::timestamp, %s::timestamp)', key, start, stop)
+                    for key, (start, stop, _weight) in windows.items()
+                ),
+                states=UTILIZATION_STATES,
+            ))
+        }
+        fleet = dict(self.env.execute_query(SQL(
+            """
+            SELECT pt.bike_category, COUNT(pp.id)
+              FROM product_template pt
+              JOIN product_product pp ON pp.product_tmpl_id = pt.id AND pp.active
+             WHERE pt.is_rental AND pt.active AND pt.bike_category IS NOT NULL
+               AND (pt.rental_state IS NULL OR pt.rental_state != 'sold')
+             GROUP BY pt.bike_category
+            """
+        )))
+
+        values_by_category = {}
+        for category, fleet_size in fleet.items():
+            values = {'fleet_size': fleet_size, 'computed_at': now, 'demand_index': 0.0}
+            for key, (start, stop, weight) in windows.items():
+                capacity = fleet_size * (stop - start).total_seconds() / 3600.0
+                utilization = min(booked_hours.get((category, key), 0.0) / capacity, 1.0)
+                values['utilization_' + key] = utilization
+                values['demand_index'] += weight * utilization
+            values['multiplier'] = next(
+                multiplier for threshold, multiplier in DEMAND_MULTIPLIER_STEPS
+                if values['demand_index'] >= threshold)
+            values_by_category[category] = values
+
+        old_multipliers = self._get_multipliers()
+        demands = {demand.bike_category: demand for demand in self.search([])}
+        self.browse([
+            demand.id for category, demand in demands.items() if category not in values_by_category
+        ]).unlink()
+        for category, values in values_by_category.items():
+            if category in demands:
+                demands[category].write(values)
+        self.create([
+            dict(values, bike_category=category)
+            for category, values in values_by_category.items() if category not in demands
+        ])
+
+        # Invalider les multiplicateurs (et les pages du site qui affichent les
+        # prix) seulement si l'un d'eux a changé, sans vider les autres caches
+        new_multipliers = {category: values['multiplier'] for category, values in values_by_category.items()}
+        if new_multipliers != dict(old_multipliers):
+            self.env['ir.config_parameter']._bump_cache_generation('demand', 'website')
@@ -8,6 +8,8 @@ Auteur: Harith Lemti & Younes Loukili
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
+from .rental_pricing import compute_best_rental_price
+
 
 class RentalOrder(models.Model):
     """
@@ -26,6 +28,9 @@ class RentalOrder(models.Model):
     _inherit = ['mail.thread', 'mail.activity.mixin']  # Ajoute chatter et activités
     _order = 'create_date desc'
 
+    # Historique "Mes locations" d'un client
+    _partner_create_idx = models.Index('(partner_id, create_date DESC, id DESC)')
+
     # ============================================================================
     # INFORMATIONS PRINCIPALES
     # ============================================================================
@@ -140,6 +145,8 @@ class RentalOrder(models.Model):
 
         La référence est générée via une séquence Odoo (ir.sequence) configurée
         dans data/sequence.xml. Format: LOC/YYYY/XXXX
+        Les numéros d'un lot sont réservés en un seul appel
+        (voir IrSequence._next_by_code_batch).
 
         Args:
             vals_list: Liste de dictionnaires de valeurs pour créer les enregistrements
@@ -147,9 +154,11 @@ class RentalOrder(models.Model):
         Returns:
             Enregistrements créés
         """
-        for vals in vals_list:
-            if vals.get('name', 'Nouveau') == 'Nouveau':
-                vals['name'] = self.env['ir.sequence'].next_by_code('mybike.rental.order') or 'Nouveau'
+        # Réserver tous les numéros du lot en un seul appel à la séquence
+        to_name = [vals for vals in vals_list if vals.get('name', 'Nouveau') == 'Nouveau']
+        names = self.env['ir.sequence']._next_by_code_batch('mybike.rental.order', len(to_name))
+        for vals, name in zip(to_name, names):
+            vals['name'] = name or 'Nouveau'
         return super(RentalOrder, self).create(vals_list)
 
     # ============================================================================
@@ -194,36 +203,54 @@ class RentalOrder(models.Model):
 
     def action_confirm(self):
         """
-        Confirme la commande et crée les contrats de location.
+        Confirme les commandes et crée les contrats de location.
 
         Cette méthode:
-        1. Vérifie qu'il y a au moins un vélo à louer
-        2. Crée un contrat de location (mybike.rental.contract) pour chaque ligne
-        3. Passe la commande à l'état 'confirmed'
+        1. Vérifie que chaque commande a au moins un vélo à louer
+        2. Prépare un contrat de location (mybike.rental.contract) par ligne,
+           pour toutes les commandes du lot
+        3. Crée tous les contrats en un seul create(vals_list)
+        4. Passe toutes les commandes à l'état 'confirmed' en une écriture
+
+        La contrainte _no_double_booking des contrats reste la garantie en cas
+        de confirmations simultanées du même vélo.
 
         Raises:
-            ValidationError: Si la commande n'a pas de ligne
+            ValidationError: Si une commande n'a pas de ligne ou si un vélo
+                             n'est plus disponible sur sa période
         """
-        for order in self:
-            # Validation: au moins une ligne requise
-            if not order.order_line_ids:
-                raise ValidationError("Vous devez ajouter au moins un vélo à louer.")
-
-            # Créer un contrat pour chaque ligne de commande
-            for line in order.order_line_ids:
-                contract = self.env['mybike.rental.contract'].create({
-                    'partner_id': order.partner_id.id,
-                    'product_id': line.product_id.id,
-                    'rental_type': line.rental_type,
-                    'start_date': line.start_date,
-                    'end_date': line.end_date,
-                    'unit_price': line.unit_price,
-                    'deposit_amount': line.deposit,
-                    'order_id': order.id,
-                })
-
-            # Passer à l'état confirmé
-            order.state = 'confirmed'
+        # Validation: au moins une ligne requise
+        empty_orders = self.filtered(lambda o: not o.order_line_ids)
+        if empty_orders:
+            raise ValidationError("Vous devez ajouter au moins un vélo à louer.\n%s"
+                                  % ", ".join(empty_orders.mapped('name')))
+
+        # Vélos réservés depuis la demande (ex: deux demandes du site pour le
+        # même vélo): toutes les lignes en conflit sont signalées ensemble. Une
+        # requête sur l'enveloppe des périodes du lot, puis une vérification
+        # exacte des seules lignes dont le vélo y est réservé
+        Availability = self.env['mybike.rental.availability'].sudo()
+        lines = self.order_line_ids
+        booked = Availability._get_booked_product_ids(
+            min(lines.mapped('start_date')), max(lines.mapped('end_date')),
+            product_ids=lines.product_id.ids, exclude_order_ids=self.ids)
+        conflicts = lines.filtered(lambda line: line.product_id.id in booked and not Availability.is_available(
+            line.product_id.id, line.start_date, line.end_date, exclude_order_ids=line.order_id.ids))
+        if conflicts:
+            raise ValidationError("Ces vélos ne sont plus disponibles sur la période demandée:\n%s" % "\n".join(
+                "%s: %s, du %s au %s" % (line.order_id.name, line.product_id.display_name,
+                                         line.start_date, line.end_date)
+                for line in conflicts))
+
+        # Un contrat pour chaque ligne de commande
+        contract_vals_list = [
+            line._prepare_contract_values()
+            for line in self.order_line_ids
+        ]
+        self.env['mybike.rental.contract'].create(contract_vals_list)
+
+        # Passer à l'état confirmé
+        self.write({'state': 'confirmed'})
 
     def action_cancel(self):
         """
@@ -262,6 +289,9 @@ class RentalOrderLine(models.Model):
     _description = 'Ligne Commande Location'
     _order = 'order_id, sequence, id'
 
+    # Lignes d'un vélo sur une période (planning, contrôle de disponibilité)
+    _product_period_idx = models.Index('(product_id, start_date, end_date)')
+
     # ============================================================================
     # RELATIONS
     # ============================================================================
@@ -275,6 +305,7 @@ class RentalOrderLine(models.Model):
         'mybike.rental.order',
         string='Commande',
         required=True,
+        index=True,
         ondelete='cascade',  # Supprime les lignes si la commande est supprimée
         help='Commande de location parente')
 
@@ -287,8 +318,8 @@ class RentalOrderLine(models.Model):
         string='Vélo',
         required=True,
         domain="[('product_tmpl_id.is_rental', '=', True), "
-               "('product_tmpl_id.rental_state', '=', 'available')]",
-        help='Vélo à louer (filtré sur les vélos disponibles à la location)')
+               "('product_tmpl_id.rental_state', 'not in', ('maintenance', 'sold'))]",
+        help='Vélo à louer (la disponibilité sur la période est vérifiée à l\'enregistrement)')
 
     product_name = fields.Char(
         related='product_id.name',
@@ -391,32 +422,26 @@ class RentalOrderLine(models.Model):
                 line.duration_hours = 0.0
                 line.duration_days = 0.0
 
-    @api.depends('unit_price', 'quantity', 'duration_hours', 'duration_days', 'rental_type')
+    @api.depends('product_id', 'unit_price', 'quantity', 'start_date', 'end_date', 'rental_type')
     def _compute_subtotal(self):
         """
-        Calcule le sous-total de la ligne selon le type de location.
+        Calcule le sous-total de la ligne au meilleur tarif.
 
-        Formules de calcul:
-        - hour: prix_unitaire × durée_heures × quantité
-        - day: prix_unitaire × durée_jours × quantité
-        - week: prix_unitaire × (durée_jours / 7) × quantité
-        - month: prix_unitaire × (durée_jours / 30) × quantité
+        La période est couverte par la combinaison de mois, semaines, jours et
+        heures la moins chère (compute_best_rental_price, models/rental_pricing.py),
+        la même règle que le contrat, le devis du site web et la facture.
+        Le prix unitaire de la ligne remplace le tarif de son type de location
+        (voir RentalPricing.get_line_tariff).
 
-        Note: Les semaines et mois sont calculés de manière proportionnelle
+        Formule: meilleur prix de la période × quantité, arrondi au centime.
         """
+        pricing = self.env['mybike.rental.pricing']
         for line in self:
-            if line.rental_type == 'hour':
-                line.subtotal = line.unit_price * line.duration_hours * line.quantity
-            elif line.rental_type == 'day':
-                line.subtotal = line.unit_price * line.duration_days * line.quantity
-            elif line.rental_type == 'week':
-                weeks = line.duration_days / 7.0
-                line.subtotal = line.unit_price * weeks * line.quantity
-            elif line.rental_type == 'month':
-                months = line.duration_days / 30.0
-                line.subtotal = line.unit_price * months * line.quantity
-            else:
-                line.subtotal = 0.0
+            tariff = pricing.get_line_tariff(
+                line.product_id.product_tmpl_id, line.rental_type, line.unit_price,
+                line.start_date, line.end_date)
+            line.subtotal = compute_best_rental_price(
+                tariff, line.start_date, line.end_date, line.quantity)[0]
 
     @api.depends('product_id', 'quantity')
     def _compute_deposit(self):
@@ -436,27 +461,49 @@ class RentalOrderLine(models.Model):
     # MÉTHODES ONCHANGE
     # ============================================================================
 
-    @api.onchange('product_id', 'rental_type')
+    @api.onchange('product_id', 'rental_type', 'start_date', 'end_date')
     def _onchange_product_rental_type(self):
         """
         Remplit automatiquement le prix unitaire selon le type de location.
 
-        Quand l'utilisateur sélectionne un vélo et/ou change le type de location,
-        cette méthode récupère automatiquement le prix correspondant depuis
-        le modèle de produit (rental_price_hour, rental_price_day, etc.)
+        Quand l'utilisateur sélectionne un vélo, change le type de location ou
+        la période, cette méthode récupère automatiquement le prix
+        correspondant: règle de tarification de la période
+        (mybike.rental.pricing.rule) ou, à défaut, tarif du modèle de produit
+        (rental_price_hour, rental_price_day, etc.)
 
         Améliore l'expérience utilisateur en évitant la saisie manuelle des prix.
         """
         if self.product_id and self.rental_type:
-            product_tmpl = self.product_id.product_tmpl_id
-            if self.rental_type == 'hour':
-                self.unit_price = product_tmpl.rental_price_hour
-            elif self.rental_type == 'day':
-                self.unit_price = product_tmpl.rental_price_day
-            elif self.rental_type == 'week':
-                self.unit_price = product_tmpl.rental_price_week
-            elif self.rental_type == 'month':
-                self.unit_price = product_tmpl.rental_price_month
+            self.unit_price = self.env['mybike.rental.pricing'].get_unit_price(
+                self.product_id.product_tmpl_id, self.rental_type, self.start_date, self.end_date)
+
+    # ============================================================================
+    # MÉTHODES UTILITAIRES
+    # ============================================================================
+
+    def _prepare_contract_values(self):
+        """
+        Prépare les valeurs du contrat de location issu de cette ligne.
+
+        Les tarifs de la période sont figés sur le contrat: la commande
+        confirmée vaut accord du client sur ces tarifs.
+
+        Returns:
+            dict: Valeurs pour mybike.rental.contract.create
+        """
+        self.ensure_one()
+        return dict(self.env['mybike.rental.pricing'].get_tariff_snapshot(
+            self.product_id.product_tmpl_id, self.start_date, self.end_date), **{
+            'partner_id': self.order_id.partner_id.id,
+            'product_id': self.product_id.id,
+            'rental_type': self.rental_type,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'unit_price': self.unit_price,
+            'deposit_amount': self.deposit,
+            'order_id': self.order_id.id,
+        })
 
     # ============================================================================
     # CONTRAINTES
@@ -473,3 +520,27 @@ class RentalOrderLine(models.Model):
         for line in self:
             if line.end_date and line.start_date and line.end_date <= line.start_date:
                 raise ValidationError("La date de fin doit être après la date de début.")
+
+    @api.constrains('product_id', 'start_date', 'end_date')
+    def _check_availability(self):
+        """
+        Valide que le vélo est libre sur la période demandée.
+
+        Interroge le moteur de disponibilité (mybike.rental.availability).
+        Les contrats issus de la même commande sont ignorés pour qu'une ligne
+        déjà confirmée puisse être modifiée sans entrer en conflit avec
+        son propre contrat.
+
+        Raises:
+            ValidationError: Si le vélo est déjà réservé sur cette période
+        """
+        Availability = self.env['mybike.rental.availability'].sudo()
+        for line in self:
+            if not (line.product_id and line.start_date and line.end_date):
+                continue
+            if not Availability.is_available(
+                    line.product_id.id, line.start_date, line.end_date,
+                    exclude_order_ids=line.order_id.ids):
+                raise ValidationError(
+                    "Le vélo %s n'est pas disponible du %s au %s."
+                    % (line.product_id.display_name, line.start_date, line.end_date))
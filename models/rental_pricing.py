@@ -0,0 +1,552 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Rental Pricing (Tarification Location)
+Description: Moteur de tarification (meilleur tarif) et cache des tarifs par vélo
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+import math
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+from odoo.fields import Domain
+from odoo.tools import float_round, frozendict
+
+
+# Nombre d'heures facturées par unité de chaque type de location
+RENTAL_TYPE_HOURS = {
+    'hour': 1.0,
+    'day': 24.0,
+    'week': 24.0 * 7,
+    'month': 24.0 * 30,
+}
+
+# Champ de product.template portant le tarif de chaque type de location
+RENTAL_PRICE_FIELDS = {
+    'hour': 'rental_price_hour',
+    'day': 'rental_price_day',
+    'week': 'rental_price_week',
+    'month': 'rental_price_month',
+}
+
+# Libellés (singulier, pluriel) des unités de location, pour le détail d'un prix
+RENTAL_TYPE_LABELS = {
+    'month': ('mois', 'mois'),
+    'week': ('semaine', 'semaines'),
+    'day': ('jour', 'jours'),
+    'hour': ('heure', 'heures'),
+}
+
+# Champs dont la modification invalide le cache des tarifs
+TARIFF_FIELDS = tuple(RENTAL_PRICE_FIELDS.values()) + ('rental_deposit', 'is_rental', 'bike_category')
+
+
+def compute_rental_duration(rental_type, start, end):
+    """
+    Calcule la durée d'une location dans l'unité de son type.
+
+    Durée affichée sur la ligne de commande, le contrat et le devis du site:
+    elle est proportionnelle, sans arrondi, sur la base de 1 jour = 24 h,
+    1 semaine = 7 jours et 1 mois = 30 jours. Le montant, lui, est calculé
+    par compute_best_rental_price.
+
+    Args:
+        rental_type: 'hour', 'day', 'week' ou 'month'
+        start: Début de la location (datetime)
+        end: Fin de la location (datetime)
+
+    Returns:
+        float: Durée en heures, jours, semaines ou mois (0 si incomplet)
+    """
+    if not start or not end or rental_type not in RENTAL_TYPE_HOURS:
+        return 0.0
+    hours = (end - start).total_seconds() / 3600.0
+    return hours / RENTAL_TYPE_HOURS[rental_type]
+
+
+def compute_rental_amount(unit_price, duration, quantity=1.0):
+    """
+    Calcule le montant d'une location, arrondi au centime.
+
+    Args:
+        unit_price: Prix unitaire du type de location (€)
+        duration: Durée dans l'unité du type (voir compute_rental_duration)
+        quantity: Nombre de vélos
+
+    Returns:
+        float: Montant arrondi à 2 décimales
+    """
+    return float_round(unit_price * duration * quantity, precision_digits=2)
+
+
+def _cover_hours(tariff, rental_types, hours):
+    """
+    Calcule la combinaison la moins chère couvrant `hours` heures avec les
+    unités `rental_types` (heure, jour, semaine), de la plus petite à la plus
+    grande.
+
+    Chaque unité est un multiple exact de la précédente (24 h, 7 jours): le
+    coût de la combinaison optimale des unités inférieures augmente donc d'un
+    montant constant par unité entière. Si une unité coûte moins que sa
+    couverture par les unités inférieures, on en prend autant que possible et
+    le reste est couvert soit par les unités inférieures, soit par une unité
+    de plus; sinon l'unité n'est jamais utilisée.
+
+    Returns:
+        tuple: (coût, {type de location: nombre}), coût infini si impossible
+    """
+    if hours <= 0:
+        return 0.0, {}
+    rental_type, lower_types = rental_types[-1], rental_types[:-1]
+    price = tariff.get(rental_type) or 0.0
+    unit_hours = int(RENTAL_TYPE_HOURS[rental_type])
+    if not lower_types:
+        return (price * hours, {rental_type: hours}) if price else (math.inf, {})
+
+    if not price or price >= _cover_hours(tariff, lower_types, unit_hours)[0]:
+        return _cover_hours(tariff, lower_types, hours)
+
+    units, remainder = divmod(hours, unit_hours)
+    remainder_cost, breakdown = _cover_hours(tariff, lower_types, remainder)
+    if remainder and price < remainder_cost:
+        units, remainder_cost, breakdown = units + 1, 0.0, {}
+    if units:
+        breakdown = dict(breakdown, **{rental_type: units})
+    return units * price + remainder_cost, breakdown
+
+
+def compute_best_rental_price(tariff, start, end, quantity=1.0):
+    """
+    Calcule le prix le plus bas d'une location en combinant les quatre tarifs
+    du vélo (heure, jour, semaine, mois).
+
+    Règle unique pour tout le module (ligne de commande, contrat, devis du
+    site, facture): chaque heure entamée est due, et la période est couverte
+    par la combinaison de mois (30 jours), semaines, jours et heures la moins
+    chère. Par exemple 9 jours = 1 semaine + 2 jours si c'est moins cher que
+    9 jours. Un tarif à 0 n'est pas proposé.
+
+    Args:
+        tariff: Tarifs du vélo {'hour', 'day', 'week', 'month'}
+                (voir RentalPricing._get_tariff)
+        start: Début de la location (datetime)
+        end: Fin de la location (datetime)
+        quantity: Nombre de vélos
+
+    Returns:
+        tuple: (montant arrondi au centime, {type de location: nombre})
+               (0, {}) si la période est invalide ou si aucun tarif n'est défini
+    """
+    if not tariff or not start or not end or end <= start:
+        return 0.0, {}
+    hours = math.ceil(round((end - start).total_seconds() / 3600.0, 6))
+    small_types = ('hour', 'day', 'week')
+
+    # Les mois (30 jours) ne sont pas un multiple des semaines: on essaie
+    # chaque nombre de mois possible (au plus quelques-uns)
+    best_cost, best_breakdown = _cover_hours(tariff, small_types, hours)
+    month_price = tariff.get('month') or 0.0
+    month_hours = int(RENTAL_TYPE_HOURS['month'])
+    if month_price:
+        for months in range(1, -(-hours // month_hours) + 1):
+            cost, breakdown = _cover_hours(tariff, small_types, hours - months * month_hours)
+            cost += months * month_price
+            if cost < best_cost:
+                best_cost, best_breakdown = cost, dict(breakdown, month=months)
+
+    if best_cost == math.inf:
+        return 0.0, {}
+    return compute_rental_amount(best_cost, 1.0, quantity), best_breakdown
+
+
+def format_rental_breakdown(breakdown):
+    """
+    Met en forme le détail d'un prix (ex: "1 semaine + 2 jours").
+
+    Args:
+        breakdown: {type de location: nombre} (voir compute_best_rental_price)
+
+    Returns:
+        str: Détail lisible, de la plus grande à la plus petite unité
+    """
+    return " + ".join(
+        "%s %s" % (breakdown[rental_type], RENTAL_TYPE_LABELS[rental_type][breakdown[rental_type] > 1])
+        for rental_type in RENTAL_TYPE_LABELS if breakdown.get(rental_type)
+    )
+
+
+def compute_late_fee(tariff, overrun_hours):
+    """
+    Calcule les frais de retard d'une location.
+
+    Chaque heure de retard entamée est facturée au tarif horaire du vélo,
+    ou à défaut au tarif journalier divisé par 24.
+
+    Args:
+        tariff: Tarifs du vélo (voir RentalPricing._get_tariff)
+        overrun_hours: Dépassement de la date de fin prévue, en heures
+
+    Returns:
+        float: Frais arrondis au centime (0 sans retard ou sans tarif)
+    """
+    if not tariff or overrun_hours <= 0:
+        return 0.0
+    hourly_price = tariff['hour'] or tariff['day'] / RENTAL_TYPE_HOURS['day']
+    return compute_rental_amount(hourly_price, math.ceil(overrun_hours))
+
+
+class RentalPricing(models.AbstractModel):
+    """
+    Service de tarification des locations.
+
+    Centralise le calcul des prix pour que le site web, la ligne de commande,
+    le contrat et la facture affichent le même montant (meilleur tarif, voir
+    compute_best_rental_price). Les tarifs de chaque vélo
+    (rental_price_* et rental_deposit) sont gardés en cache mémoire (ormcache)
+    et ce cache seul est invalidé à chaque modification de ces champs
+    (voir ProductTemplate.write et invalidate_tariffs).
+
+    Pour une période donnée, les règles de tarification
+    (mybike.rental.pricing.rule) remplacent les tarifs du vélo, puis le
+    multiplicateur de demande de la catégorie (mybike.rental.demand)
+    s'applique: voir get_tariff.
+    """
+    _name = 'mybike.rental.pricing'
+    _description = 'Tarification Location'
+
+    # ============================================================================
+    # CACHE DES TARIFS
+    # ============================================================================
+
+    @api.model
+    def _get_tariff(self, template):
+        """
+        Retourne les tarifs d'un modèle de vélo (mis en cache).
+
+        Le modèle est lu avec le contexte de prefetch de l'appelant: lors d'un
+        lot, le premier défaut de cache charge les tarifs de tous les vélos.
+
+        Args:
+            template: Enregistrement product.template
+
+        Returns:
+            frozendict: {'hour', 'day', 'week', 'month', 'deposit', 'is_rental',
+                        'category'} ou None si le modèle n'existe pas
+        """
+        generation = self.env['ir.config_parameter']._get_cache_generation('tariff')
+        return self._get_cached_tariff(template, generation)
+
+    @api.model
+    @tools.ormcache('template.id', 'generation')
+    def _get_cached_tariff(self, template, generation):
+        """
+        Lit les tarifs d'un modèle de vélo, en cache pour la génération courante
+        (invalidée par ProductTemplate.write, voir invalidate_tariffs).
+        """
+        if not template.exists():
+            return None
+        tariff = {
+            rental_type: template[field_name]
+            for rental_type, field_name in RENTAL_PRICE_FIELDS.items()
+        }
+        tariff['deposit'] = template.rental_deposit
+        tariff['is_rental'] = template.is_rental
+        tariff['category'] = template.bike_category
+        return frozendict(tariff)
+
+    @api.model
+    def invalidate_tariffs(self):
+        """
+        Invalide le cache des tarifs des vélos (et les pages du site qui les
+        affichent), sans vider les autres caches du registre.
+        """
+        self.env['ir.config_parameter']._bump_cache_generation('tariff', 'website')
+
+    @api.model
+    def get_tariff(self, template, start=None, end=None):
+        """
+        Retourne les tarifs d'un vélo, avec les règles de tarification et le
+        multiplicateur de demande de sa catégorie si la période est fournie.
+
+        Aucune requête SQL sur le chemin chaud: les tarifs du vélo, la table
+        des règles compilées et les multiplicateurs sont en cache mémoire.
+
+        Args:
+            template: Enregistrement product.template
+            start: Début de la location (datetime, optionnel)
+            end: Fin de la location (datetime, optionnel)
+
+        Returns:
+            frozendict: Tarifs (voir _get_tariff) ou None si le modèle n'existe pas
+        """
+        tariff = self._get_tariff(template.sudo())
+        if not tariff or not start or not end or end <= start:
+            return tariff
+        prices = dict(self.env['mybike.rental.pricing.rule']._match_prices(tariff['category'], start, end))
+        multiplier = self.env['mybike.rental.demand']._get_multipliers().get(tariff['category'], 1.0)
+        if multiplier != 1.0:
+            prices = {
+                rental_type: float_round(prices.get(rental_type, tariff[rental_type]) * multiplier,
+                                         precision_digits=2)
+                for rental_type in RENTAL_PRICE_FIELDS
+            }
+        return frozendict(tariff, **prices) if prices else tariff
+
+    @api.model
+    def get_tariff_snapshot(self, template, start, end):
+        """
+        Retourne les tarifs d'une location à figer sur un contrat confirmé.
+
+        Le contrat garde ainsi les tarifs (règles et multiplicateur de demande
+        compris) acceptés par le client: un recalcul ultérieur (changement de
+        dates, facture) ne dépend plus des règles ni de la demande du moment.
+
+        Args:
+            template: Enregistrement product.template
+            start: Début de la location (datetime)
+            end: Fin de la location (datetime)
+
+        Returns:
+            dict: Valeurs tariff_* et demand_multiplier pour mybike.rental.contract
+        """
+        tariff = self.get_tariff(template, start, end) or dict.fromkeys(RENTAL_PRICE_FIELDS, 0.0)
+        category = tariff.get('category', False)
+        values = {
+            'tariff_' + rental_type: tariff[rental_type] for rental_type in RENTAL_PRICE_FIELDS
+        }
+        values['demand_multiplier'] = self.env['mybike.rental.demand']._get_multipliers().get(category, 1.0)
+        values['tariff_frozen'] = True
+        return values
+
+    @api.model
+    def get_unit_price(self, template, rental_type, start=None, end=None):
+        """
+        Retourne le prix unitaire d'un vélo pour un type de location.
+
+        Args:
+            template: Enregistrement product.template
+            rental_type: 'hour', 'day', 'week' ou 'month'
+            start: Début de la location (optionnel, pour les règles de tarification)
+            end: Fin de la location (optionnel, pour les règles de tarification)
+
+        Returns:
+            float: Prix unitaire (0 si le type est inconnu)
+        """
+        tariff = self.get_tariff(template, start, end)
+        return tariff.get(rental_type, 0.0) if tariff else 0.0
+
+    @api.model
+    def get_line_tariff(self, template, rental_type, unit_price, start=None, end=None):
+        """
+        Retourne les tarifs à appliquer à une ligne de commande ou un contrat.
+
+        Ce sont les tarifs du vélo sur la période (voir get_tariff), où le
+        tarif du type de location de la ligne est remplacé par son prix
+        unitaire (éventuellement modifié à la main): le meilleur tarif tient
+        ainsi compte du prix négocié.
+
+        Args:
+            template: Enregistrement product.template
+            rental_type: 'hour', 'day', 'week' ou 'month'
+            unit_price: Prix unitaire de la ligne
+            start: Début de la location (datetime, optionnel)
+            end: Fin de la location (datetime, optionnel)
+
+        Returns:
+            frozendict: {'hour', 'day', 'week', 'month', ...}
+        """
+        tariff = self.get_tariff(template, start, end) or dict.fromkeys(RENTAL_PRICE_FIELDS, 0.0)
+        return self._override_unit_price(tariff, rental_type, unit_price)
+
+    @api.model
+    def _override_unit_price(self, tariff, rental_type, unit_price):
+        """
+        Remplace le tarif du type de location de la ligne par son prix unitaire.
+        """
+        if rental_type in RENTAL_PRICE_FIELDS:
+            tariff = frozendict(tariff, **{rental_type: unit_price})
+        return tariff
+
+    @api.model
+    def get_best_prices(self, templates, start, end):
+        """
+        Calcule le meilleur prix de plusieurs vélos pour une même période.
+
+        Utilisé par le catalogue pour afficher le prix de la période sur
+        chaque vélo. Les tarifs viennent du cache et le calcul n'est fait
+        qu'une fois par grille tarifaire distincte (les vélos d'une même
+        gamme partagent en général la même grille).
+
+        Args:
+            templates: Enregistrements product.template
+            start: Début de la location (datetime)
+            end: Fin de la location (datetime)
+
+        Returns:
+            dict: {template_id: (montant, {type de location: nombre})}
+        """
+        prices = {}
+        by_tariff = {}
+        for template in templates.sudo():
+            tariff = self.get_tariff(template, start, end)
+            if tariff not in by_tariff:
+                by_tariff[tariff] = compute_best_rental_price(tariff, start, end)
+            prices[template.id] = by_tariff[tariff]
+        return prices
+
+    @api.model
+    def get_display_tariffs(self, templates, start=None, end=None):
+        """
+        Retourne les tarifs affichés sur le site pour plusieurs vélos.
+
+        Ce sont les tarifs réellement facturés (règles de tarification et
+        multiplicateur de demande compris, voir get_tariff): pour la période
+        si elle est fournie, sinon pour une unité de chaque type de location
+        commençant maintenant.
+
+        Args:
+            templates: Enregistrements product.template
+            start: Début de la location (datetime, optionnel)
+            end: Fin de la location (datetime, optionnel)
+
+        Returns:
+            dict: {template_id: {type de location: prix}}
+        """
+        tariffs = {}
+        now = fields.Datetime.now()
+        for template in templates.sudo():
+            if start and end:
+                tariff = self.get_tariff(template, start, end) or {}
+                tariffs[template.id] = {
+                    rental_type: tariff.get(rental_type, 0.0) for rental_type in RENTAL_PRICE_FIELDS
+                }
+                continue
+            tariffs[template.id] = {
+                rental_type: self.get_unit_price(
+                    template, rental_type, now, now + timedelta(hours=RENTAL_TYPE_HOURS[rental_type]))
+                for rental_type in RENTAL_PRICE_FIELDS
+            }
+        return tariffs
+
+    @api.model
+    def get_price_domain(self, rental_type, price_min=None, price_max=None, start=None, end=None):
+        """
+        Traduit une fourchette de prix facturés en domaine sur product.template.
+
+        Le prix facturé dépend de la catégorie (règle de tarification et
+        multiplicateur de demande): par catégorie, soit une règle fixe le prix
+        et toute la catégorie est dans la fourchette ou non, soit le prix du
+        vélo s'applique et la fourchette est ramenée au prix du vélo (divisée
+        par le multiplicateur). Le filtre reste donc une condition SQL,
+        compatible avec la pagination et les compteurs du catalogue.
+
+        Args:
+            rental_type: 'hour', 'day', 'week' ou 'month'
+            price_min: Prix minimum (optionnel)
+            price_max: Prix maximum (optionnel)
+            start: Début de la location (datetime, optionnel, maintenant par défaut)
+            end: Fin de la location (datetime, optionnel, une unité par défaut)
+
+        Returns:
+            Domain: Domaine sur product.template
+        """
+        if price_min is None and price_max is None:
+            return Domain.TRUE
+        if not start or not end:
+            start = fields.Datetime.now()
+            end = start + timedelta(hours=RENTAL_TYPE_HOURS[rental_type])
+
+        Rule = self.env['mybike.rental.pricing.rule']
+        multipliers = self.env['mybike.rental.demand']._get_multipliers()
+        categories = [key for key, _label in self.env['product.template']._fields['bike_category'].selection]
+        domains = []
+        for category in categories + [False]:
+            multiplier = multipliers.get(category, 1.0)
+            rule_price = Rule._match_prices(category, start, end).get(rental_type)
+            if rule_price:
+                price = float_round(rule_price * multiplier, precision_digits=2)
+                if (price_min is None or price >= price_min) and (price_max is None or price <= price_max):
+                    domains.append(Domain('bike_category', '=', category))
+                continue
+            domain = Domain('bike_category', '=', category)
+            if price_min is not None:
+                domain &= Domain(RENTAL_PRICE_FIELDS[rental_type], '>=', price_min / multiplier)
+            if price_max is not None:
+                domain &= Domain(RENTAL_PRICE_FIELDS[rental_type], '<=', price_max / multiplier)
+            domains.append(domain)
+        return Domain.OR(domains)
+
+    @api.model
+    def get_late_fees(self, contracts, return_dates):
+        """
+        Calcule les frais de retard d'un lot de contrats.
+
+        Les tarifs sont lus depuis le cache: sur un défaut de cache, le
+        prefetch du lot charge tous les vélos en une requête.
+
+        Args:
+            contracts: Enregistrements mybike.rental.contract
+            return_dates: dict {contract_id: date de retour (datetime)}
+
+        Returns:
+            dict: {contract_id: frais de retard}
+        """
+        templates = contracts.sudo().product_id.product_tmpl_id
+        tariffs = {template.id: self._get_tariff(template) for template in templates}
+        return {
+            contract.id: compute_late_fee(
+                tariffs.get(contract.product_id.product_tmpl_id.id),
+                (return_dates[contract.id] - contract.end_date).total_seconds() / 3600.0,
+            )
+            for contract in contracts
+        }
+
+    # ============================================================================
+    # DEVIS
+    # ============================================================================
+
+    @api.model
+    def quote(self, items):
+        """
+        Calcule le prix de plusieurs locations en un appel.
+
+        Args:
+            items: Liste de dict {'bike_id', 'rental_type', 'start', 'end'}
+                   où bike_id est un product.template et start/end des datetime
+
+        Returns:
+            list: Un dict par item {'bike_id', 'rental_type', 'unit_price',
+                  'duration', 'hours', 'subtotal', 'breakdown', 'deposit'}
+                  ou {'bike_id', 'error'}; subtotal est le meilleur tarif
+        """
+        # Sur un défaut de cache, le prefetch du lot charge tous les vélos en une requête
+        templates = self.env['product.template'].sudo().browse(
+            list({item['bike_id'] for item in items}))
+        templates_by_id = {template.id: template for template in templates}
+
+        results = []
+        for item in items:
+            start, end = item['start'], item['end']
+            tariff = self.get_tariff(templates_by_id[item['bike_id']], start, end)
+            if not tariff or not tariff['is_rental']:
+                results.append({'bike_id': item['bike_id'], 'error': "Vélo non trouvé"})
+                continue
+            if item['rental_type'] not in RENTAL_PRICE_FIELDS:
+                results.append({'bike_id': item['bike_id'], 'error': "Type de location invalide"})
+                continue
+            if not start or not end or end <= start:
+                results.append({'bike_id': item['bike_id'], 'error': "Période invalide"})
+                continue
+
+            subtotal, breakdown = compute_best_rental_price(tariff, start, end)
+            results.append({
+                'bike_id': item['bike_id'],
+                'rental_type': item['rental_type'],
+                'unit_price': tariff[item['rental_type']],
+                'duration': compute_rental_duration(item['rental_type'], start, end),
+                'hours': (end - start).total_seconds() / 3600.0,
+                'subtotal': subtotal,
+                'breakdown': format_rental_breakdown(breakdown),
+                'deposit': tariff['deposit'],
+            })
+        return results
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Rental Pricing Rule (Règles de Tarification)
+Description: Règles de prix par catégorie, saison, type de jour et durée, compilées en mémoire
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from collections import defaultdict
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import ValidationError
+from odoo.tools import frozendict
+
+from .rental_pricing import RENTAL_PRICE_FIELDS
+
+
+# Mois de chaque saison (selon le mois de début de la location)
+SEASON_MONTHS = {
+    'spring': (3, 4, 5),
+    'summer': (6, 7, 8),
+    'autumn': (9, 10, 11),
+    'winter': (12, 1, 2),
+}
+
+# Jours du week-end (datetime.weekday: lundi = 0)
+WEEKEND_DAYS = (5, 6)
+
+
+class RentalPricingRule(models.Model):
+    """
+    Règle de tarification des locations.
+
+    Une règle fixe les tarifs (heure, jour, semaine, mois) d'une catégorie de
+    vélos pour une saison, un type de jour (semaine/week-end, selon le jour de
+    début) et une tranche de durée. La première règle qui correspond (ordre
+    de séquence) s'applique; un tarif à 0 sur la règle garde le tarif du vélo.
+    Sans règle correspondante, les tarifs du vélo (rental_price_*) s'appliquent.
+
+    Les règles sont compilées en une table en mémoire par worker (ormcache):
+    la résolution d'un prix ne fait aucune requête SQL. Toute modification
+    d'une règle invalide cette table seule (génération de cache), sur tous
+    les workers.
+    """
+    _name = 'mybike.rental.pricing.rule'
+    _description = 'Règle de Tarification Location'
+    _order = 'sequence, id'
+
+    # ============================================================================
+    # CRITÈRES D'APPLICATION
+    # ============================================================================
+
+    name = fields.Char(
+        string='Nom',
+        required=True,
+        help='Libellé de la règle (ex: VTT - week-end d\'été)')
+
+    active = fields.Boolean(
+        string='Active',
+        default=True)
+
+    sequence = fields.Integer(
+        string='Séquence',
+        default=10,
+        help='Priorité: la première règle qui correspond s\'applique')
+
+    bike_category = fields.Selection(
+        selection=lambda self: self.env['product.template']._fields['bike_category'].selection,
+        string='Catégorie Vélo',
+        help='Catégorie concernée (vide: toutes les catégories)')
+
+    season = fields.Selection([
+        ('all', 'Toute l\'année'),
+        ('spring', 'Printemps'),
+        ('summer', 'Été'),
+        ('autumn', 'Automne'),
+        ('winter', 'Hiver'),
+    ], string='Saison',
+       required=True,
+       default='all',
+       help='Saison du début de la location')
+
+    day_type = fields.Selection([
+        ('all', 'Tous les jours'),
+        ('weekday', 'Semaine'),
+        ('weekend', 'Week-end'),
+    ], string='Type de Jour',
+       required=True,
+       default='all',
+       help='Jour du début de la location')
+
+    min_duration_hours = fields.Float(
+        string='Durée Min (heures)',
+        default=0.0,
+        help='La règle s\'applique aux locations d\'au moins cette durée')
+
+    max_duration_hours = fields.Float(
+        string='Durée Max (heures)',
+        default=0.0,
+        help='La règle s\'applique aux locations de moins de cette durée (0: sans limite)')
+
+    # ============================================================================
+    # TARIFS
+    # ============================================================================
+
+    price_hour = fields.Float(
+        string='Prix / Heure',
+        help='Tarif horaire (€), 0 pour garder le tarif du vélo')
+
+    price_day = fields.Float(
+        string='Prix / Jour',
+        help='Tarif journalier (€), 0 pour garder le tarif du vélo')
+
+    price_week = fields.Float(
+        string='Prix / Semaine',
+        help='Tarif hebdomadaire (€), 0 pour garder le tarif du vélo')
+
+    price_month = fields.Float(
+        string='Prix / Mois',
+        help='Tarif mensuel (€), 0 pour garder le tarif du vélo')
+
+    # ============================================================================
+    # CONTRAINTES
+    # ============================================================================
+
+    @api.constrains('min_duration_hours', 'max_duration_hours')
+    def _check_duration_tier(self):
+        """
+        Vérifie que la tranche de durée est cohérente.
+
+        Raises:
+            ValidationError: Si la durée max est inférieure ou égale à la durée min
+        """
+        for rule in self:
+            if rule.max_duration_hours and rule.max_duration_hours <= rule.min_duration_hours:
+                raise ValidationError("La durée max doit être supérieure à la durée min (règle %s)." % rule.name)
+
+    # ============================================================================
+    # MÉTHODES CRUD (invalidation de la table compilée)
+    # ============================================================================
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Invalide la table des règles compilées (tous les workers).
+        """
+        rules = super(RentalPricingRule, self).create(vals_list)
+        self._invalidate_compiled_rules()
+        return rules
+
+    def write(self, vals):
+        """
+        Invalide la table des règles compilées (tous les workers).
+        """
+        res = super(RentalPricingRule, self).write(vals)
+        self._invalidate_compiled_rules()
+        return res
+
+    def unlink(self):
+        """
+        Invalide la table des règles compilées (tous les workers).
+        """
+        res = super(RentalPricingRule, self).unlink()
+        self._invalidate_compiled_rules()
+        return res
+
+    # ============================================================================
+    # TABLE COMPILÉE
+    # ============================================================================
+
+    def _invalidate_compiled_rules(self):
+        """
+        Invalide la table des règles compilées et les pages du site qui
+        affichent les prix, sans vider les autres caches du registre.
+        """
+        self.env['ir.config_parameter']._bump_cache_generation('pricing_rule', 'website')
+
+    @api.model
+    def _get_compiled_rules(self):
+        """
+        Retourne la table des règles compilées de la génération courante.
+
+        Returns:
+            frozendict: voir _compile_rules
+        """
+        generation = self.env['ir.config_parameter']._get_cache_generation('pricing_rule')
+        return self._compile_rules(generation)
+
+    @api.model
+    @tools.ormcache('generation')
+    def _compile_rules(self, generation):
+        """
+        Compile les règles actives en une table de recherche en mémoire.
+
+        Chaque règle devient un tuple (mois, jours, durée min, durée max, prix)
+        et les règles sont regroupées par catégorie de vélo (les règles sans
+        catégorie sont ajoutées à chaque catégorie), dans l'ordre de priorité.
+
+        Returns:
+            frozendict: {catégorie ou False: tuple de règles compilées}
+        """
+        rules = self.sudo().search([])
+        compiled = defaultdict(list)
+        categories = [key for key, _label in self.env['product.template']._fields['bike_category'].selection]
+        for rule in rules:
+            prices = frozendict({
+                rental_type: rule['price_' + rental_type]
+                for rental_type in RENTAL_PRICE_FIELDS if rule['price_' + rental_type]
+            })
+            if not prices:
+                continue
+            entry = (
+                frozenset(SEASON_MONTHS.get(rule.season, range(1, 13))),
+                frozenset(WEEKEND_DAYS if rule.day_type == 'weekend'
+                          else range(5) if rule.day_type == 'weekday' else range(7)),
+                rule.min_duration_hours,
+                rule.max_duration_hours or float('inf'),
+                prices,
+            )
+            for category in ([rule.bike_category] if rule.bike_category else categories + [False]):
+                compiled[category].append(entry)
+        return frozendict({category: tuple(entries) for category, entries in compiled.items()})
+
+    @api.model
+    def _match_prices(self, bike_category, start, end):
+        """
+        Retourne les tarifs de la première règle qui correspond à une location.
+
+        Aucune requête SQL: la recherche parcourt la table compilée en mémoire.
+
+        Args:
+            bike_category: Catégorie du vélo (ou False)
+            start: Début de la location (datetime)
+            end: Fin de la location (datetime)
+
+        Returns:
+            frozendict: {type de location: prix} de la règle, vide si aucune règle
+        """
+        hours = (end - start).total_seconds() / 3600.0
+        month, weekday = start.month, start.weekday()
+        for months, weekdays, min_hours, max_hours, prices in self._get_compiled_rules().get(bike_category, ()):
+            if month in months and weekday in weekdays and min_hours <= hours < max_hours:
+                return prices
+        return frozendict()
@@ -6,6 +6,15 @@ Auteur: Harith Lemti & Younes Loukili
 """
 
 from odoo import models, fields, api
+from odoo.tools import SQL
+
+
+# États des contrats pris en compte dans les statistiques de location
+COMPLETED_RENTAL_STATES = ('returned', 'closed')
+ACTIVE_RENTAL_STATES = ('confirmed', 'ongoing')
+
+# Statistiques de location stockées sur le client
+RENTAL_STAT_FIELDS = ['rental_contract_count', 'total_rental_amount', 'active_rental_count']
 
 
 class ResPartner(models.Model):
@@ -34,23 +43,44 @@ class ResPartner(models.Model):
         compute='_compute_sale_stats',
         help='Montant total dépensé en achats')
 
+    # Variante stockée, recalculée par l'ORM uniquement pour les clients dont
+    # une commande change: utilisable dans les filtres et tris "meilleurs clients"
+    # sans recalcul sur l'ensemble des contacts
+    stored_sale_order_count = fields.Integer(
+        string='Nombre de Ventes (stocké)',
+        compute='_compute_stored_sale_stats',
+        store=True,
+        help='Nombre total de commandes validées (maintenu en base)')
+
+    stored_total_sales_amount = fields.Float(
+        string='Total Achats Stocké (€)',
+        compute='_compute_stored_sale_stats',
+        store=True,
+        help='Montant total dépensé en achats (maintenu en base)')
+
     # ============================================================================
     # STATISTIQUES LOCATIONS
     # ============================================================================
 
+    # Stockées et maintenues par deltas à chaque changement d'un contrat
+    # (voir RentalContract._get_rental_stat_contributions): utilisables dans
+    # les domaines, les regroupements et les tris de la liste des clients.
     rental_contract_count = fields.Integer(
         string='Nombre de Locations',
-        compute='_compute_rental_stats',
+        readonly=True,
+        default=0,
         help='Nombre total de contrats de location')
 
     total_rental_amount = fields.Float(
         string='Total Locations (€)',
-        compute='_compute_rental_stats',
+        readonly=True,
+        default=0.0,
         help='Montant total dépensé en locations')
 
     active_rental_count = fields.Integer(
         string='Locations en Cours',
-        compute='_compute_rental_stats',
+        readonly=True,
+        default=0,
         help='Nombre de locations actuellement actives')
 
     # ============================================================================
@@ -79,11 +109,20 @@ class ResPartner(models.Model):
         default=False,
         help='Indique si le client est inscrit au programme de fidélité')
 
+    # Solde stocké, incrémenté atomiquement à chaque écriture du journal
+    # (voir LoyaltyLedger._post_entries)
     loyalty_points = fields.Integer(
         string='Points Fidélité',
+        readonly=True,
         default=0,
         help='Nombre de points de fidélité accumulés')
 
+    loyalty_entry_ids = fields.One2many(
+        'mybike.loyalty.ledger',
+        'partner_id',
+        string='Historique des Points',
+        readonly=True)
+
     loyalty_level = fields.Selection([
         ('bronze', 'Bronze'),
         ('silver', 'Argent'),
@@ -123,55 +162,140 @@ class ResPartner(models.Model):
     # MÉTHODES CALCULÉES - STATISTIQUES VENTES
     # ============================================================================
 
+    def _get_sale_stats(self):
+        """
+        Agrège les commandes de vente validées (state='sale' ou 'done') du lot.
+
+        Une seule requête groupée par client sur sale.order, quel que soit
+        le nombre de clients.
+
+        Returns:
+            dict: {partner_id: (nombre de commandes, montant total)}
+        """
+        partner_ids = self._origin.ids
+        if not partner_ids:
+            return {}
+        groups = self.env['sale.order']._read_group(
+            [('partner_id', 'in', partner_ids), ('state', 'in', ['sale', 'done'])],
+            ['partner_id'],
+            ['__count', 'amount_total:sum'],
+        )
+        return {partner.id: (count, amount) for partner, count, amount in groups}
+
     def _compute_sale_stats(self):
         """
-        Calcule les statistiques de vente du client.
+        Calcule les statistiques de vente des clients.
 
-        Parcourt toutes les commandes de vente validées (state='sale' ou 'done')
-        et calcule:
+        Agrège toutes les commandes de vente validées du lot en une requête
+        (voir _get_sale_stats) et calcule:
         - Le nombre de commandes
         - Le montant total dépensé
 
         Utilisé pour afficher l'historique d'achat et identifier les bons clients.
         """
-        SaleOrder = self.env['sale.order']
+        stats = self._get_sale_stats()
         for partner in self:
-            # Rechercher toutes les commandes validées
-            orders = SaleOrder.search([
-                ('partner_id', '=', partner.id),
-                ('state', 'in', ['sale', 'done'])
-            ])
-            partner.sale_order_count = len(orders)
-            partner.total_sales_amount = sum(orders.mapped('amount_total'))
+            partner.sale_order_count, partner.total_sales_amount = stats.get(partner._origin.id, (0, 0.0))
+
+    @api.depends('sale_order_ids.state', 'sale_order_ids.amount_total')
+    def _compute_stored_sale_stats(self):
+        """
+        Maintient la variante stockée des statistiques de vente.
+
+        L'ORM ne déclenche ce calcul que pour les clients dont une commande
+        a changé d'état ou de montant, puis le fait en une requête groupée
+        pour tout le lot.
+        """
+        stats = self._get_sale_stats()
+        for partner in self:
+            partner.stored_sale_order_count, partner.stored_total_sales_amount = \
+                stats.get(partner._origin.id, (0, 0.0))
 
     # ============================================================================
-    # MÉTHODES CALCULÉES - STATISTIQUES LOCATIONS
+    # STATISTIQUES LOCATIONS (MAINTENUES PAR DELTAS)
     # ============================================================================
 
-    def _compute_rental_stats(self):
+    @api.model
+    def _apply_rental_stat_deltas(self, deltas):
         """
-        Calcule les statistiques de location du client.
+        Applique des variations aux statistiques de location stockées.
 
-        Parcourt tous les contrats de location et calcule:
-        - Nombre total de locations
-        - Montant total dépensé (contrats terminés uniquement)
-        - Nombre de locations en cours
+        Un seul UPDATE ... FROM (VALUES ...) incrémente atomiquement les
+        compteurs de tous les clients concernés, sans relire les contrats.
 
-        Permet d'identifier les clients réguliers et de suivre l'activité.
+        Args:
+            deltas: dict {partner_id: [nb contrats, montant, nb actifs]}
         """
-        Contract = self.env['mybike.rental.contract']
-        for partner in self:
-            # Tous les contrats du client
-            contracts = Contract.search([('partner_id', '=', partner.id)])
-            partner.rental_contract_count = len(contracts)
-
-            # Contrats terminés pour calculer le montant dépensé
-            completed = contracts.filtered(lambda c: c.state in ['returned', 'closed'])
-            partner.total_rental_amount = sum(completed.mapped('total_price'))
+        deltas = {
+            partner_id: delta for partner_id, delta in deltas.items()
+            if partner_id and any(delta)
+        }
+        if not deltas:
+            return
+        self.flush_model(RENTAL_STAT_FIELDS)
+        self.env.cr.execute(SQL(
+            """
+            UPDATE %(table)s AS p
+               SET rental_contract_count = COALESCE(p.rental_contract_count, 0) + v.contract_count,
+                   total_rental_amount = COALESCE(p.total_rental_amount, 0) + v.amount,
+                   active_rental_count = COALESCE(p.active_rental_count, 0) + v.active_count
+              FROM (VALUES %(values)s) AS v(id, contract_count, amount, active_count)
+             WHERE p.id = v.id
+            """,
+            table=SQL.identifier(self._table),
+            values=SQL(', ').join(
+                SQL('(%s, %s, %s::float8, %s)', partner_id, count, amount, active)
+                for partner_id, (count, amount, active) in deltas.items()
+            ),
+        ))
+        self.invalidate_model(RENTAL_STAT_FIELDS)
+
+    @api.model
+    def _rebuild_rental_stats(self):
+        """
+        Reconstruit toutes les statistiques de location depuis les contrats.
 
-            # Contrats actifs (confirmés ou en cours)
-            active = contracts.filtered(lambda c: c.state in ['confirmed', 'ongoing'])
-            partner.active_rental_count = len(active)
+        Commande de réparation (ex: après une suppression SQL en cascade de
+        contrats): une agrégation groupée sur tous les contrats, puis un seul
+        UPDATE qui ne modifie que les clients dont les valeurs diffèrent.
+        """
+        Contract = self.env['mybike.rental.contract']
+        Contract.flush_model(['partner_id', 'state', 'total_price'])
+        self.flush_model(RENTAL_STAT_FIELDS)
+        self.env.cr.execute(SQL(
+            """
+            WITH stats AS (
+                SELECT partner_id,
+                       COUNT(*) AS contract_count,
+                       COALESCE(SUM(total_price) FILTER (WHERE state IN %(completed)s), 0) AS amount,
+                       COUNT(*) FILTER (WHERE state IN %(active)s) AS active_count
+                  FROM %(contract_table)s
+                 GROUP BY partner_id
+            )
+            UPDATE %(table)s AS p
+               SET rental_contract_count = COALESCE(stats.contract_count, 0),
+                   total_rental_amount = COALESCE(stats.amount, 0),
+                   active_rental_count = COALESCE(stats.active_count, 0)
+              FROM %(table)s AS p2
+              LEFT JOIN stats ON stats.partner_id = p2.id
+             WHERE p2.id = p.id
+               AND (p.rental_contract_count IS DISTINCT FROM COALESCE(stats.contract_count, 0)
+                    OR p.total_rental_amount IS DISTINCT FROM COALESCE(stats.amount, 0)
+                    OR p.active_rental_count IS DISTINCT FROM COALESCE(stats.active_count, 0))
+            """,
+            completed=COMPLETED_RENTAL_STATES,
+            active=ACTIVE_RENTAL_STATES,
+            contract_table=SQL.identifier(Contract._table),
+            table=SQL.identifier(self._table),
+        ))
+        self.invalidate_model(RENTAL_STAT_FIELDS)
+
+    def action_rebuild_rental_stats(self):
+        """
+        Action de réparation: recalcule les statistiques de location de tous les clients.
+        """
+        self._rebuild_rental_stats()
+        return True
 
     # ============================================================================
     # MÉTHODES CALCULÉES - PROGRAMME FIDÉLITÉ
@@ -253,19 +377,24 @@ class ResPartner(models.Model):
 
     def add_loyalty_points(self, points):
         """
-        Ajoute des points de fidélité au client.
+        Ajoute des points de fidélité aux clients.
 
         Peut être appelée après une vente ou location pour récompenser le client.
-        Le niveau de fidélité est automatiquement recalculé.
+        Une écriture d'ajustement est passée au journal pour chaque client et
+        les soldes sont incrémentés en une seule requête (voir
+        LoyaltyLedger._post_entries). Le niveau de fidélité est automatiquement
+        recalculé.
 
         Args:
-            points (int): Nombre de points à ajouter
+            points (int): Nombre de points à ajouter (négatif pour en retirer)
 
         Example:
             partner.add_loyalty_points(10)  # Ajoute 10 points
         """
-        for partner in self:
-            partner.loyalty_points += points
+        self.env['mybike.loyalty.ledger']._post_entries([
+            {'partner_id': partner.id, 'points': points, 'reason': 'adjustment'}
+            for partner in self
+        ])
 
     # ============================================================================
     # MÉTHODES UTILITAIRES - VÉRIFICATION
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Website Cache (Cache des Pages)
+Description: Cache mémoire des pages publiques du site, invalidé sur événement
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+import time
+
+from markupsafe import Markup
+
+from odoo import models, api, tools
+
+
+# Champs de product.template affichés sur les pages de location mises en cache:
+# leur modification invalide le cache (voir ProductTemplate.write).
+# L'état de location n'en fait pas partie: la disponibilité de chaque vélo est
+# vérifiée à part (route /rental/availability), seuls les passages en et hors
+# maintenance ou vente invalident le cache (voir ProductTemplate._is_website_cache_stale)
+CATALOG_FIELDS = (
+    'name', 'is_rental', 'bike_category', 'image_1920',
+    'is_published', 'website_published', 'frame_size', 'wheel_size', 'bike_brand',
+)
+
+# Champs supplémentaires affichés par les vélos en vedette de la page d'accueil
+HOMEPAGE_FIELDS = ('list_price', 'sale_ok')
+
+
+class WebsiteCache(models.AbstractModel):
+    """
+    Cache des pages et fragments publics du site.
+
+    Les pages rendues sont gardées en mémoire (ormcache) par clé (page, type
+    de vélo, langue, site) et par génération du cache. Un accès au cache ne
+    fait aucune requête ORM (la génération est lue une fois par transaction).
+    invalidate(), appelé quand un vélo change de prix, de publication ou
+    passe en maintenance (voir ProductTemplate._is_website_cache_stale),
+    change la génération: seules les pages du site sont invalidées, sur tous
+    les workers, sans vider les autres caches du registre.
+    """
+    _name = 'mybike.website.cache'
+    _description = 'Cache des Pages du Site'
+
+    @api.model
+    def _get_cached_page(self, page, key, render):
+        """
+        Retourne un fragment de page rendu depuis le cache, ou le rend au
+        premier appel. Le fragment ne doit contenir aucune donnée propre à un
+        visiteur (session, jeton CSRF): il est servi à tous les visiteurs.
+
+        Args:
+            page: Nom de la page (ex: 'rental_catalog')
+            key: Tuple identifiant la variante (type de vélo, langue, site...)
+            render: Fonction sans argument qui retourne le HTML de la page
+                    (appelée uniquement en cas de défaut de cache)
+
+        Returns:
+            Markup: HTML rendu, à insérer tel quel avec t-out
+        """
+        generation = self.env['ir.config_parameter']._get_cache_generation('website')
+        return self._render_cached_page(page, key, generation, render)
+
+    @api.model
+    @tools.ormcache('page', 'key', 'generation')
+    def _render_cached_page(self, page, key, generation, render):
+        """
+        Rend une page et la garde en cache pour la génération courante.
+        """
+        return Markup(render())
+
+    @api.model
+    def _get_cached_fragment(self, name, key, render, ttl):
+        """
+        Retourne un fragment HTML pré-rendu, avec une durée de vie limitée.
+
+        En plus de l'invalidation sur événement, le fragment expire après
+        `ttl` secondes: la tranche de temps courante fait partie de la clé.
+
+        Args:
+            name: Nom du fragment (ex: 'homepage_rental_bikes')
+            key: Tuple identifiant la variante (langue, site...)
+            render: Fonction sans argument qui retourne le HTML du fragment
+            ttl: Durée de vie en secondes
+
+        Returns:
+            Markup: HTML du fragment, à insérer tel quel avec t-out
+        """
+        time_slot = int(time.time() // ttl)
+        return self._get_cached_page(name, key + (time_slot,), render)
+
+    @api.model
+    def invalidate(self):
+        """
+        Invalide le cache des pages (nouvelle génération, vue par tous les
+        workers après le commit).
+        """
+        self.env['ir.config_parameter']._bump_cache_generation('website')
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Index Benchmark (Banc d'essai des index)
+Description: Compare les plans des requêtes de location avec et sans les index du module
+Auteur: Harith Lemti & Younes Loukili
+
+Utilisation (base de test uniquement, tout est annulé à la fin):
+
+    odoo-bin shell -d <base> --no-http < scripts/benchmark_indexes.py
+
+Le script crée un jeu de données synthétique (vélos, clients, contrats,
+commandes), exécute EXPLAIN ANALYZE sur les requêtes chaudes du module avec
+les index, puis sans (DROP INDEX dans un savepoint), et affiche les deux plans.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from odoo.tools import SQL
+
+
+# Taille du jeu de données synthétique
+NB_BIKES = 2000
+NB_PARTNERS = 500
+CONTRACTS_PER_BIKE = 25
+
+# Modèles dont les tables portent les index comparés
+BENCHMARK_MODELS = (
+    'product.template', 'mybike.rental.contract',
+    'mybike.rental.order', 'mybike.rental.order.line',
+)
+
+# Index déclarés par le module (suffixe du nom PostgreSQL)
+MODULE_INDEXES = (
+    'rental_catalog_idx', 'rental_category_idx', 'product_period_idx',
+    'partner_state_idx', 'partner_start_idx', 'overdue_idx', 'partner_create_idx',
+    'order_id_index',
+)
+
+
+def generate_dataset(env):
+    """
+    Crée les vélos, clients, contrats et commandes du banc d'essai.
+
+    Les contrats d'un même vélo se suivent sans chevauchement (contrainte
+    _no_double_booking).
+    """
+    ctx = dict(tracking_disable=True, mail_create_nolog=True, mail_notrack=True)
+    categories = ['city', 'mountain', 'electric']
+    states = ['available'] * 6 + ['rented', 'maintenance']
+    templates = env['product.template'].with_context(**ctx).create([{
+        'name': 'Bench Vélo %s' % i,
+        'is_rental': i % 4 != 0,
+        'bike_category': categories[i % 3],
+        'rental_state': random.choice(states),
+        'rental_price_day': 20.0 + i % 30,
+    } for i in range(NB_BIKES)])
+    partners = env['res.partner'].with_context(**ctx).create([
+        {'name': 'Bench Client %s' % i} for i in range(NB_PARTNERS)])
+
+    now = datetime.now().replace(microsecond=0)
+    origin = now - timedelta(days=CONTRACTS_PER_BIKE * 3)
+    contract_states = ['closed'] * 6 + ['cancelled', 'confirmed', 'ongoing']
+    vals_list = []
+    for product in templates.product_variant_ids:
+        for k in range(CONTRACTS_PER_BIKE):
+            start = origin + timedelta(days=3 * k)
+            vals_list.append({
+                'partner_id': random.choice(partners).id,
+                'product_id': product.id,
+                'start_date': start,
+                'end_date': start + timedelta(days=2),
+                'rental_type': 'day',
+                'unit_price': 20.0,
+                'deposit_amount': 100.0,
+                'state': random.choice(contract_states),
+            })
+    Contract = env['mybike.rental.contract'].with_context(**ctx)
+    for i in range(0, len(vals_list), 5000):
+        Contract.create(vals_list[i:i + 5000])
+
+    env['mybike.rental.order'].with_context(**ctx).create([{
+        'partner_id': partner.id,
+        'order_line_ids': [(0, 0, {
+            'product_id': random.choice(templates.product_variant_ids).id,
+            'rental_type': 'day',
+            'unit_price': 20.0,
+            'start_date': now + timedelta(days=400 + i),
+            'end_date': now + timedelta(days=401 + i),
+        })],
+    } for i, partner in enumerate(partners)])
+    env.flush_all()
+    for model in BENCHMARK_MODELS:
+        env.cr.execute(SQL("ANALYZE %s", SQL.identifier(env[model]._table)))
+    return partners
+
+
+def get_queries(env, partners):
+    """
+    Retourne les requêtes chaudes du module: {libellé: SQL}.
+    """
+    partner_id = partners[len(partners) // 2].id
+    now = datetime.now().replace(microsecond=0)
+    contract = SQL.identifier(env['mybike.rental.contract']._table)
+    order = env['mybike.rental.order'].search([('partner_id', '=', partner_id)], limit=1)
+    return {
+        "Catalogue (is_rental, rental_state, bike_category, page par id)": SQL(
+            "SELECT id FROM product_template WHERE is_rental IS TRUE AND active IS TRUE"
+            " AND rental_state = 'available' AND bike_category = 'city'"
+            " ORDER BY id LIMIT 25"),
+        "Disponibilité (product_id + période)": SQL(
+            "SELECT DISTINCT product_id FROM %s WHERE state IN ('draft', 'confirmed', 'ongoing', 'returned')"
+            " AND start_date < %s AND GREATEST(start_date, LEAST(end_date, actual_return_date)) > %s"
+            " AND product_id IN %s",
+            contract, now + timedelta(days=2), now,
+            tuple(env['product.product'].search([('name', '=like', 'Bench Vélo 1%')], limit=50).ids)),
+        "Statistiques client (partner_id + state)": SQL(
+            "SELECT state, count(*), sum(subtotal) FROM %s WHERE partner_id = %s"
+            " AND state IN ('returned', 'closed') GROUP BY state",
+            contract, partner_id),
+        "Mes locations (partner_id, start_date desc)": SQL(
+            "SELECT id FROM %s WHERE partner_id = %s ORDER BY start_date DESC, id DESC LIMIT 20",
+            contract, partner_id),
+        "Contrats en retard (state + end_date)": SQL(
+            "SELECT id FROM %s WHERE state = 'ongoing' AND end_date < %s",
+            contract, now),
+        "Lignes d'une commande (order_id)": SQL(
+            "SELECT id FROM mybike_rental_order_line WHERE order_id = %s", order.id or 0),
+    }
+
+
+def explain(env, queries):
+    """
+    Exécute EXPLAIN ANALYZE sur chaque requête et retourne {libellé: plan}.
+    """
+    plans = {}
+    for label, query in queries.items():
+        env.cr.execute(SQL("EXPLAIN (ANALYZE, BUFFERS) %s", query))
+        plans[label] = "\n".join(row[0] for row in env.cr.fetchall())
+    return plans
+
+
+def run(env):
+    """
+    Génère les données, compare les plans avec et sans index, puis annule tout.
+    """
+    try:
+        partners = generate_dataset(env)
+        queries = get_queries(env, partners)
+        after = explain(env, queries)
+
+        env.cr.execute(SQL(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()"
+            " AND tablename IN %s AND indexname LIKE ANY(%s)",
+            tuple(env[model]._table for model in BENCHMARK_MODELS),
+            ['%%%s' % suffix for suffix in MODULE_INDEXES]))
+        index_names = [row[0] for row in env.cr.fetchall()]
+        # Les index supprimés sont restaurés par le rollback final
+        for index_name in index_names:
+            env.cr.execute(SQL("DROP INDEX %s", SQL.identifier(index_name)))
+        before = explain(env, queries)
+
+        print("Index comparés: %s\n" % ", ".join(index_names))
+        for label in queries:
+            print("=" * 78)
+            print(label)
+            print("-" * 78 + "\nSANS index:\n" + before[label])
+            print("-" * 78 + "\nAVEC index:\n" + after[label] + "\n")
+    finally:
+        env.cr.rollback()
+
+
+if 'env' in globals():
+    run(env)  # noqa: F821 (fourni par odoo-bin shell)
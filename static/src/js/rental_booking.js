@@ -1,170 +1,228 @@
+/** @odoo-module **/
 /* MyBike Store - JavaScript interactif */
 
-odoo.define('mybike_store.rental_booking', function (require) {
-    'use strict';
-
-    var publicWidget = require('web.public.widget');
-    var ajax = require('web.ajax');
-
-    // Widget pour le calcul automatique du prix de location
-    publicWidget.registry.RentalPriceCalculator = publicWidget.Widget.extend({
-        selector: '.rental-booking-form',
-        events: {
-            'change select[name="bike_id"]': '_onBikeChange',
-            'change select[name="rental_type"]': '_onRentalTypeChange',
-            'change input[name="start_date"]': '_onDateChange',
-            'change input[name="end_date"]': '_onDateChange',
-        },
-
-        start: function () {
-            this._super.apply(this, arguments);
-            this._updatePrice();
-        },
-
-        _onBikeChange: function () {
-            this._updatePrice();
-            this._loadBikeDetails();
-        },
-
-        _onRentalTypeChange: function () {
-            this._updatePrice();
-        },
-
-        _onDateChange: function () {
-            this._updatePrice();
-        },
-
-        _loadBikeDetails: function () {
-            var bikeId = this.$('select[name="bike_id"]').val();
-            if (!bikeId) return;
-
-            var $bikeInfo = this.$('.bike-info-container');
-            $bikeInfo.html('<div class="text-center"><i class="fa fa-spinner fa-spin"></i> Chargement...</div>');
-
-            // Simuler le chargement des détails (à remplacer par un appel AJAX réel)
-            setTimeout(function() {
-                $bikeInfo.html(`
-                    <div class="bike-details">
-                        <h4>Informations du vélo</h4>
-                        <p><strong>Caution:</strong> 200€</p>
-                        <p><strong>État:</strong> Excellent</p>
-                        <p><strong>Assurance:</strong> Disponible (+5€/jour)</p>
-                    </div>
-                `);
-            }, 500);
-        },
-
-        _updatePrice: function () {
-            var bikeId = this.$('select[name="bike_id"]').val();
-            var rentalType = this.$('select[name="rental_type"]').val();
-            var startDate = this.$('input[name="start_date"]').val();
-            var endDate = this.$('input[name="end_date"]').val();
-
-            if (!bikeId || !rentalType || !startDate || !endDate) {
-                this.$('.price-summary').hide();
-                return;
-            }
-
-            // Calculer la durée
-            var start = new Date(startDate);
-            var end = new Date(endDate);
-            var diffTime = Math.abs(end - start);
-            var diffHours = Math.ceil(diffTime / (1000 * 60 * 60));
-            var diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24));
-
-            // Prix de base (à récupérer dynamiquement du vélo sélectionné)
-            var prices = {
-                'hour': 5,
-                'day': 15,
-                'week': 60,
-                'month': 200
-            };
-
-            var unitPrice = prices[rentalType] || 0;
-            var totalPrice = 0;
-
-            if (rentalType === 'hour') {
-                totalPrice = unitPrice * diffHours;
-            } else if (rentalType === 'day') {
-                totalPrice = unitPrice * diffDays;
-            } else if (rentalType === 'week') {
-                var weeks = Math.ceil(diffDays / 7);
-                totalPrice = unitPrice * weeks;
-            } else if (rentalType === 'month') {
-                var months = Math.ceil(diffDays / 30);
-                totalPrice = unitPrice * months;
-            }
-
-            // Afficher le récapitulatif
-            this.$('.price-summary').show();
-            this.$('.duration-display').text(this._formatDuration(diffHours));
-            this.$('.price-display').text(totalPrice.toFixed(2) + ' €');
-        },
+import publicWidget from "@web/legacy/js/public/public_widget";
+import { rpc } from "@web/core/network/rpc";
+import { debounce } from "@web/core/utils/timing";
+
+// Délai avant l'appel au serveur: un devis par pause de saisie, pas par touche
+const QUOTE_DEBOUNCE_DELAY = 300;
+
+// Widget pour le calcul automatique du prix de location
+publicWidget.registry.RentalPriceCalculator = publicWidget.Widget.extend({
+    selector: ".rental-price-calculator",
+    events: {
+        'change select[name="bike_id"]': "_onInputChange",
+        'change select[name="rental_type"]': "_onInputChange",
+        'change input[name="start_date"]': "_onInputChange",
+        'change input[name="end_date"]': "_onInputChange",
+        'input input[name="start_date"]': "_onInputChange",
+        'input input[name="end_date"]': "_onInputChange",
+    },
+
+    start() {
+        this._quoteSequence = 0;
+        this._updatePrice = debounce(this._fetchQuote.bind(this), QUOTE_DEBOUNCE_DELAY);
+        this._updatePrice();
+        return this._super(...arguments);
+    },
+
+    destroy() {
+        this._updatePrice.cancel();
+        this._super(...arguments);
+    },
+
+    _onInputChange() {
+        this._updatePrice();
+    },
+
+    _getValue(selector) {
+        const input = this.el.querySelector(selector);
+        return input ? input.value : "";
+    },
+
+    _showSummary(visible) {
+        const summary = this.el.querySelector(".price-summary");
+        if (summary) {
+            summary.classList.toggle("d-none", !visible);
+        }
+    },
+
+    _showError(message) {
+        const error = this.el.querySelector(".price-error");
+        if (error) {
+            error.textContent = message || "";
+            error.classList.toggle("d-none", !message);
+        }
+    },
+
+    // Le prix vient du serveur (/rental/quote), calculé par la même
+    // fonction que la ligne de commande et le contrat
+    async _fetchQuote() {
+        const bikeId = this._getValue('select[name="bike_id"]');
+        const rentalType = this._getValue('select[name="rental_type"]');
+        const startDate = this._getValue('input[name="start_date"]');
+        const endDate = this._getValue('input[name="end_date"]');
+
+        if (!bikeId || !rentalType || !startDate || !endDate) {
+            this._showSummary(false);
+            this._showError(false);
+            return;
+        }
+
+        // Ignorer les réponses d'un devis devenu obsolète
+        const sequence = ++this._quoteSequence;
+        let result;
+        try {
+            result = await rpc("/rental/quote", {
+                items: [{
+                    bike_id: bikeId,
+                    rental_type: rentalType,
+                    start_date: startDate,
+                    end_date: endDate,
+                }],
+            });
+        } catch {
+            result = { error: "Le prix n'a pas pu être calculé." };
+        }
+        if (sequence !== this._quoteSequence) {
+            return;
+        }
+        const quote = result.quotes && result.quotes[0];
+        if (!quote || quote.error) {
+            this._showSummary(false);
+            this._showError(result.error || (quote && quote.error));
+            return;
+        }
+
+        // Afficher le récapitulatif
+        this._showError(false);
+        this._showSummary(true);
+        this.el.querySelector(".duration-display").textContent = this._formatDuration(quote.hours);
+        // Prix au meilleur tarif, avec la combinaison appliquée (ex: 1 semaine + 2 jours)
+        this.el.querySelector(".price-display").textContent =
+            quote.subtotal.toFixed(2) + " €" + (quote.breakdown ? " (" + quote.breakdown + ")" : "");
+        this.el.querySelector(".deposit-display").textContent = quote.deposit.toFixed(2) + " €";
+    },
+
+    _formatDuration(hours) {
+        hours = Math.round(hours * 100) / 100;
+        if (hours < 24) {
+            return hours + " heure" + (hours > 1 ? "s" : "");
+        }
+        const days = Math.floor(hours / 24);
+        return days + " jour" + (days > 1 ? "s" : "");
+    },
+});
 
-        _formatDuration: function (hours) {
-            if (hours < 24) {
-                return hours + ' heure' + (hours > 1 ? 's' : '');
-            }
-            var days = Math.floor(hours / 24);
-            return days + ' jour' + (days > 1 ? 's' : '');
-        },
-    });
-
-    // Widget pour l'affichage de la disponibilité
-    publicWidget.registry.BikeAvailabilityChecker = publicWidget.Widget.extend({
-        selector: '.bike-availability-check',
-        events: {
-            'click .check-availability-btn': '_checkAvailability',
-        },
-
-        _checkAvailability: function (ev) {
-            ev.preventDefault();
-            var $btn = $(ev.currentTarget);
-            var bikeId = $btn.data('bike-id');
-
-            $btn.html('<i class="fa fa-spinner fa-spin"></i> Vérification...');
-            $btn.prop('disabled', true);
-
-            // Simuler vérification (à remplacer par appel AJAX)
-            setTimeout(function() {
-                $btn.html('<i class="fa fa-check"></i> Disponible');
-                $btn.removeClass('btn-primary').addClass('btn-success');
-            }, 1000);
-        },
-    });
-
-    // Smooth scroll pour les liens d'ancre
-    $(document).ready(function() {
-        $('a[href^="#"]').on('click', function(e) {
-            var target = $(this.getAttribute('href'));
-            if(target.length) {
-                e.preventDefault();
-                $('html, body').stop().animate({
-                    scrollTop: target.offset().top - 80
-                }, 800);
+// Widget pour l'affichage de la disponibilité
+// Tous les vélos affichés sur la page sont vérifiés en un seul appel groupé,
+// au chargement puis à chaque clic sur un bouton de vérification
+publicWidget.registry.BikeAvailabilityChecker = publicWidget.Widget.extend({
+    selector: ".bike-availability-check",
+    events: {
+        "click .check-availability-btn": "_onCheckClick",
+    },
+
+    start() {
+        this._checkAvailability();
+        return this._super(...arguments);
+    },
+
+    _onCheckClick(ev) {
+        ev.preventDefault();
+        this._checkAvailability();
+    },
+
+    _setButton(button, html, className) {
+        button.classList.remove("btn-primary", "btn-success", "btn-danger", "btn-warning");
+        button.classList.add(className);
+        button.innerHTML = html;
+    },
+
+    async _checkAvailability() {
+        const buttons = [...this.el.querySelectorAll(".check-availability-btn")];
+        if (!buttons.length) {
+            return;
+        }
+        const startInput = document.querySelector('input[name="start_date"]');
+        const endInput = document.querySelector('input[name="end_date"]');
+        for (const button of buttons) {
+            button.innerHTML = '<i class="fa fa-spinner fa-spin"></i> Vérification...';
+            button.disabled = true;
+        }
+
+        let result;
+        try {
+            result = await rpc("/rental/availability", {
+                bike_ids: buttons.map((button) => button.dataset.bikeId),
+                start_date: (startInput && startInput.value) || null,
+                end_date: (endInput && endInput.value) || null,
+            });
+        } catch {
+            result = { error: "La disponibilité n'a pas pu être vérifiée." };
+        }
+
+        for (const button of buttons) {
+            button.disabled = false;
+            if (result.error) {
+                // Erreur de la demande (ex: période invalide): ne rien conclure sur les vélos
+                this._setButton(button, "Vérifier la disponibilité", "btn-primary");
+                button.title = result.error;
+            } else if (result.availability[button.dataset.bikeId]) {
+                this._setButton(button, '<i class="fa fa-check"></i> Disponible', "btn-success");
+            } else {
+                this._setButton(button, '<i class="fa fa-times"></i> Indisponible', "btn-danger");
             }
-        });
+        }
+        const error = this.el.querySelector(".availability-error");
+        if (error) {
+            error.textContent = result.error || "";
+            error.classList.toggle("d-none", !result.error);
+        }
+    },
+});
 
-        // Animation au scroll
-        var observerOptions = {
-            threshold: 0.1
-        };
+// Smooth scroll pour les liens d'ancre et animation des cartes au scroll
+publicWidget.registry.MyBikePageEffects = publicWidget.Widget.extend({
+    selector: "#wrapwrap",
+    events: {
+        'click a[href^="#"]': "_onAnchorClick",
+    },
 
-        var observer = new IntersectionObserver(function(entries) {
-            entries.forEach(function(entry) {
+    start() {
+        this._observer = new IntersectionObserver((entries) => {
+            for (const entry of entries) {
                 if (entry.isIntersecting) {
-                    entry.target.classList.add('fade-in-up');
+                    entry.target.classList.add("fade-in-up");
                 }
+            }
+        }, { threshold: 0.1 });
+        for (const el of this.el.querySelectorAll(".bike-card, .feature-card")) {
+            this._observer.observe(el);
+        }
+        return this._super(...arguments);
+    },
+
+    destroy() {
+        this._observer.disconnect();
+        this._super(...arguments);
+    },
+
+    _onAnchorClick(ev) {
+        const href = ev.currentTarget.getAttribute("href");
+        const target = href.length > 1 && document.querySelector(href);
+        if (target) {
+            ev.preventDefault();
+            window.scrollTo({
+                top: target.getBoundingClientRect().top + window.scrollY - 80,
+                behavior: "smooth",
             });
-        }, observerOptions);
-
-        document.querySelectorAll('.bike-card, .feature-card').forEach(function(el) {
-            observer.observe(el);
-        });
-    });
-
-    return {
-        RentalPriceCalculator: publicWidget.registry.RentalPriceCalculator,
-        BikeAvailabilityChecker: publicWidget.registry.BikeAvailabilityChecker,
-    };
+        }
+    },
 });
+
+export default {
+    RentalPriceCalculator: publicWidget.registry.RentalPriceCalculator,
+    BikeAvailabilityChecker: publicWidget.registry.BikeAvailabilityChecker,
+};
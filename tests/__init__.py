@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+
+from . import test_rental_contract
+from . import test_ir_sequence
+from . import test_partner_rental_stats
+from . import test_rental_pricing
+from . import test_rental_pricing_rule
+from . import test_loyalty_ledger
+from . import test_ir_actions_report
+from . import test_rental_availability
+from . import test_rental_order
+from . import test_rental_invoicing
+from . import test_website_cache
+from . import test_late_fees
+from . import test_rental_return_wizard
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Données communes
+Description: Vélo de location, clients et création de contrats pour les tests du module
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import datetime, timedelta
+
+from odoo.tests.common import TransactionCase
+
+
+class MyBikeTestCommon(TransactionCase):
+    """
+    Base des tests du module: un vélo de location aux tarifs connus et deux
+    clients, dont un membre du programme de fidélité.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(MyBikeTestCommon, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+
+        cls.bike = cls.env['product.template'].create({
+            'name': 'Vélo Test',
+            'is_rental': True,
+            'bike_category': 'city',
+            'rental_price_hour': 5.0,
+            'rental_price_day': 20.0,
+            'rental_price_week': 100.0,
+            'rental_price_month': 300.0,
+            'rental_deposit': 100.0,
+        })
+        cls.product = cls.bike.product_variant_id
+
+        cls.partner = cls.env['res.partner'].create({
+            'name': 'Client Test',
+            'is_loyalty_member': True,
+        })
+        cls.other_partner = cls.env['res.partner'].create({
+            'name': 'Autre Client Test',
+        })
+
+        # Lundi 6 juillet 2026, 8h00
+        cls.start = datetime(2026, 7, 6, 8, 0)
+
+    def _create_contract(self, start=None, days=2, **vals):
+        """
+        Crée un contrat de location journalière du vélo de test.
+
+        Args:
+            start: Début de la location (par défaut self.start)
+            days: Durée de la location en jours
+            **vals: Valeurs supplémentaires du contrat
+
+        Returns:
+            mybike.rental.contract: Contrat créé
+        """
+        start = start or self.start
+        return self.env['mybike.rental.contract'].create(dict({
+            'partner_id': self.partner.id,
+            'product_id': self.product.id,
+            'start_date': start,
+            'end_date': start + timedelta(days=days),
+            'rental_type': 'day',
+            'unit_price': 20.0,
+            'deposit_amount': 100.0,
+        }, **vals))
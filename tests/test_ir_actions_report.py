@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Rapports PDF des contrats
+Description: Détection des PDF périmés et purge des anciens PDF en pièce jointe
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+import time
+from datetime import timedelta
+
+from odoo.tests import tagged
+from odoo.tools import SQL
+from odoo.tools.safe_eval import safe_eval
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestContractReportCache(MyBikeTestCommon):
+    """
+    Le PDF en pièce jointe d'un contrat est à jour tant que le contrat n'a pas
+    été modifié (son nom contient le write_date du contrat).
+    """
+
+    def setUp(self):
+        super(TestContractReportCache, self).setUp()
+        self.report = self.env.ref('mybike_store.action_report_rental_invoice')
+        self.contract = self._create_contract(days=2)
+        self.other_contract = self._create_contract(start=self.start + timedelta(days=2), days=1)
+        self.env.flush_all()
+
+    def _attach_pdf(self, contract):
+        return self.env['ir.attachment'].create({
+            'name': safe_eval(self.report.attachment, {'object': contract, 'time': time}),
+            'res_model': self.report.model,
+            'res_id': contract.id,
+            'raw': b'%PDF-1.4',
+        })
+
+    def test_stale_pdf_detection(self):
+        ids = [self.other_contract.id, self.contract.id]
+        self.assertEqual(self.report._get_stale_contract_pdf_ids(ids), ids)
+
+        attachment = self._attach_pdf(self.contract)
+        self.assertTrue(attachment.name.startswith('Facture_Location_%s_' % self.contract.name))
+        self.assertEqual(self.report._get_stale_contract_pdf_ids(ids), [self.other_contract.id])
+
+        # Contrat modifié après le rendu: le PDF est périmé
+        self.env.execute_query(SQL(
+            "UPDATE %s SET write_date = write_date + interval '1 second' WHERE id = %s",
+            SQL.identifier(self.contract._table), self.contract.id))
+        self.contract.invalidate_recordset(['write_date'])
+        self.assertEqual(self.report._get_stale_contract_pdf_ids(ids), ids)
+
+    def test_purge_stale_pdfs(self):
+        attachment = self._attach_pdf(self.contract)
+        other_attachment = self._attach_pdf(self.other_contract)
+        self.report._purge_contract_pdfs([self.contract.id])
+        self.assertFalse(attachment.exists())
+        self.assertTrue(other_attachment.exists())
+
+    def test_no_parallel_render_in_tests(self):
+        # Les curseurs parallèles ne verraient pas les données du test
+        self.assertFalse(self.env['ir.actions.report']._can_render_in_parallel())
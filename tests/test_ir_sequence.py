@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Séquences
+Description: Réservation groupée de numéros (_next_by_code_batch)
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestSequenceBatch(TransactionCase):
+    """
+    Les numéros réservés en lot ont le même format et suivent le même
+    compteur que next_by_code, quelle que soit l'implémentation de la séquence.
+    """
+
+    def _create_sequence(self, code, **vals):
+        return self.env['ir.sequence'].create(dict({
+            'name': code,
+            'code': code,
+            'prefix': 'T/',
+            'padding': 4,
+        }, **vals))
+
+    def test_standard_sequence(self):
+        self._create_sequence('mybike.test.standard', implementation='standard')
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence._next_by_code_batch('mybike.test.standard', 3),
+                         ['T/0001', 'T/0002', 'T/0003'])
+        self.assertEqual(Sequence.next_by_code('mybike.test.standard'), 'T/0004')
+        self.assertEqual(Sequence._next_by_code_batch('mybike.test.standard', 2),
+                         ['T/0005', 'T/0006'])
+
+    def test_no_gap_sequence(self):
+        self._create_sequence('mybike.test.no_gap', implementation='no_gap')
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence._next_by_code_batch('mybike.test.no_gap', 3),
+                         ['T/0001', 'T/0002', 'T/0003'])
+        self.assertEqual(Sequence.next_by_code('mybike.test.no_gap'), 'T/0004')
+
+    def test_date_range_sequence(self):
+        self._create_sequence('mybike.test.date_range', implementation='standard',
+                              prefix='%(range_year)s/', use_date_range=True)
+        year = fields.Date.today().year
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence._next_by_code_batch('mybike.test.date_range', 2),
+                         ['%s/0001' % year, '%s/0002' % year])
+        self.assertEqual(Sequence.next_by_code('mybike.test.date_range'), '%s/0003' % year)
+
+    def test_unknown_code_and_empty_batch(self):
+        Sequence = self.env['ir.sequence']
+        self.assertEqual(Sequence._next_by_code_batch('mybike.test.unknown', 2), [False, False])
+        self.assertEqual(Sequence._next_by_code_batch('mybike.test.unknown', 0), [])
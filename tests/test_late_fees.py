@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Frais de retard
+Description: Tâche planifiée de calcul des frais de retard (_cron_compute_late_fees)
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import datetime, timedelta
+
+from freezegun import freeze_time
+
+from odoo.tests import tagged
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestLateFeeCron(MyBikeTestCommon):
+    """
+    Le cron calcule les frais des contrats en cours en retard, une fois par
+    passage, sans écraser les frais saisis à la main.
+    """
+
+    # Vendredi 10 juillet 2026, 8h00: les contrats du lundi sont en retard
+    now = datetime(2026, 7, 10, 8, 0)
+
+    def setUp(self):
+        super(TestLateFeeCron, self).setUp()
+        self.overdue = self._create_contract(days=1) | self._create_contract(
+            start=self.start + timedelta(days=1), days=1, partner_id=self.other_partner.id)
+        self.upcoming = self._create_contract(start=self.now - timedelta(days=1), days=2)
+        self.confirmed = self._create_contract(start=self.start + timedelta(days=2), days=1)
+        (self.overdue | self.upcoming).write({'state': 'ongoing'})
+        self.confirmed.write({'state': 'confirmed'})
+
+    def _run_cron(self, batch_size=1):
+        with freeze_time(self.now):
+            return self.env['mybike.rental.contract']._cron_compute_late_fees(batch_size=batch_size)
+
+    def test_cron_sets_overdue_fees(self):
+        # Lots d'un contrat: la boucle réclame les contrats un par un
+        self.assertEqual(self._run_cron(), 2)
+
+        expected = self.env['mybike.rental.pricing'].get_late_fees(
+            self.overdue, dict.fromkeys(self.overdue.ids, self.now))
+        for contract in self.overdue:
+            self.assertGreater(contract.late_fee, 0.0)
+            self.assertEqual(contract.late_fee, expected[contract.id])
+            self.assertEqual(contract.late_fee_date, self.now)
+            self.assertFalse(contract.late_fee_manual)
+        self.assertFalse(self.upcoming.late_fee)
+        self.assertFalse(self.confirmed.late_fee)
+
+        # Déjà traités pendant ce passage: pas réclamés une seconde fois
+        self.assertEqual(self._run_cron(), 0)
+
+    def test_cron_keeps_manual_fees(self):
+        waived, other = self.overdue
+        waived.write({'late_fee': 0.0})
+        self.assertTrue(waived.late_fee_manual)
+
+        self.assertEqual(self._run_cron(batch_size=10), 1)
+        self.assertFalse(waived.late_fee)
+        self.assertFalse(waived.late_fee_date)
+        self.assertGreater(other.late_fee, 0.0)
+
+        # Décocher le drapeau réactive le calcul automatique
+        waived.write({'late_fee_manual': False})
+        self.assertEqual(self._run_cron(), 1)
+        self.assertGreater(waived.late_fee, 0.0)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Journal des points de fidélité
+Description: Le solde de points d'un client est toujours la somme de ses écritures
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+from odoo.tools import SQL
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestLoyaltyLedger(MyBikeTestCommon):
+    """
+    Chaque mouvement de points passe par une écriture du journal, et le
+    solde stocké du client reste égal à la somme de ses écritures.
+    """
+
+    def assertBalanceMatchesEntries(self, partner):
+        self.env.flush_all()
+        partner.invalidate_recordset(['loyalty_points', 'loyalty_entry_ids'])
+        self.assertEqual(partner.loyalty_points, sum(partner.loyalty_entry_ids.mapped('points')))
+
+    def test_adjustments(self):
+        self.partner.add_loyalty_points(10)
+        (self.partner | self.other_partner).add_loyalty_points(5)
+        self.partner.add_loyalty_points(-3)
+        self.assertEqual(self.partner.loyalty_points, 12)
+        self.assertEqual(self.other_partner.loyalty_points, 5)
+        self.assertBalanceMatchesEntries(self.partner)
+        self.assertBalanceMatchesEntries(self.other_partner)
+
+    def test_contract_accrues_once(self):
+        Ledger = self.env['mybike.loyalty.ledger']
+        contract = self._create_contract(days=2)
+        other_contract = self._create_contract(partner_id=self.other_partner.id, days=1,
+                                               start=contract.end_date)
+        contracts = contract | other_contract
+        entries = Ledger._post_contract_accruals(contracts)
+        # Seuls les membres du programme gagnent des points
+        self.assertEqual(entries.contract_id, contract)
+        self.assertEqual(entries.points, int(contract.total_price))
+        self.assertEqual(entries.reason, 'rental')
+
+        # Une deuxième comptabilisation du même contrat est ignorée
+        self.assertFalse(Ledger._post_contract_accruals(contracts))
+        self.assertEqual(self.partner.loyalty_points, int(contract.total_price))
+        self.assertBalanceMatchesEntries(self.partner)
+
+    def test_entries_are_append_only(self):
+        self.partner.add_loyalty_points(10)
+        entry = self.partner.loyalty_entry_ids
+        with self.assertRaises(UserError):
+            entry.write({'points': 100})
+        with self.assertRaises(UserError):
+            entry.unlink()
+
+    def test_opening_balances(self):
+        Ledger = self.env['mybike.loyalty.ledger']
+        self.partner.add_loyalty_points(10)
+        # Solde acquis avant le journal, sans écriture
+        self.env.flush_all()
+        self.env.execute_query(SQL(
+            "UPDATE res_partner SET loyalty_points = loyalty_points + 40 WHERE id = %s", self.partner.id))
+
+        self.assertTrue(Ledger._post_opening_balances())
+        self.assertBalanceMatchesEntries(self.partner)
+        self.assertEqual(self.partner.loyalty_points, 50)
+        self.assertEqual(self.partner.loyalty_entry_ids.filtered(lambda e: e.reason == 'opening').points, 40)
+        # Sans effet une deuxième fois
+        self.assertEqual(Ledger._post_opening_balances(), 0)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Statistiques de location des clients
+Description: Les deltas appliqués à chaque écriture donnent le même résultat que la reconstruction complète
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo.tests import tagged
+
+from ..models.res_partner import RENTAL_STAT_FIELDS
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestPartnerRentalStats(MyBikeTestCommon):
+    """
+    Après chaque création, écriture ou suppression de contrats, les
+    statistiques maintenues par deltas sont égales à celles recalculées par
+    _rebuild_rental_stats depuis les contrats.
+    """
+
+    def _get_stats(self):
+        partners = self.partner | self.other_partner
+        self.env.flush_all()
+        partners.invalidate_recordset(RENTAL_STAT_FIELDS)
+        return {
+            partner.id: tuple(partner[fname] for fname in RENTAL_STAT_FIELDS)
+            for partner in partners
+        }
+
+    def assertStatsMatchRebuild(self):
+        incremental = self._get_stats()
+        self.env['res.partner']._rebuild_rental_stats()
+        self.assertEqual(incremental, self._get_stats())
+
+    def test_deltas_match_rebuild(self):
+        other_bike = self.env['product.template'].create({
+            'name': 'Vélo Test Électrique',
+            'is_rental': True,
+            'bike_category': 'electric',
+            'rental_price_day': 45.0,
+        })
+        first = self._create_contract(days=2)
+        second = self._create_contract(start=self.start + timedelta(days=5), days=9)
+        self.assertStatsMatchRebuild()
+        self.assertEqual(self.partner.rental_contract_count, 2)
+
+        # Changements d'état: actif, puis terminé
+        (first | second).write({'state': 'confirmed'})
+        self.assertStatsMatchRebuild()
+        self.assertEqual(self.partner.active_rental_count, 2)
+        first.write({'state': 'returned'})
+        self.assertStatsMatchRebuild()
+        self.assertEqual(self.partner.total_rental_amount, first.total_price)
+
+        # Changements du montant: frais, prix, dates et vélo
+        first.write({'additional_fees': 15.0})
+        self.assertStatsMatchRebuild()
+        first.write({'unit_price': 25.0})
+        self.assertStatsMatchRebuild()
+        first.write({'end_date': first.end_date + timedelta(days=1)})
+        self.assertStatsMatchRebuild()
+        first.write({'product_id': other_bike.product_variant_id.id})
+        self.assertStatsMatchRebuild()
+
+        # Changement de client et suppression
+        first.write({'partner_id': self.other_partner.id})
+        self.assertStatsMatchRebuild()
+        self.assertEqual(self.other_partner.total_rental_amount, first.total_price)
+        second.write({'state': 'cancelled'})
+        second.unlink()
+        self.assertStatsMatchRebuild()
+        self.assertEqual(self.partner.rental_contract_count, 0)
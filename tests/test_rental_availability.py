@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Disponibilité des vélos
+Description: Moteur de disponibilité par intervalle et route groupée /rental/availability
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo.tests import HttpCase, tagged
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRentalAvailability(MyBikeTestCommon):
+    """
+    Un vélo est réservé sur [start_date, end_date) par ses contrats actifs;
+    un retour anticipé le libère dès le retour réel.
+    """
+
+    def setUp(self):
+        super(TestRentalAvailability, self).setUp()
+        self.availability = self.env['mybike.rental.availability']
+
+    def _is_available(self, start, end):
+        return self.availability.is_available(self.product.id, start, end)
+
+    def test_overlapping_period_is_booked(self):
+        contract = self._create_contract(days=2)
+        self.assertFalse(self._is_available(self.start + timedelta(days=1), self.start + timedelta(days=3)))
+        self.assertIn(self.product.id, self.availability._get_booked_product_ids(
+            self.start, self.start + timedelta(hours=1)))
+        # Intervalles semi-ouverts: libre juste avant le début et dès la fin
+        self.assertTrue(self._is_available(self.start - timedelta(days=1), self.start))
+        self.assertTrue(self._is_available(contract.end_date, contract.end_date + timedelta(days=1)))
+
+    def test_early_return_releases_bike(self):
+        contract = self._create_contract(days=4)
+        return_date = self.start + timedelta(days=1)
+        contract.write({'state': 'returned', 'actual_return_date': return_date})
+
+        self.assertFalse(self._is_available(self.start, return_date))
+        self.assertTrue(self._is_available(return_date, contract.end_date))
+        # La contrainte d'exclusion suit la même fin de réservation
+        next_contract = self._create_contract(
+            start=return_date + timedelta(hours=2), days=1, partner_id=self.other_partner.id)
+        self.assertEqual(next_contract.state, 'draft')
+
+    def test_late_return_does_not_extend_booking(self):
+        contract = self._create_contract(days=2)
+        contract.write({'state': 'returned', 'actual_return_date': contract.end_date + timedelta(days=1)})
+        self.assertTrue(self._is_available(contract.end_date, contract.end_date + timedelta(hours=2)))
+
+    def test_unbookable_bike_is_unavailable(self):
+        self.bike.write({'rental_state': 'maintenance'})
+        far = self.start + timedelta(days=60)
+        self.assertFalse(self._is_available(far, far + timedelta(days=1)))
+        self.assertEqual(self.availability.get_templates_availability(
+            self.bike.ids, far, far + timedelta(days=1)), {self.bike.id: False})
+
+    def test_fully_booked_templates(self):
+        self._create_contract(days=2)
+        end = self.start + timedelta(days=1)
+        self.assertIn(self.bike.id, self.availability.get_booked_template_ids(self.start, end))
+        self.assertEqual(self.availability.get_templates_availability(
+            self.bike.ids, self.start, end), {self.bike.id: False})
+        self.assertNotIn(self.bike.id, self.availability.get_booked_template_ids(
+            self.start + timedelta(days=2), self.start + timedelta(days=3)))
+
+
+@tagged('post_install', '-at_install')
+class TestRentalAvailabilityRoute(MyBikeTestCommon, HttpCase):
+    """
+    La route /rental/availability vérifie un lot de vélos en un appel.
+    """
+
+    def _check_availability(self, bike_ids, start_date=None, end_date=None):
+        return self.make_jsonrpc_request('/rental/availability', {
+            'bike_ids': bike_ids,
+            'start_date': start_date,
+            'end_date': end_date,
+        })
+
+    def test_batch_availability(self):
+        self._create_contract(days=2)
+        free_bike = self.env['product.template'].create({
+            'name': 'Vélo Test Libre',
+            'is_rental': True,
+            'bike_category': 'city',
+            'rental_price_day': 20.0,
+        })
+        result = self._check_availability(
+            [self.bike.id, free_bike.id], '2026-07-06T10:00', '2026-07-07T10:00')
+        # Les clés JSON sont des chaînes
+        self.assertEqual(result, {'availability': {
+            str(self.bike.id): False,
+            str(free_bike.id): True,
+        }})
+
+        result = self._check_availability([self.bike.id], '2026-07-08T08:00', '2026-07-09T08:00')
+        self.assertEqual(result, {'availability': {str(self.bike.id): True}})
+
+    def test_invalid_requests(self):
+        self.assertIn('error', self._check_availability(['vélo']))
+        self.assertIn('error', self._check_availability(
+            [self.bike.id], '2026-07-07T10:00', '2026-07-06T10:00'))
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Contrats de location
+Description: Anti double réservation, actions workflow par lot et lecture du numéro de série
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo.exceptions import UserError, ValidationError
+from odoo.tests import tagged
+from odoo.tools import mute_logger
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRentalContractBooking(MyBikeTestCommon):
+    """
+    La contrainte d'exclusion PostgreSQL interdit deux réservations actives
+    du même vélo sur des périodes qui se chevauchent; la violation remonte
+    en ValidationError.
+    """
+
+    def setUp(self):
+        super(TestRentalContractBooking, self).setUp()
+        self.contract = self._create_contract(days=2)
+
+    @mute_logger('odoo.sql_db')
+    def test_overlapping_create_raises(self):
+        with self.assertRaises(ValidationError):
+            self._create_contract(start=self.start + timedelta(days=1), days=2)
+
+    @mute_logger('odoo.sql_db')
+    def test_overlapping_batch_create_raises(self):
+        with self.assertRaises(ValidationError):
+            self.env['mybike.rental.contract'].create([
+                {
+                    'partner_id': self.other_partner.id,
+                    'product_id': self.product.id,
+                    'start_date': self.start + timedelta(days=10, hours=hours),
+                    'end_date': self.start + timedelta(days=11, hours=hours),
+                    'rental_type': 'day',
+                    'unit_price': 20.0,
+                    'deposit_amount': 100.0,
+                }
+                for hours in (0, 12)
+            ])
+
+    def test_adjacent_periods_allowed(self):
+        # Intervalles semi-ouverts [début, fin): la location suivante peut
+        # commencer à la fin de la précédente
+        next_contract = self._create_contract(start=self.contract.end_date, days=1)
+        self.assertTrue(next_contract)
+
+    def test_cancelled_contract_releases_bike(self):
+        self.contract.action_cancel()
+        contract = self._create_contract(start=self.start + timedelta(days=1), days=1)
+        self.assertEqual(contract.state, 'draft')
+
+    @mute_logger('odoo.sql_db')
+    def test_overlapping_write_raises(self):
+        later = self._create_contract(start=self.start + timedelta(days=5), days=1)
+        with self.assertRaises(ValidationError), self.env.cr.savepoint():
+            later.write({'start_date': self.start + timedelta(days=1)})
+        # Le contrat n'a pas été modifié en base
+        self.assertEqual(later.start_date, self.start + timedelta(days=5))
+
+
+@tagged('post_install', '-at_install')
+class TestRentalContractWorkflow(MyBikeTestCommon):
+    """
+    Les actions workflow traitent un lot de contrats: tout le lot est validé
+    avant d'être modifié.
+    """
+
+    def setUp(self):
+        super(TestRentalContractWorkflow, self).setUp()
+        self.contracts = self._create_contract(days=1) | self._create_contract(
+            start=self.start + timedelta(days=3), days=1, partner_id=self.other_partner.id)
+
+    def test_batch_workflow(self):
+        self.contracts.action_confirm()
+        self.assertEqual(set(self.contracts.mapped('state')), {'confirmed'})
+        self.assertTrue(all(self.contracts.mapped('tariff_frozen')))
+
+        self.contracts.write({'deposit_paid': True})
+        self.contracts.action_start_rental()
+        self.assertEqual(set(self.contracts.mapped('state')), {'ongoing'})
+        self.assertEqual(self.bike.rental_state, 'rented')
+
+        self.contracts.action_cancel()
+        self.assertEqual(set(self.contracts.mapped('state')), {'cancelled'})
+        self.assertEqual(self.bike.rental_state, 'available')
+
+    def test_invalid_contract_rejects_batch(self):
+        first, second = self.contracts
+        first.action_confirm()
+        with self.assertRaises(UserError) as error:
+            self.contracts.action_confirm()
+        self.assertIn(first.name, str(error.exception))
+        self.assertEqual(second.state, 'draft')
+
+    def test_unpaid_deposit_blocks_start(self):
+        first, second = self.contracts
+        self.contracts.action_confirm()
+        first.deposit_paid = True
+        with self.assertRaises(UserError) as error:
+            self.contracts.action_start_rental()
+        self.assertIn(second.name, str(error.exception))
+        self.assertEqual(set(self.contracts.mapped('state')), {'confirmed'})
+
+
+@tagged('post_install', '-at_install')
+class TestRentalContractScan(MyBikeTestCommon):
+    """
+    La lecture du numéro de série d'un vélo démarre son contrat confirmé ou
+    ouvre le retour de son contrat en cours.
+    """
+
+    def setUp(self):
+        super(TestRentalContractScan, self).setUp()
+        self.bike.write({'serial_number': 'SN-TEST-0001'})
+        self.Contract = self.env['mybike.rental.contract']
+
+    def test_scan_starts_then_returns(self):
+        contract = self._create_contract(days=1, deposit_paid=True)
+        later = self._create_contract(start=self.start + timedelta(days=3), days=1, deposit_paid=True)
+        (contract | later).action_confirm()
+
+        # Contrat confirmé le plus proche: la location démarre
+        action = self.Contract.action_scan_serial_number(' SN-TEST-0001 ')
+        self.assertEqual(action['res_id'], contract.id)
+        self.assertEqual(contract.state, 'ongoing')
+        self.assertEqual(later.state, 'confirmed')
+
+        # Contrat en cours prioritaire: l'assistant de retour s'ouvre
+        action = self.Contract.action_scan_serial_number('SN-TEST-0001')
+        self.assertEqual(action['res_model'], 'mybike.rental.return.wizard')
+        self.assertEqual(action['context']['default_contract_id'], contract.id)
+
+    def test_scan_errors(self):
+        with self.assertRaises(UserError):
+            self.Contract.action_scan_serial_number('SN-INCONNU')
+        # Vélo connu sans contrat en cours ou confirmé
+        self._create_contract(days=1)
+        with self.assertRaises(UserError):
+            self.Contract.action_scan_serial_number('SN-TEST-0001')
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Facturation des contrats
+Description: Facturation groupée des contrats retournés et liaison des factures
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRentalInvoicing(MyBikeTestCommon, AccountTestInvoicingCommon):
+    """
+    Les factures d'un lot sont créées en un create puis liées aux contrats
+    par une seule requête (invoice_id écrit en SQL).
+    """
+
+    def setUp(self):
+        super(TestRentalInvoicing, self).setUp()
+        self.contracts = self._create_contract(days=2) \
+            | self._create_contract(start=self.start + timedelta(days=3), days=2, late_fee=15.0) \
+            | self._create_contract(start=self.start + timedelta(days=6), days=2,
+                                    partner_id=self.other_partner.id)
+        for contract in self.contracts:
+            contract.write({'state': 'returned', 'actual_return_date': contract.end_date})
+
+    def test_invoices_grouped_by_partner(self):
+        invoices = self.contracts._generate_invoices(group_by_partner=True)
+        self.assertEqual(len(invoices), 2)
+        self.assertTrue(all(self.contracts.mapped('invoiced')))
+
+        # invoice_id est écrit en SQL: relu depuis la base
+        self.contracts.invalidate_recordset(['invoice_id'])
+        first, second, third = self.contracts
+        self.assertEqual(first.invoice_id, second.invoice_id)
+        self.assertEqual(first.invoice_id.partner_id, self.partner)
+        self.assertEqual(third.invoice_id.partner_id, self.other_partner)
+        self.assertEqual(self.contracts.invoice_id, invoices)
+        # Une ligne par contrat, plus les frais de retard du second
+        self.assertEqual(len(first.invoice_id.invoice_line_ids), 3)
+        self.assertEqual(first.invoice_id.state, 'draft')
+
+    def test_one_invoice_per_contract(self):
+        invoices = self.contracts._generate_invoices()
+        self.assertEqual(len(invoices), 3)
+        self.contracts.invalidate_recordset(['invoice_id'])
+        for contract in self.contracts:
+            self.assertEqual(contract.invoice_id.partner_id, contract.partner_id)
+        self.assertEqual(self.contracts.invoice_id, invoices)
+
+    def test_invoiced_contract_rejected(self):
+        first = self.contracts[0]
+        first._generate_invoices()
+        with self.assertRaises(UserError):
+            self.contracts._generate_invoices(group_by_partner=True)
+        self.assertFalse(self.contracts[1:].filtered('invoiced'))
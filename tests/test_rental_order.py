@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Commandes de location
+Description: Création groupée des contrats à la confirmation des commandes
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo import Command
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRentalOrderConfirm(MyBikeTestCommon):
+    """
+    La confirmation d'un lot de commandes crée un contrat par ligne en un
+    seul create; les lignes dont le vélo a été réservé entre-temps sont
+    toutes signalées et rien n'est créé.
+    """
+
+    def _create_order(self, starts, partner=None):
+        return self.env['mybike.rental.order'].create({
+            'partner_id': (partner or self.partner).id,
+            'order_line_ids': [Command.create({
+                'product_id': self.product.id,
+                'rental_type': 'day',
+                'start_date': start,
+                'end_date': start + timedelta(days=1),
+                'unit_price': 20.0,
+            }) for start in starts],
+        })
+
+    def _get_contracts(self, orders):
+        return self.env['mybike.rental.contract'].search([('order_id', 'in', orders.ids)])
+
+    def test_confirm_creates_contracts(self):
+        order = self._create_order([self.start, self.start + timedelta(days=2)])
+        other_order = self._create_order([self.start + timedelta(days=4)], partner=self.other_partner)
+        orders = order | other_order
+        orders.action_confirm()
+
+        self.assertEqual(set(orders.mapped('state')), {'confirmed'})
+        contracts = self._get_contracts(orders)
+        self.assertEqual(len(contracts), 3)
+        self.assertEqual(contracts.filtered(lambda c: c.order_id == other_order).partner_id, self.other_partner)
+        self.assertEqual(len(set(contracts.mapped('name'))), 3)
+        self.assertNotIn('Nouveau', contracts.mapped('name'))
+        self.assertTrue(all(contracts.mapped('tariff_frozen')))
+
+    def test_conflicting_lines_are_reported(self):
+        # Deux demandes pour le même vélo: la seconde confirmée est refusée
+        first = self._create_order([self.start])
+        second = self._create_order([self.start + timedelta(hours=12), self.start + timedelta(days=3)],
+                                    partner=self.other_partner)
+        first.action_confirm()
+
+        with self.assertRaises(ValidationError) as error:
+            second.action_confirm()
+        self.assertIn(second.name, str(error.exception))
+        self.assertEqual(second.state, 'draft')
+        self.assertFalse(self._get_contracts(second))
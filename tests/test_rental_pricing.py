@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Tarification
+Description: Meilleur prix par combinaison des tarifs (compute_best_rental_price, _cover_hours)
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+import math
+from datetime import datetime, timedelta
+from itertools import product
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..models.rental_pricing import RENTAL_TYPE_HOURS, _cover_hours, compute_best_rental_price
+
+
+TARIFF = {'hour': 5.0, 'day': 20.0, 'week': 100.0, 'month': 300.0}
+
+START = datetime(2026, 7, 6, 8, 0)
+
+
+def brute_force_price(tariff, hours):
+    """
+    Prix le plus bas couvrant `hours` heures, en essayant toutes les
+    combinaisons de mois, semaines et jours (le reste en heures).
+    """
+    unit_hours = {rental_type: int(RENTAL_TYPE_HOURS[rental_type]) for rental_type in tariff}
+    best = math.inf
+    ranges = [
+        range(0, -(-hours // unit_hours[rental_type]) + 1) if tariff.get(rental_type) else range(1)
+        for rental_type in ('month', 'week', 'day')
+    ]
+    for months, weeks, days in product(*ranges):
+        remainder = hours - months * unit_hours['month'] - weeks * unit_hours['week'] - days * unit_hours['day']
+        if remainder > 0 and not tariff.get('hour'):
+            continue
+        cost = (months * (tariff.get('month') or 0.0) + weeks * (tariff.get('week') or 0.0)
+                + days * (tariff.get('day') or 0.0) + max(remainder, 0) * (tariff.get('hour') or 0.0))
+        best = min(best, cost)
+    return best
+
+
+@tagged('post_install', '-at_install')
+class TestBestRentalPrice(BaseCase):
+    """
+    Le prix d'une location est la combinaison de tarifs la moins chère qui
+    couvre toutes les heures entamées.
+    """
+
+    def test_week_and_days(self):
+        amount, breakdown = compute_best_rental_price(TARIFF, START, START + timedelta(days=9))
+        self.assertEqual(amount, 140.0)
+        self.assertEqual(breakdown, {'week': 1, 'day': 2})
+
+    def test_started_hour_is_due(self):
+        amount, breakdown = compute_best_rental_price(
+            TARIFF, START, START + timedelta(days=1, minutes=10))
+        self.assertEqual(amount, 25.0)
+        self.assertEqual(breakdown, {'day': 1, 'hour': 1})
+
+    def test_larger_unit_cheaper_than_remainder(self):
+        # 23 heures coûtent plus cher à l'heure qu'un jour complet
+        amount, breakdown = compute_best_rental_price(TARIFF, START, START + timedelta(hours=23))
+        self.assertEqual(amount, 20.0)
+        self.assertEqual(breakdown, {'day': 1})
+
+    def test_missing_tariff_not_offered(self):
+        tariff = dict(TARIFF, hour=0.0)
+        amount, breakdown = compute_best_rental_price(tariff, START, START + timedelta(hours=5))
+        self.assertEqual(amount, 20.0)
+        self.assertEqual(breakdown, {'day': 1})
+
+    def test_quantity(self):
+        amount, _breakdown = compute_best_rental_price(
+            TARIFF, START, START + timedelta(days=2), quantity=3)
+        self.assertEqual(amount, 120.0)
+
+    def test_invalid_period(self):
+        self.assertEqual(compute_best_rental_price(TARIFF, START, START), (0.0, {}))
+        self.assertEqual(compute_best_rental_price(TARIFF, START, None), (0.0, {}))
+        self.assertEqual(compute_best_rental_price({}, START, START + timedelta(days=1)), (0.0, {}))
+
+    def test_cover_hours(self):
+        small_types = ('hour', 'day', 'week')
+        self.assertEqual(_cover_hours(TARIFF, small_types, 0), (0.0, {}))
+        self.assertEqual(_cover_hours(TARIFF, small_types, 3), (15.0, {'hour': 3}))
+        self.assertEqual(_cover_hours(TARIFF, small_types, 24 * 6), (100.0, {'week': 1}))
+        self.assertEqual(_cover_hours({'day': 20.0}, small_types, 30), (40.0, {'day': 2}))
+        self.assertEqual(_cover_hours({}, small_types, 5)[0], math.inf)
+
+    def test_matches_brute_force(self):
+        tariffs = [
+            TARIFF,
+            {'hour': 4.0, 'day': 30.0, 'week': 150.0, 'month': 500.0},
+            {'hour': 0.0, 'day': 15.0, 'week': 80.0, 'month': 0.0},
+            {'hour': 3.0, 'day': 0.0, 'week': 60.0, 'month': 200.0},
+            {'hour': 10.0, 'day': 25.0, 'week': 200.0, 'month': 350.0},
+        ]
+        for tariff in tariffs:
+            for hours in list(range(1, 50)) + list(range(50, 24 * 70, 13)):
+                with self.subTest(tariff=tariff, hours=hours):
+                    amount, breakdown = compute_best_rental_price(
+                        tariff, START, START + timedelta(hours=hours))
+                    self.assertAlmostEqual(amount, brute_force_price(tariff, hours), places=2)
+                    # Le détail couvre la période et correspond au montant
+                    covered = sum(count * RENTAL_TYPE_HOURS[rental_type]
+                                  for rental_type, count in breakdown.items())
+                    self.assertGreaterEqual(covered, hours)
+                    self.assertAlmostEqual(
+                        amount, sum(count * tariff[rental_type] for rental_type, count in breakdown.items()),
+                        places=2)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Règles de tarification
+Description: Priorité des règles compilées et application aux tarifs des vélos
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import datetime, timedelta
+
+from odoo.tests import tagged
+
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRentalPricingRule(MyBikeTestCommon):
+    """
+    La première règle active qui correspond (ordre de séquence) fixe les
+    tarifs; un tarif à 0 sur la règle garde celui du vélo.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestRentalPricingRule, cls).setUpClass()
+        Rule = cls.env['mybike.rental.pricing.rule']
+        # Sans multiplicateur de demande ni autre règle active
+        cls.env['mybike.rental.demand'].search([]).unlink()
+        cls.env['ir.config_parameter']._bump_cache_generation('demand')
+        Rule.search([]).action_archive()
+        cls.summer_rule = Rule.create({
+            'name': 'Ville - été',
+            'sequence': 20,
+            'bike_category': 'city',
+            'season': 'summer',
+            'price_day': 30.0,
+        })
+        cls.weekend_rule = Rule.create({
+            'name': 'Ville - week-end',
+            'sequence': 10,
+            'bike_category': 'city',
+            'day_type': 'weekend',
+            'price_day': 40.0,
+        })
+        cls.short_rule = Rule.create({
+            'name': 'Toutes catégories - courte durée',
+            'sequence': 5,
+            'max_duration_hours': 24.0,
+            'price_hour': 8.0,
+        })
+        cls.other_category_rule = Rule.create({
+            'name': 'VTT',
+            'sequence': 1,
+            'bike_category': 'mountain',
+            'price_day': 99.0,
+        })
+        # Lundi 6 juillet 2026 (self.start) et samedi 4 juillet 2026
+        cls.saturday = datetime(2026, 7, 4, 8, 0)
+
+    def _match(self, start, hours):
+        return dict(self.env['mybike.rental.pricing.rule']._match_prices(
+            'city', start, start + timedelta(hours=hours)))
+
+    def test_first_matching_rule_wins(self):
+        # Le week-end, la règle de séquence 10 passe avant celle de séquence 20
+        self.assertEqual(self._match(self.saturday, 48), {'day': 40.0})
+        # En semaine, seule la règle d'été correspond
+        self.assertEqual(self._match(self.start, 48), {'day': 30.0})
+        # Une règle sans catégorie s'applique à toutes, selon sa séquence
+        self.assertEqual(self._match(self.saturday, 5), {'hour': 8.0})
+
+    def test_duration_tier_and_season(self):
+        # max_duration_hours est exclusif: 24 h ne sont plus une courte durée
+        self.assertEqual(self._match(self.start, 24), {'day': 30.0})
+        # Hors saison et en semaine: aucune règle, tarifs du vélo
+        self.assertEqual(self._match(datetime(2026, 1, 5, 8, 0), 48), {})
+
+    def test_changes_invalidate_compiled_rules(self):
+        self.summer_rule.sequence = 1
+        self.assertEqual(self._match(self.saturday, 48), {'day': 30.0})
+        self.summer_rule.action_archive()
+        self.assertEqual(self._match(self.saturday, 48), {'day': 40.0})
+        self.weekend_rule.unlink()
+        self.assertEqual(self._match(self.saturday, 48), {})
+
+    def test_rule_prices_override_bike_tariff(self):
+        Pricing = self.env['mybike.rental.pricing']
+        tariff = Pricing.get_tariff(self.bike, self.saturday, self.saturday + timedelta(days=2))
+        # Tarif journalier de la règle, autres tarifs du vélo
+        self.assertEqual(tariff['day'], 40.0)
+        self.assertEqual(tariff['hour'], 5.0)
+        self.assertEqual(tariff['week'], 100.0)
+        # Sans période, tarifs du vélo
+        self.assertEqual(Pricing.get_tariff(self.bike)['day'], 20.0)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Assistant de retour
+Description: Retour groupé de plusieurs vélos en une transaction
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from datetime import timedelta
+
+from odoo import Command
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from ..models.res_partner import RENTAL_STAT_FIELDS
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestRentalReturnWizard(MyBikeTestCommon):
+    """
+    L'assistant groupé retourne tous les contrats du lot avec les valeurs de
+    chaque ligne, ou aucun si un contrat n'est pas en location.
+    """
+
+    def setUp(self):
+        super(TestRentalReturnWizard, self).setUp()
+        self.first = self._create_contract(days=1)
+        self.second = self._create_contract(
+            start=self.start + timedelta(days=1), days=1, partner_id=self.other_partner.id)
+        self.contracts = self.first | self.second
+        self.contracts.write({'state': 'ongoing'})
+        # Rendus ensemble, trois heures après la fin du second contrat: les
+        # frais de retard diffèrent d'un contrat à l'autre
+        self.return_date = self.second.end_date + timedelta(hours=3)
+
+    def _create_wizard(self, contracts):
+        return self.env['mybike.rental.return.wizard'].create({
+            'return_date': self.return_date,
+            'line_ids': [Command.create({
+                'contract_id': contract.id,
+                'condition_return': 'damaged' if contract == self.second else 'good',
+                'damage_reported': contract == self.second,
+                'deposit_deduction': 40.0 if contract == self.second else 0.0,
+            }) for contract in contracts],
+        })
+
+    def _get_stats(self):
+        partners = self.partner | self.other_partner
+        self.env.flush_all()
+        partners.invalidate_recordset(RENTAL_STAT_FIELDS)
+        return {
+            partner.id: tuple(partner[fname] for fname in RENTAL_STAT_FIELDS)
+            for partner in partners
+        }
+
+    def test_batch_return(self):
+        wizard = self._create_wizard(self.contracts)
+        late_fees = {line.contract_id.id: line.late_fee for line in wizard.line_ids}
+        self.assertEqual(wizard.total_late_fee, sum(late_fees.values()))
+        wizard.action_confirm_return()
+
+        self.assertEqual(set(self.contracts.mapped('state')), {'returned'})
+        self.assertEqual(set(self.contracts.mapped('actual_return_date')), {self.return_date})
+        for contract in self.contracts:
+            self.assertEqual(contract.late_fee, late_fees[contract.id])
+            self.assertFalse(contract.late_fee_manual)
+        self.assertGreater(self.first.late_fee, self.second.late_fee)
+        self.assertGreater(self.second.late_fee, 0.0)
+        self.assertEqual(self.second.bike_condition_return, 'damaged')
+        self.assertTrue(self.second.damage_reported)
+        self.assertEqual(self.second.deposit_deduction, 40.0)
+        self.assertEqual(self.first.bike_condition_return, 'good')
+        self.assertFalse(self.first.damage_reported)
+
+        # Statistiques client mises à jour une fois pour le lot: identiques
+        # à une reconstruction complète
+        incremental = self._get_stats()
+        self.env['res.partner']._rebuild_rental_stats()
+        self.assertEqual(incremental, self._get_stats())
+
+    def test_invalid_contract_rejects_batch(self):
+        self.first.write({'state': 'returned', 'actual_return_date': self.first.end_date})
+        wizard = self._create_wizard(self.contracts)
+        with self.assertRaises(UserError):
+            wizard.action_confirm_return()
+        self.assertEqual(self.second.state, 'ongoing')
+        self.assertFalse(self.second.actual_return_date)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Tests - Cache des pages du site
+Description: Pages et fragments mis en cache par génération (mybike.website.cache)
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from ..models import website_cache
+from .common import MyBikeTestCommon
+
+
+@tagged('post_install', '-at_install')
+class TestWebsiteCache(MyBikeTestCommon):
+    """
+    Une page est rendue une fois par génération du cache; invalidate() et
+    les modifications des vélos affichés en changent la génération.
+    """
+
+    def setUp(self):
+        super(TestWebsiteCache, self).setUp()
+        self.cache = self.env['mybike.website.cache']
+        # Génération neuve: aucune entrée d'un autre test n'est relue
+        self.cache.invalidate()
+        self.render_count = 0
+
+    def _render(self):
+        self.render_count += 1
+        return '<p>Rendu %s</p>' % self.render_count
+
+    def _get_page(self, key=('city', 'fr_FR', 1)):
+        return self.cache._get_cached_page('rental_catalog', key, self._render)
+
+    def test_page_cached_until_invalidated(self):
+        self.assertEqual(self._get_page(), '<p>Rendu 1</p>')
+        self.assertEqual(self._get_page(), '<p>Rendu 1</p>')
+        self.assertEqual(self.render_count, 1)
+
+        # Autre variante de la page: rendue à part
+        self.assertEqual(self._get_page(('mountain', 'fr_FR', 1)), '<p>Rendu 2</p>')
+
+        self.cache.invalidate()
+        self.assertEqual(self._get_page(), '<p>Rendu 3</p>')
+        self.assertEqual(self.render_count, 3)
+
+    def test_bike_changes_invalidate_pages(self):
+        self._get_page()
+
+        # La disponibilité est vérifiée à part: un départ en location garde le cache
+        self.bike.write({'rental_state': 'rented'})
+        self._get_page()
+        self.assertEqual(self.render_count, 1)
+
+        self.bike.write({'name': 'Vélo Test Renommé'})
+        self._get_page()
+        self.assertEqual(self.render_count, 2)
+
+        self.bike.write({'rental_state': 'maintenance'})
+        self._get_page()
+        self.assertEqual(self.render_count, 3)
+
+    def test_fragment_expires_after_ttl(self):
+        key = ('fr_FR', 1)
+        with patch.object(website_cache, 'time') as mock_time:
+            mock_time.time.return_value = 1000.0
+            fragment = self.cache._get_cached_fragment('homepage_rental_bikes', key, self._render, 300)
+            self.assertEqual(fragment, '<p>Rendu 1</p>')
+
+            # Même tranche de temps: servi depuis le cache
+            mock_time.time.return_value = 1100.0
+            self.cache._get_cached_fragment('homepage_rental_bikes', key, self._render, 300)
+            self.assertEqual(self.render_count, 1)
+
+            # Tranche suivante: rendu à nouveau
+            mock_time.time.return_value = 1300.0
+            self.cache._get_cached_fragment('homepage_rental_bikes', key, self._render, 300)
+            self.assertEqual(self.render_count, 2)
+
+            # Le prix de vente des vélos en vedette invalide aussi les fragments
+            self.bike.write({'list_price': 999.0})
+            self.cache._get_cached_fragment('homepage_rental_bikes', key, self._render, 300)
+            self.assertEqual(self.render_count, 3)
@@ -1 +1,2 @@
 from . import rental_return_wizard
+from . import rental_scan_wizard
@@ -1,13 +1,25 @@
 # -*- coding: utf-8 -*-
 """
 Module: Rental Return Wizard (Assistant de Retour)
-Description: Assistant pour gérer le retour d'un vélo loué
+Description: Assistant pour gérer le retour d'un ou plusieurs vélos loués
 Auteur: Harith Lemti & Younes Loukili
 """
 
+from collections import defaultdict
+
 from odoo import models, fields, api
 
 
+# Condition du vélo au retour (assistant simple et lignes du retour groupé)
+RETURN_CONDITIONS = [
+    ('excellent', 'Excellent'),
+    ('good', 'Bon'),
+    ('fair', 'Correct'),
+    ('poor', 'Mauvais'),
+    ('damaged', 'Endommagé'),
+]
+
+
 class RentalReturnWizard(models.TransientModel):
     """
     Assistant de retour de vélo (Wizard/Popup).
@@ -22,6 +34,10 @@ class RentalReturnWizard(models.TransientModel):
     - Calculer les déductions sur la caution
     - Mettre à jour le contrat de location
 
+    En mode groupé (line_ids renseigné, voir RentalContract.action_return_bikes),
+    l'assistant liste plusieurs contrats avec une ligne de saisie par vélo et
+    enregistre tous les retours en une seule fois.
+
     Note: Les TransientModel sont temporaires et nettoyés automatiquement par Odoo.
     """
     _name = 'mybike.rental.return.wizard'
@@ -34,8 +50,13 @@ class RentalReturnWizard(models.TransientModel):
     contract_id = fields.Many2one(
         'mybike.rental.contract',
         string='Contrat',
-        required=True,
-        help='Contrat de location concerné par ce retour')
+        help='Contrat de location concerné par ce retour (mode simple)')
+
+    line_ids = fields.One2many(
+        'mybike.rental.return.wizard.line',
+        'wizard_id',
+        string='Vélos Retournés',
+        help='Une ligne par contrat retourné (mode groupé)')
 
     return_date = fields.Datetime(
         string='Date Retour',
@@ -47,16 +68,12 @@ class RentalReturnWizard(models.TransientModel):
     # ÉTAT DU VÉLO
     # ============================================================================
 
-    condition_return = fields.Selection([
-        ('excellent', 'Excellent'),
-        ('good', 'Bon'),
-        ('fair', 'Correct'),
-        ('poor', 'Mauvais'),
-        ('damaged', 'Endommagé'),
-    ], string='État du Vélo',
-       required=True,
-       default='good',
-       help='État général du vélo au moment du retour')
+    condition_return = fields.Selection(
+        RETURN_CONDITIONS,
+        string='État du Vélo',
+        required=True,
+        default='good',
+        help='État général du vélo au moment du retour')
 
     # ============================================================================
     # GESTION DES DOMMAGES
@@ -92,37 +109,174 @@ class RentalReturnWizard(models.TransientModel):
         string='Notes',
         help='Notes additionnelles sur le retour')
 
+    # ============================================================================
+    # TOTAUX (calculés pour tout le lot)
+    # ============================================================================
+
+    total_late_fee = fields.Float(
+        string='Total Frais de Retard',
+        compute='_compute_totals',
+        help='Frais de retard de tous les vélos retournés, à la date de retour (€)')
+
+    total_deposit_deduction = fields.Float(
+        string='Total Déductions Caution',
+        compute='_compute_totals',
+        help='Déductions de caution de tous les vélos retournés (€)')
+
+    @api.depends('return_date', 'contract_id', 'deposit_deduction',
+                 'line_ids.late_fee', 'line_ids.deposit_deduction')
+    def _compute_totals(self):
+        """
+        Calcule les totaux du retour.
+
+        En mode groupé, les frais de retard des lignes sont calculés pour tout
+        le lot en un appel (voir RentalReturnWizardLine._compute_late_fee).
+        """
+        for wizard in self:
+            if wizard.line_ids:
+                wizard.total_late_fee = sum(wizard.line_ids.mapped('late_fee'))
+                wizard.total_deposit_deduction = sum(wizard.line_ids.mapped('deposit_deduction'))
+            else:
+                late_fees = self.env['mybike.rental.pricing'].get_late_fees(
+                    wizard.contract_id, {wizard.contract_id.id: wizard.return_date}
+                ) if wizard.contract_id and wizard.return_date else {}
+                wizard.total_late_fee = late_fees.get(wizard.contract_id.id, 0.0)
+                wizard.total_deposit_deduction = wizard.deposit_deduction
+
     # ============================================================================
     # ACTION PRINCIPALE
     # ============================================================================
 
     def action_confirm_return(self):
         """
-        Confirme le retour du vélo et met à jour le contrat.
+        Confirme le retour des vélos et met à jour les contrats.
 
         Cette méthode:
-        1. Récupère toutes les informations saisies dans le wizard
-        2. Met à jour le contrat de location avec ces informations
-        3. Change l'état du contrat à 'returned'
-        4. Ferme le wizard (popup)
+        1. Récupère les informations saisies (assistant simple ou lignes du
+           retour groupé)
+        2. Vérifie que tous les contrats sont en cours
+        3. Calcule les frais de retard de tout le lot en un appel, à la date
+           de retour
+        4. Passe les contrats à l'état 'returned' avec leur date de retour en
+           une écriture, puis enregistre les valeurs propres à chaque contrat
+           (état du vélo, dommages, frais); la vérification des réservations
+           et les statistiques client ne passent qu'une fois pour le lot
+           (voir RentalContract._write_grouped)
+        5. Ferme le wizard (popup)
+
+        Tout est enregistré dans la même transaction: si un contrat est
+        invalide, aucun retour n'est enregistré.
 
-        Le contrat passe alors à l'état "Retourné" et peut être clôturé
+        Les contrats passent alors à l'état "Retourné" et peuvent être clôturés
         pour générer la facture finale.
 
         Returns:
             dict: Action pour fermer le wizard
         """
+        returns = defaultdict(dict)
         for wizard in self:
-            # Mettre à jour le contrat avec les informations de retour
-            wizard.contract_id.write({
-                'actual_return_date': wizard.return_date,
-                'bike_condition_return': wizard.condition_return,
-                'damage_reported': wizard.damage_reported,
-                'damage_description': wizard.damage_description,
-                'deposit_deduction': wizard.deposit_deduction,
-                'deduction_reason': wizard.deduction_reason,
+            entries = wizard.line_ids or wizard
+            for entry in entries:
+                returns[wizard.return_date][entry.contract_id.id] = {
+                    'bike_condition_return': entry.condition_return,
+                    'damage_reported': entry.damage_reported,
+                    'damage_description': entry.damage_description or False,
+                    'deposit_deduction': entry.deposit_deduction,
+                    'deduction_reason': entry.deduction_reason or False,
+                }
+
+        Contract = self.env['mybike.rental.contract']
+        contracts = Contract.browse([
+            contract_id for vals_by_id in returns.values() for contract_id in vals_by_id
+        ])
+        contracts._check_workflow_state(('ongoing',), "Le vélo doit être en location pour être retourné.")
+
+        late_fees = self.env['mybike.rental.pricing'].get_late_fees(contracts, {
+            contract_id: return_date
+            for return_date, vals_by_id in returns.items() for contract_id in vals_by_id
+        })
+        # Un seul lot en pratique: tous les vélos rendus à la même date
+        for return_date, vals_by_id in returns.items():
+            Contract._write_grouped({
+                contract_id: dict(vals, late_fee=late_fees[contract_id])
+                for contract_id, vals in vals_by_id.items()
+            }, shared_vals={
+                'actual_return_date': return_date,
                 'state': 'returned',  # Passer le contrat à l'état "Retourné"
             })
 
         # Fermer le wizard
         return {'type': 'ir.actions.act_window_close'}
+
+
+class RentalReturnWizardLine(models.TransientModel):
+    """
+    Ligne de l'assistant de retour groupé: un vélo retourné.
+
+    Porte les informations propres à chaque vélo (état, dommages, déduction);
+    la date de retour est commune à tout le lot (portée par l'assistant).
+    """
+    _name = 'mybike.rental.return.wizard.line'
+    _description = 'Ligne Assistant Retour Location'
+
+    wizard_id = fields.Many2one(
+        'mybike.rental.return.wizard',
+        string='Assistant',
+        required=True,
+        ondelete='cascade')
+
+    contract_id = fields.Many2one(
+        'mybike.rental.contract',
+        string='Contrat',
+        required=True,
+        help='Contrat de location concerné par ce retour')
+
+    partner_id = fields.Many2one(
+        related='contract_id.partner_id',
+        string='Client')
+
+    product_id = fields.Many2one(
+        related='contract_id.product_id',
+        string='Vélo')
+
+    condition_return = fields.Selection(
+        RETURN_CONDITIONS,
+        string='État du Vélo',
+        required=True,
+        default='good',
+        help='État général du vélo au moment du retour')
+
+    damage_reported = fields.Boolean(
+        string='Dommage Signalé',
+        default=False,
+        help='Cocher si des dommages ont été constatés sur le vélo')
+
+    damage_description = fields.Text(
+        string='Description Dommages',
+        help='Description détaillée des dommages constatés')
+
+    deposit_deduction = fields.Float(
+        string='Déduction Caution (€)',
+        default=0.0,
+        help='Montant à déduire de la caution pour couvrir les dommages ou frais')
+
+    deduction_reason = fields.Text(
+        string='Raison Déduction',
+        help='Explication de la déduction')
+
+    late_fee = fields.Float(
+        string='Frais de Retard',
+        compute='_compute_late_fee',
+        help='Frais de retard à la date de retour de l\'assistant (€)')
+
+    @api.depends('contract_id', 'wizard_id.return_date')
+    def _compute_late_fee(self):
+        """
+        Calcule les frais de retard de toutes les lignes en un appel
+        (voir RentalPricing.get_late_fees).
+        """
+        lines = self.filtered(lambda l: l.contract_id and l.wizard_id.return_date)
+        late_fees = self.env['mybike.rental.pricing'].get_late_fees(
+            lines.contract_id, {line.contract_id.id: line.wizard_id.return_date for line in lines})
+        for line in self:
+            line.late_fee = late_fees.get(line.contract_id.id, 0.0)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Module: Rental Scan Wizard (Lecture Code-Barres)
+Description: Assistant de lecture du numéro de série d'un vélo au comptoir
+Auteur: Harith Lemti & Younes Loukili
+"""
+
+from odoo import models, fields
+
+
+class RentalScanWizard(models.TransientModel):
+    """
+    Assistant de lecture du code-barres d'un vélo (Wizard/Popup).
+
+    La douchette saisit le numéro de série du vélo; la validation retrouve
+    son contrat courant et enchaîne l'étape suivante du workflow (voir
+    RentalContract.action_scan_serial_number):
+    - Contrat en cours: ouverture de l'assistant de retour
+    - Contrat confirmé: départ de la location
+    """
+    _name = 'mybike.rental.scan.wizard'
+    _description = 'Assistant Lecture Vélo'
+
+    serial_number = fields.Char(
+        string='Numéro de Série',
+        required=True,
+        help='Numéro de série lu sur le vélo (douchette ou saisie)')
+
+    def action_scan(self):
+        """
+        Traite le numéro de série lu.
+
+        Returns:
+            dict: Action suivante (assistant de retour ou contrat démarré)
+        """
+        self.ensure_one()
+        return self.env['mybike.rental.contract'].action_scan_serial_number(self.serial_number.strip())